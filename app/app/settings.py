@@ -30,10 +30,14 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'bands',
     'board',
+    'search',
+    'bench',
     'method_override',
 ]
 
 MIDDLEWARE = [
+    'helpers.metrics.MetricsMiddleware',
+    'helpers.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -44,6 +48,34 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Share of requests measured by ServerTimingMiddleware, 0 to 1
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', default=0))
+
+# Same query shape repeated more times in one request is logged as N+1
+SERVER_TIMING_REPEATED_QUERIES = int(os.environ.get('SERVER_TIMING_REPEATED_QUERIES', default=10))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'helpers.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'helpers.purge': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -80,6 +112,57 @@ DATABASES = {
 }
 
 
+# Cache
+# Default holds version keys of reference data, response cache generations
+# and facet index generation, so it must be shared (file based, memcached)
+# by gunicorn workers, see gunicorn.conf.py. Per process one is for runserver
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND',
+                                  'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', default=10000))},
+    },
+    # Whole pages for anonymous visitors, kept apart so they don't evict
+    # version keys of default cache, file based backend is shared by workers
+    'responses': {
+        'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND',
+                                  'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', 'responses'),
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    # Rendered cards of listings, used by {% cache %} tag
+    'template_fragments': {
+        'BACKEND': os.environ.get('FRAGMENT_CACHE_BACKEND',
+                                  'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', 'template_fragments'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Seconds nginx micro-cache and browsers keep pages of anonymous visitors,
+# expired page is served while one request refreshes it, 0 turns it off
+SHARED_CACHE_MAX_AGE = int(os.environ.get('SHARED_CACHE_MAX_AGE', default=10))
+SHARED_CACHE_STALE = int(os.environ.get('SHARED_CACHE_STALE', default=30))
+
+# nginx address for refreshing cached pages of changed rows, unset in development
+CACHE_PURGE_URL = os.environ.get('CACHE_PURGE_URL', '')
+# Host header of refresh requests, nginx cache key doesn't include it
+CACHE_PURGE_HOST = os.environ.get('CACHE_PURGE_HOST', 'localhost')
+
+# Seconds a rendered card is kept, cards are keyed by updated_at of their row,
+# timeout only bounds staleness of author names on announcement cards
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('FRAGMENT_CACHE_TIMEOUT', default=600))
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+# Seconds anonymous listing pages are cached, 0 turns cache off
+# Pages are invalidated on change anyway, timeout bounds staleness
+# of time based filters like active announcements
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', default=60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -133,6 +216,20 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 EMAIL_USE_SSL = True
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
+# In-process bitmap index for musicians directory search
+# Needs shared cache between workers to keep their indexes in sync
+MUSICIAN_FACET_INDEX = int(os.environ.get('MUSICIAN_FACET_INDEX', default=0))
+
+# Sessions: 'db', 'cached_db' or 'signed_cookies'
+# cached_db reads sessions from cache, needs shared cache between workers,
+# or logout in one worker is not seen by others until their cache expires
+# signed_cookies keep session in cookie, no queries at all, but logout
+# can't revoke a copied cookie
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('SESSION_BACKEND', 'db')
+
+# Flash messages live in cookie only, without session fallback
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
 MESSAGE_TAGS = {
     messages.DEBUG: 'alert-info',
     messages.INFO: 'alert-info',
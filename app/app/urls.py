@@ -16,10 +16,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from helpers.metrics import MetricsView
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/', include('users.urls')),
     path('', include('bands.urls')),
     path('', include('board.urls')),
+    path('search/', include('search.urls')),
+    path('metrics', MetricsView.as_view(), name=MetricsView.name),
 ]
@@ -1,3 +1,21 @@
 from django.contrib import admin
 
-# Register your models here.
+from bands.models import City, Instrument, InstrumentCategory, Style, Musician, Band
+from helpers.pagination import EstimatedCountPaginator
+
+
+@admin.register(Musician)
+class MusicianAdmin(admin.ModelAdmin):
+    list_display = ('user', 'first_name', 'last_name', 'city', 'is_busy', 'activated')
+    list_filter = ('activated', 'is_busy', 'city')
+    list_select_related = ('user', 'city')
+    raw_id_fields = ('user', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+admin.site.register(City)
+admin.site.register(Instrument)
+admin.site.register(InstrumentCategory)
+admin.site.register(Style)
+admin.site.register(Band)
@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class BandsConfig(AppConfig):
     name = 'bands'
+
+    def ready(self):
+        import bands.facets  # noqa: F401 connects facet index signals
+        import bands.reference  # noqa: F401 connects reference data signals
+        from bands.models import Musician, Band, City, Instrument, Style
+        from bands.views import MusiciansView, BandsView
+        from helpers.response_cache import track_models
+        from helpers.purge import purge_on_change
+        track_models(Musician, Band, City, Instrument, Style)
+        purge_on_change(Musician, MusiciansView.name)
+        purge_on_change(Band, BandsView.name)
@@ -0,0 +1,349 @@
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from bands.models import Musician, City, Instrument
+
+
+def iter_ascending(bits: int, after: int = -1) -> Iterator[int]:
+    '''Set bits greater than `after`, lowest first'''
+    bits &= ~((1 << (after + 1)) - 1)
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def iter_descending(bits: int, before: Optional[int] = None) -> Iterator[int]:
+    '''Set bits lower than `before`, highest first'''
+    if before is not None:
+        bits &= (1 << before) - 1
+    while bits:
+        highest = bits.bit_length() - 1
+        yield highest
+        bits ^= 1 << highest
+
+
+def bit_count(bits: int) -> int:
+    return bin(bits).count('1')
+
+
+def ids_to_bits(ids: Iterable[int], largest: int) -> int:
+    '''Bitmap of ids filled byte by byte, shifting int per id would copy it every time'''
+    buffer = bytearray(largest // 8 + 1)
+    for musician_id in ids:
+        buffer[musician_id >> 3] |= 1 << (musician_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class IdSet:
+    """
+    Musicians with one facet value
+    Sorted array of ids while sparse, bitmap once it is smaller than the array,
+    so memory follows number of musicians in set and not the largest id
+    """
+
+    __slots__ = ('ids', 'bits')
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self.ids = array('I', sorted(ids))
+        self.bits = None
+        self._compact()
+
+    def _compact(self):
+        '''Array takes 4 bytes per id, bitmap 1 bit per id up to the largest'''
+        if self.ids and len(self.ids) * 32 > self.ids[-1]:
+            self.bits = ids_to_bits(self.ids, self.ids[-1])
+            self.ids = None
+
+    def add(self, musician_id: int):
+        if self.bits is not None:
+            self.bits |= 1 << musician_id
+            return
+        position = bisect_left(self.ids, musician_id)
+        if position == len(self.ids) or self.ids[position] != musician_id:
+            self.ids.insert(position, musician_id)
+            self._compact()
+
+    def discard(self, musician_id: int):
+        if self.bits is not None:
+            self.bits &= ~(1 << musician_id)
+            return
+        position = bisect_left(self.ids, musician_id)
+        if position < len(self.ids) and self.ids[position] == musician_id:
+            del self.ids[position]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter_ascending(self.bits) if self.bits is not None else iter(self.ids)
+
+
+class MusicianFacetIndex:
+    """
+    In-process index of musicians for directory search
+    Busy and activated musicians are bitmaps, bit number is musician id
+    Musicians of every city and instrument are IdSet, sparse ones take little memory
+    Built lazily on first use, updated incrementally from signals after commit
+    Shared generation key in cache tells other workers to rebuild
+    """
+
+    GENERATION_KEY = 'musician_facet_index:generation'
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.generation = None
+        self.activated = 0
+        self.busy = 0
+        self.cities = {}
+        self.instruments = {}
+        '''City id by musician id, 0 for none'''
+        self.city_of = array('I')
+
+    @staticmethod
+    def enabled() -> bool:
+        return getattr(settings, 'MUSICIAN_FACET_INDEX', False)
+
+    def rebuild(self):
+        with self.lock:
+            generation = cache.get(self.GENERATION_KEY)
+            '''Arrays keep peak memory of rebuild low, python ints take 28 bytes each'''
+            activated, busy, cities, city_of, instruments = array('I'), array('I'), {}, array('I'), {}
+            largest = 0
+            rows = Musician.objects.values_list('id', 'activated', 'is_busy', 'city_id')
+            for musician_id, is_activated, is_busy, city_id in rows.iterator():
+                largest = max(largest, musician_id)
+                if is_activated:
+                    activated.append(musician_id)
+                if is_busy:
+                    busy.append(musician_id)
+                if city_id is not None:
+                    cities.setdefault(city_id, array('I')).append(musician_id)
+                    self._set_city(city_of, musician_id, city_id)
+            links = Musician.instruments.through.objects.values_list('musician_id', 'instrument_id')
+            for musician_id, instrument_id in links.iterator():
+                instruments.setdefault(instrument_id, array('I')).append(musician_id)
+
+            self.activated, self.busy = ids_to_bits(activated, largest), ids_to_bits(busy, largest)
+            self.cities = {city_id: IdSet(ids) for city_id, ids in cities.items()}
+            self.instruments = {instrument_id: IdSet(ids) for instrument_id, ids in instruments.items()}
+            self.city_of = city_of
+            self.generation = generation
+            self.built = True
+
+    @staticmethod
+    def _set_city(city_of: array, musician_id: int, city_id: Optional[int]):
+        if musician_id >= len(city_of):
+            city_of.extend([0] * (musician_id + 1 - len(city_of)))
+        city_of[musician_id] = city_id or 0
+
+    def ensure_fresh(self):
+        if not self.built or cache.get(self.GENERATION_KEY) != self.generation:
+            self.rebuild()
+
+    def invalidate(self):
+        with self.lock:
+            self.built = False
+
+    def _bump_generation(self):
+        '''Tell other workers index changed, keep own copy if nobody else wrote'''
+        try:
+            generation = cache.incr(self.GENERATION_KEY)
+        except ValueError:
+            generation = 1
+            cache.set(self.GENERATION_KEY, generation, None)
+        if self.generation is not None and generation == self.generation + 1:
+            self.generation = generation
+        else:
+            self.built = False
+
+    def _move_city(self, musician_id: int, city_id: Optional[int]):
+        old_city_id = self.city_of[musician_id] if musician_id < len(self.city_of) else 0
+        if old_city_id == (city_id or 0):
+            return
+        if old_city_id in self.cities:
+            self.cities[old_city_id].discard(musician_id)
+        if city_id is not None:
+            self.cities.setdefault(city_id, IdSet()).add(musician_id)
+        self._set_city(self.city_of, musician_id, city_id)
+
+    def update_musician(self, musician_id: int, activated: bool,
+                        is_busy: bool, city_id: Optional[int]):
+        with self.lock:
+            if self.built:
+                bit = 1 << musician_id
+                self.activated = self.activated | bit if activated else self.activated & ~bit
+                self.busy = self.busy | bit if is_busy else self.busy & ~bit
+                self._move_city(musician_id, city_id)
+            self._bump_generation()
+
+    def remove_musician(self, musician_id: int, instrument_ids: Iterable[int]):
+        '''Only sets of musician's city and instruments are changed'''
+        with self.lock:
+            if self.built:
+                mask = ~(1 << musician_id)
+                self.activated &= mask
+                self.busy &= mask
+                self._move_city(musician_id, None)
+                for instrument_id in instrument_ids:
+                    if instrument_id in self.instruments:
+                        self.instruments[instrument_id].discard(musician_id)
+            self._bump_generation()
+
+    def set_instruments(self, pairs: List[Tuple[int, int]], add: bool):
+        with self.lock:
+            if self.built:
+                for musician_id, instrument_id in pairs:
+                    if add:
+                        self.instruments.setdefault(instrument_id, IdSet()).add(musician_id)
+                    elif instrument_id in self.instruments:
+                        self.instruments[instrument_id].discard(musician_id)
+            self._bump_generation()
+
+    def drop_facet(self, facet: dict, key: int):
+        with self.lock:
+            if self.built:
+                ids = facet.pop(key, ())
+                if facet is self.cities:
+                    for musician_id in ids:
+                        self.city_of[musician_id] = 0
+            self._bump_generation()
+
+    def bits(self, facet: dict, keys: Iterable[int]) -> int:
+        '''Bitmap of musicians with any of facet values, sparse sets fill one buffer'''
+        with self.lock:
+            bits, sparse = 0, []
+            for key in keys:
+                id_set = facet.get(key)
+                if id_set is None:
+                    continue
+                if id_set.bits is not None:
+                    bits |= id_set.bits
+                elif id_set.ids:
+                    sparse.append(id_set.ids)
+            if sparse:
+                bits |= ids_to_bits(chain.from_iterable(sparse), max(ids[-1] for ids in sparse))
+            return bits
+
+    def filter(self, city_id: Optional[int] = None, instrument_id: Optional[int] = None,
+               city_ids: Optional[Iterable[int]] = None) -> int:
+        '''Bitmap of activated musicians matching filters, `city_ids` matches any of cities'''
+        self.ensure_fresh()
+        bits = self.activated
+        if city_id is not None:
+            bits &= self.bits(self.cities, [city_id])
+        if city_ids is not None:
+            bits &= self.bits(self.cities, city_ids)
+        if instrument_id is not None:
+            bits &= self.bits(self.instruments, [instrument_id])
+        return bits
+
+    def count(self, bits: int) -> int:
+        return bit_count(bits)
+
+    def page(self, bits: int, per_page: int, cursor: Optional[tuple] = None,
+             direction: str = 'next') -> Tuple[List[int], bool, bool]:
+        """
+        Ids of one page ordered by (is_busy, id), same as MusiciansView.ordering
+        Cursor is (is_busy, id) of row page starts after (next) or before (prev)
+        Returns ids, has_next, has_previous
+        """
+        vacant = bits & ~self.busy
+        busy = bits & self.busy
+        if cursor is None:
+            ids = list(islice(chain(iter_ascending(vacant), iter_ascending(busy)), per_page + 1))
+            return ids[:per_page], len(ids) > per_page, False
+
+        is_busy, musician_id = cursor
+        if direction == 'next':
+            if is_busy:
+                ordered = iter_ascending(busy, musician_id)
+            else:
+                ordered = chain(iter_ascending(vacant, musician_id), iter_ascending(busy))
+            ids = list(islice(ordered, per_page + 1))
+            return ids[:per_page], len(ids) > per_page, True
+
+        if is_busy:
+            ordered = chain(iter_descending(busy, musician_id), iter_descending(vacant))
+        else:
+            ordered = iter_descending(vacant, musician_id)
+        ids = list(islice(ordered, per_page + 1))
+        has_previous = len(ids) > per_page
+        ids = ids[:per_page]
+        ids.reverse()
+        return ids, True, has_previous
+
+
+musician_index = MusicianFacetIndex()
+
+
+@receiver(post_save, sender=Musician)
+def index_musician(sender, instance, **kwargs):
+    if not musician_index.enabled():
+        return
+    transaction.on_commit(lambda: musician_index.update_musician(
+        instance.id, instance.activated, instance.is_busy, instance.city_id))
+
+
+@receiver(pre_delete, sender=Musician)
+def remember_instruments(sender, instance, **kwargs):
+    '''Instrument links are deleted without m2m_changed'''
+    if musician_index.enabled():
+        instance._instrument_ids = list(instance.instruments.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Musician)
+def unindex_musician(sender, instance, **kwargs):
+    if not musician_index.enabled():
+        return
+    musician_id = instance.id
+    instrument_ids = instance.__dict__.pop('_instrument_ids', [])
+    transaction.on_commit(lambda: musician_index.remove_musician(musician_id, instrument_ids))
+
+
+@receiver(m2m_changed, sender=Musician.instruments.through)
+def index_musician_instruments(sender, instance, action, reverse, pk_set, **kwargs):
+    if not musician_index.enabled():
+        return
+    if action in ('post_add', 'post_remove'):
+        if reverse:
+            pairs = [(musician_id, instance.id) for musician_id in pk_set]
+        else:
+            pairs = [(instance.id, instrument_id) for instrument_id in pk_set]
+        add = action == 'post_add'
+        transaction.on_commit(lambda: musician_index.set_instruments(pairs, add))
+    elif action == 'pre_clear' and not reverse:
+        instance._cleared_instrument_ids = list(instance.instruments.values_list('id', flat=True))
+    elif action == 'post_clear':
+        if reverse:
+            transaction.on_commit(lambda: musician_index.drop_facet(
+                musician_index.instruments, instance.id))
+        else:
+            pairs = [(instance.id, instrument_id)
+                     for instrument_id in instance.__dict__.pop('_cleared_instrument_ids', [])]
+            transaction.on_commit(lambda: musician_index.set_instruments(pairs, False))
+
+
+@receiver(post_delete, sender=City)
+def unindex_city(sender, instance, **kwargs):
+    '''Musicians city is set to NULL with UPDATE query, no signals for them'''
+    if not musician_index.enabled():
+        return
+    city_id = instance.id
+    transaction.on_commit(lambda: musician_index.drop_facet(musician_index.cities, city_id))
+
+
+@receiver(post_delete, sender=Instrument)
+def unindex_instrument(sender, instance, **kwargs):
+    if not musician_index.enabled():
+        return
+    instrument_id = instance.id
+    transaction.on_commit(lambda: musician_index.drop_facet(
+        musician_index.instruments, instrument_id))
@@ -1,6 +1,121 @@
 from django import forms
+from django.forms.models import ModelChoiceIterator
+from django.urls import reverse_lazy
 
-from bands.models import Musician, City, Instrument, Style, Band
+from bands.models import Musician, City, Instrument, Style, Band, Facet, FacetCount
+from bands.reference import reference_data
+
+
+class ReferenceChoiceIterator(ModelChoiceIterator):
+    '''Choices from process-local reference data instead of queryset'''
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in reference_data.all(self.queryset.model):
+            yield self.choice(obj)
+
+    def __len__(self):
+        return (len(reference_data.all(self.queryset.model))
+                + (1 if self.field.empty_label is not None else 0))
+
+
+class ReferenceChoiceField(forms.ModelChoiceField):
+    iterator = ReferenceChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = reference_data.get(self.queryset.model, int(value))
+        except (ValueError, TypeError):
+            obj = None
+        if obj is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'],
+                                        code='invalid_choice')
+        return obj
+
+
+class ReferenceMultipleChoiceField(forms.ModelMultipleChoiceField):
+    iterator = ReferenceChoiceIterator
+
+    def _check_values(self, value):
+        objects = []
+        for pk in value:
+            try:
+                obj = reference_data.get(self.queryset.model, int(pk))
+            except (ValueError, TypeError):
+                raise forms.ValidationError(self.error_messages['invalid_pk_value'],
+                                            code='invalid_pk_value', params={'pk': pk})
+            if obj is None:
+                raise forms.ValidationError(self.error_messages['invalid_choice'],
+                                            code='invalid_choice', params={'value': pk})
+            objects.append(obj)
+        return objects
+
+
+class AutocompleteSelectMultiple(forms.SelectMultiple):
+    """
+    Renders only selected options, others are fetched from `url` as user types
+    Labels of selected rows are loaded in one query
+    """
+
+    class Media:
+        js = ('js/autocomplete.js', )
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = str(self.url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected_ids = [pk for pk in value if str(pk).isdigit()]
+        iterator = self.choices
+        self.choices = [iterator.choice(obj)
+                        for obj in iterator.queryset.filter(pk__in=selected_ids)] if selected_ids else []
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = iterator
+
+
+class AutocompleteMultipleChoiceField(forms.ModelMultipleChoiceField):
+    '''Submitted ids are validated with one IN query, rows are returned as list'''
+
+    def _check_values(self, value):
+        try:
+            ids = {int(pk) for pk in value}
+        except (ValueError, TypeError):
+            raise forms.ValidationError(self.error_messages['invalid_pk_value'],
+                                        code='invalid_pk_value', params={'pk': value})
+        objects = self.queryset.in_bulk(ids)
+        missing = ids - set(objects)
+        if missing:
+            raise forms.ValidationError(self.error_messages['invalid_choice'],
+                                        code='invalid_choice', params={'value': min(missing)})
+        return list(objects.values())
+
+
+class FacetCountsMixin:
+    """
+    Shows number of results next to each option, like "Guitar (1,204)"
+    `facet_fields` maps form field to Facet, counts are read in one query
+    """
+    facet_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        counts = FacetCount.counts(self.facet_fields.values())
+        for name, facet in self.facet_fields.items():
+            self.fields[name].label_from_instance = self.counted_label(counts[facet])
+
+    @staticmethod
+    def counted_label(counts: dict):
+        return lambda obj: f'{obj} ({counts.get(obj.id, 0):,})'
 
 
 class MusicianProfileForm(forms.ModelForm):
@@ -11,11 +126,11 @@ class MusicianProfileForm(forms.ModelForm):
     birth_date = forms.DateField(
         widget=forms.DateInput(attrs={'class': 'form-control'}),
         help_text='YYYY-MM-DD', required=False)
-    city = forms.ModelChoiceField(
+    city = ReferenceChoiceField(
         widget=forms.Select(attrs={'class': 'form-control'}),
         required=False, queryset=City.objects.all())
     is_busy = forms.BooleanField(widget=forms.CheckboxInput(), required=False)
-    instruments = forms.ModelMultipleChoiceField(
+    instruments = ReferenceMultipleChoiceField(
         widget=forms.SelectMultiple(attrs={'class': 'form-control'}),
         help_text='May select multiple', required=False, queryset=Instrument.objects.all())
     bio = forms.CharField(
@@ -29,35 +144,68 @@ class MusicianProfileForm(forms.ModelForm):
                   'activated')
 
 
-class MusicianFilterForm(forms.Form):
-    city = forms.ModelChoiceField(
+DISTANCE_CHOICES = (
+    ('', 'Only this city'),
+    ('10', 'Within 10 km'),
+    ('25', 'Within 25 km'),
+    ('50', 'Within 50 km'),
+    ('100', 'Within 100 km'),
+    ('200', 'Within 200 km'),
+)
+
+
+class MusicianFilterForm(FacetCountsMixin, forms.Form):
+    facet_fields = {
+        'city': Facet.MUSICIAN_CITY,
+        'instrument': Facet.MUSICIAN_INSTRUMENT,
+    }
+
+    city = ReferenceChoiceField(
         widget=forms.Select(attrs={'class': 'custom-select my-1 mr-sm-2'}),
         required=False, queryset=City.objects.all())
-    instrument = forms.ModelChoiceField(
+    distance = forms.ChoiceField(
+        widget=forms.Select(attrs={'class': 'custom-select my-1 mr-sm-2'}),
+        required=False, choices=DISTANCE_CHOICES)
+    instrument = ReferenceChoiceField(
         widget=forms.Select(attrs={'class': 'custom-select my-1 mr-sm-2'}),
         required=False, queryset=Instrument.objects.all())
+    q = forms.CharField(
+        widget=forms.TextInput(attrs={'class': 'form-control my-1 mr-sm-2', 'placeholder': 'Search'}),
+        required=False, label='Search')
 
 
-class BandFilterForm(forms.Form):
-    city = forms.ModelChoiceField(
+class BandFilterForm(FacetCountsMixin, forms.Form):
+    facet_fields = {
+        'city': Facet.BAND_CITY,
+        'style': Facet.BAND_STYLE,
+    }
+
+    city = ReferenceChoiceField(
         widget=forms.Select(attrs={'class': 'custom-select my-1 mr-sm-2'}),
         required=False, queryset=City.objects.all())
-    style = forms.ModelChoiceField(
+    distance = forms.ChoiceField(
+        widget=forms.Select(attrs={'class': 'custom-select my-1 mr-sm-2'}),
+        required=False, choices=DISTANCE_CHOICES)
+    style = ReferenceChoiceField(
         widget=forms.Select(attrs={'class': 'custom-select my-1 mr-sm-2'}),
         required=False, queryset=Style.objects.all())
+    q = forms.CharField(
+        widget=forms.TextInput(attrs={'class': 'form-control my-1 mr-sm-2', 'placeholder': 'Search'}),
+        required=False, label='Search')
 
 
 class BandEditForm(forms.ModelForm):
     name = forms.CharField(
         widget=forms.TextInput(attrs={'class': 'form-control'}))
-    musicians = forms.ModelMultipleChoiceField(
-        widget=forms.SelectMultiple(attrs={'class': 'form-control'}),
-        help_text='May select multiple', required=False,
-        queryset=Musician.activated_objects.all())
-    styles = forms.ModelMultipleChoiceField(
+    musicians = AutocompleteMultipleChoiceField(
+        widget=AutocompleteSelectMultiple(
+            url=reverse_lazy('autocomplete', args=('musicians', )), attrs={'class': 'form-control'}),
+        help_text='Start typing a name', required=False,
+        queryset=Musician.activated_objects.select_related('user'))
+    styles = ReferenceMultipleChoiceField(
         widget=forms.SelectMultiple(attrs={'class': 'form-control'}),
         help_text='May select multiple', required=False, queryset=Style.objects.all())
-    city = forms.ModelChoiceField(
+    city = ReferenceChoiceField(
         widget=forms.Select(attrs={'class': 'form-control'}),
         required=False, queryset=City.objects.all())
     description = forms.CharField(
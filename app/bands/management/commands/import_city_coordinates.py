@@ -0,0 +1,49 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from bands.models import City, CityNeighbor
+from bands.reference import reference_data
+from helpers.bulk import bulk_batch_size
+
+
+class Command(BaseCommand):
+    help = 'Set city coordinates from CSV with name,latitude,longitude columns and recompute neighbors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with header row')
+        parser.add_argument('--create', action='store_true',
+                            help='Create cities missing from database')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as file:
+                coordinates = {
+                    row['name'].strip(): (float(row['latitude']), float(row['longitude']))
+                    for row in csv.DictReader(file)
+                }
+        except (OSError, KeyError, ValueError) as error:
+            raise CommandError(f'Can not read coordinates: {error}')
+
+        with transaction.atomic():
+            cities = list(City.objects.filter(name__in=coordinates))
+            for city in cities:
+                city.latitude, city.longitude = coordinates[city.name]
+            City.objects.bulk_update(cities, ['latitude', 'longitude'],
+                                     batch_size=options['batch_size'])
+            created = []
+            if options['create']:
+                known = {city.name for city in cities}
+                created = City.objects.bulk_create(
+                    (City(name=name, latitude=latitude, longitude=longitude)
+                     for name, (latitude, longitude) in coordinates.items() if name not in known),
+                    batch_size=bulk_batch_size(City, options['batch_size']))
+            '''Bulk queries send no signals'''
+            CityNeighbor.rebuild()
+            transaction.on_commit(lambda: reference_data.invalidate(City))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(cities)} cities updated, {len(created)} created, '
+            f'{CityNeighbor.objects.count()} neighbor distances stored'))
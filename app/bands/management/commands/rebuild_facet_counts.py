@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from bands.models import FacetCount
+
+
+class Command(BaseCommand):
+    help = 'Recount filter options of search forms from scratch'
+
+    def handle(self, *args, **options):
+        FacetCount.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'{FacetCount.objects.count()} facet counts rebuilt'))
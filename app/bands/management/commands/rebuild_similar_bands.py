@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from bands.models import BandBucket
+
+
+class Command(BaseCommand):
+    help = 'Recompute similar bands index from styles and cities'
+
+    def handle(self, *args, **options):
+        BandBucket.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'{BandBucket.objects.count()} band buckets rebuilt'))
@@ -0,0 +1,152 @@
+from typing import List, Dict
+
+from django.db.models import Count, Exists, OuterRef
+from django.db.models.query import QuerySet
+
+from bands.models import Musician, Band, MusicianStyle
+from bands.facets import musician_index, iter_ascending
+
+
+'''Score of vacant musician for a band'''
+CITY_WEIGHT = 3
+LACKING_INSTRUMENT_WEIGHT = 2
+STYLE_WEIGHT = 1
+
+
+class BitSlicedCounter:
+    """
+    Score of every musician at once, kept as bit planes
+    Plane n has musician bit set when bit n of the musician score is set,
+    so adding a bitmap is a few big int operations whatever number of musicians
+    """
+
+    def __init__(self):
+        self.planes = []
+
+    def add(self, bits: int, weight: int = 1):
+        plane = 0
+        while weight:
+            if weight & 1:
+                self._add_at(bits, plane)
+            weight >>= 1
+            plane += 1
+
+    def _add_at(self, carry: int, plane: int):
+        while carry:
+            while plane >= len(self.planes):
+                self.planes.append(0)
+            self.planes[plane], carry = self.planes[plane] ^ carry, self.planes[plane] & carry
+            plane += 1
+
+    def equal_to(self, score: int, bits: int) -> int:
+        '''Bitmap of musicians from `bits` with exactly `score`'''
+        for plane, plane_bits in enumerate(self.planes):
+            bits &= plane_bits if score >> plane & 1 else ~plane_bits
+        return bits
+
+    def top(self, bits: int, limit: int) -> List[int]:
+        '''Ids with the highest non zero scores, ties broken by id'''
+        ids = []
+        for score in range((1 << len(self.planes)) - 1, 0, -1):
+            for musician_id in iter_ascending(self.equal_to(score, bits)):
+                ids.append(musician_id)
+                if len(ids) == limit:
+                    return ids
+        return ids
+
+
+def match_context(band: Band) -> Dict[str, list]:
+    '''Ids the score depends on'''
+    member_ids = list(band.musicians.values_list('id', flat=True))
+    covered = set(Musician.instruments.through.objects
+                  .filter(musician_id__in=member_ids).values_list('instrument_id', flat=True))
+    return {
+        'member_ids': member_ids,
+        'covered_instrument_ids': list(covered),
+        'style_ids': list(band.styles.values_list('id', flat=True)),
+    }
+
+
+def suggest_from_index(band: Band, context: Dict[str, list], limit: int) -> List[int]:
+    '''Scores all musicians with bitmaps of facet index'''
+    musician_index.ensure_fresh()
+    candidates = musician_index.activated & ~musician_index.busy
+    for member_id in context['member_ids']:
+        candidates &= ~(1 << member_id)
+
+    counter = BitSlicedCounter()
+    if band.city_id is not None:
+        counter.add(musician_index.bits(musician_index.cities, [band.city_id]), CITY_WEIGHT)
+    covered = set(context['covered_instrument_ids'])
+    lacking = [instrument_id for instrument_id in list(musician_index.instruments)
+               if instrument_id not in covered]
+    counter.add(musician_index.bits(musician_index.instruments, lacking), LACKING_INSTRUMENT_WEIGHT)
+
+    '''Musicians get style of every band they play in, index doesn't hold bands'''
+    if context['style_ids']:
+        played = (MusicianStyle.objects.filter(style_id__in=context['style_ids'])
+                  .values_list('musician_id', 'style_id'))
+        styles = {}
+        for musician_id, style_id in played.iterator():
+            styles[style_id] = styles.get(style_id, 0) | (1 << musician_id)
+        for bits in styles.values():
+            counter.add(bits & candidates, STYLE_WEIGHT)
+    return counter.top(candidates, limit)
+
+
+def suggest_from_database(band: Band, context: Dict[str, list], limit: int) -> List[int]:
+    """
+    Same score computed by database without scoring every musician
+    Musicians are split into groups of equal score by city, number of shared styles
+    and lacking instrument, groups are read from the best one by id up to limit,
+    so every query stops early, walking primary key, city index or players of styles
+    """
+    vacant = (Musician.activated_objects.filter(is_busy=False)
+              .exclude(id__in=context['member_ids']))
+    lacking_instruments = Exists(Musician.instruments.through.objects
+                                 .filter(musician_id=OuterRef('id'))
+                                 .exclude(instrument_id__in=context['covered_instrument_ids']))
+    plays_styles = MusicianStyle.objects.filter(style_id__in=context['style_ids'])
+    shared = plays_styles.order_by().values('musician_id').annotate(total=Count('id'))
+
+    by_styles = [(0, vacant.filter(~Exists(plays_styles.filter(musician_id=OuterRef('id')))))]
+    for total in range(1, len(context['style_ids']) + 1):
+        players = shared.filter(total=total).values('musician_id')
+        by_styles.append((total * STYLE_WEIGHT, vacant.filter(id__in=players)))
+    groups = []
+    for score, musicians in by_styles:
+        if band.city_id is not None:
+            groups.append((score + CITY_WEIGHT, musicians.filter(city_id=band.city_id)))
+            musicians = musicians.exclude(city_id=band.city_id)
+        groups.append((score, musicians))
+    levels = []
+    for score, musicians in groups:
+        levels.append((score + LACKING_INSTRUMENT_WEIGHT, musicians.filter(lacking_instruments)))
+        if score:
+            levels.append((score, musicians.filter(~lacking_instruments)))
+    levels.sort(key=lambda level: -level[0])
+
+    rows = []
+    for score, musicians in levels:
+        if sum(row[0] > score for row in rows) >= limit:
+            break
+        ids = musicians.order_by('id').values_list('id', flat=True)[:limit]
+        rows += [(score, musician_id) for musician_id in ids]
+    rows.sort(key=lambda row: (-row[0], row[1]))
+    return [musician_id for score, musician_id in rows[:limit]]
+
+
+def suggest_musicians(band: Band, limit: int = 6, queryset: QuerySet = None) -> List[Musician]:
+    """
+    Vacant activated musicians best fitting the band:
+    same city, plays instrument none of members play, plays same styles in other bands
+    """
+    context = match_context(band)
+    if musician_index.enabled():
+        ids = suggest_from_index(band, context, limit)
+    else:
+        ids = suggest_from_database(band, context, limit)
+    if queryset is None:
+        queryset = Musician.objects.select_related('user')
+    rows = queryset.in_bulk(ids)
+    return [rows[musician_id] for musician_id in ids if musician_id in rows]
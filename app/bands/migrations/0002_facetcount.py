@@ -0,0 +1,48 @@
+# Generated by Django 3.0.5 on 2026-10-18 18:57
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_facets(apps, schema_editor):
+    FacetCount = apps.get_model('bands', 'FacetCount')
+    Musician = apps.get_model('bands', 'Musician')
+    Band = apps.get_model('bands', 'Band')
+    aggregates = (
+        ('MUSICIAN_CITY', Musician.objects.filter(activated=True), 'city'),
+        ('MUSICIAN_INSTRUMENT', Musician.objects.filter(activated=True), 'instruments'),
+        ('BAND_CITY', Band.objects.all(), 'city'),
+        ('BAND_STYLE', Band.objects.all(), 'styles'),
+    )
+    for facet, queryset, field in aggregates:
+        grouped = (
+            queryset.exclude(**{field: None}).order_by()
+            .values_list(field).annotate(total=Count('id', distinct=True))
+        )
+        FacetCount.objects.bulk_create([
+            FacetCount(facet=facet, value_id=value_id, count=total)
+            for value_id, total in grouped
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bands', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(choices=[('MUSICIAN_CITY', 'Activated musicians per city'), ('MUSICIAN_INSTRUMENT', 'Activated musicians per instrument'), ('BAND_CITY', 'Bands per city'), ('BAND_STYLE', 'Bands per style')], max_length=50)),
+                ('value_id', models.IntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('facet', 'value_id')},
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bands', '0002_facetcount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='band',
+            index=models.Index(fields=['name', 'id'], name='band_name_id'),
+        ),
+    ]
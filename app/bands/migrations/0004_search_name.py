@@ -0,0 +1,40 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+from helpers.text import normalize_name
+
+
+def fill_search_names(apps, schema_editor):
+    Musician = apps.get_model('bands', 'Musician')
+    Band = apps.get_model('bands', 'Band')
+    musicians = Musician.objects.select_related('user').only(
+        'id', 'first_name', 'last_name', 'user__username')
+    for musician in musicians.iterator():
+        musician.search_name = normalize_name(
+            musician.first_name, musician.last_name, musician.user.username)
+        musician.save(update_fields=['search_name'])
+    for band in Band.objects.only('id', 'name').iterator():
+        band.search_name = normalize_name(band.name)
+        band.save(update_fields=['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bands', '0003_band_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='band',
+            name='search_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='musician',
+            name='search_name',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+    ]
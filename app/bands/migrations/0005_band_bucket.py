@@ -0,0 +1,42 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from helpers import minhash
+from helpers.bulk import bulk_batch_size
+
+
+def index_bands(apps, schema_editor):
+    Band = apps.get_model('bands', 'Band')
+    BandBucket = apps.get_model('bands', 'BandBucket')
+    style_ids = {}
+    for band_id, style_id in Band.styles.through.objects.values_list('band_id', 'style_id').iterator():
+        style_ids.setdefault(band_id, []).append(style_id)
+    BandBucket.objects.bulk_create((
+        BandBucket(band_id=band_id, bucket=bucket)
+        for band_id, city_id in Band.objects.values_list('id', 'city_id').iterator()
+        for bucket in minhash.buckets(minhash.band_features(style_ids.get(band_id, ()), city_id))
+    ), batch_size=bulk_batch_size(BandBucket, 1000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bands', '0004_search_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BandBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True)),
+                ('band', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='bands.Band')),
+            ],
+            options={
+                'unique_together': {('band', 'bucket')},
+            },
+        ),
+        migrations.RunPython(index_bands, migrations.RunPython.noop),
+    ]
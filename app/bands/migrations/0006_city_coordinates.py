@@ -0,0 +1,41 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bands', '0005_band_bucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='city',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='city',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CityNeighbor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField()),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='bands.City')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='bands.City')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cityneighbor',
+            index=models.Index(fields=['city', 'distance_km'], name='city_neighbor_distance'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cityneighbor',
+            unique_together={('city', 'neighbor')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bands', '0006_city_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='band',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='musician',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from helpers.bulk import bulk_batch_size
+
+
+def index_musician_styles(apps, schema_editor):
+    Band = apps.get_model('bands', 'Band')
+    MusicianStyle = apps.get_model('bands', 'MusicianStyle')
+    links = (Band.musicians.through.objects.filter(band__styles__isnull=False)
+             .order_by().values_list('musician_id', 'band__styles').distinct())
+    MusicianStyle.objects.bulk_create((
+        MusicianStyle(musician_id=musician_id, style_id=style_id)
+        for musician_id, style_id in links.iterator()
+    ), batch_size=bulk_batch_size(MusicianStyle, 1000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bands', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MusicianStyle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('musician', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='played_styles', to='bands.Musician')),
+                ('style', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='bands.Style')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='musicianstyle',
+            index=models.Index(fields=['style', 'musician'], name='musician_style_style'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='musicianstyle',
+            unique_together={('musician', 'style')},
+        ),
+        migrations.RunPython(index_musician_styles, migrations.RunPython.noop),
+    ]
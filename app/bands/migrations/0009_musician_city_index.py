@@ -0,0 +1,17 @@
+# Generated by Django 3.0.5 on 2026-10-18 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bands', '0008_musician_style'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='musician',
+            index=models.Index(fields=['city', 'id'], name='musician_city_id'),
+        ),
+    ]
@@ -1,11 +1,23 @@
-from django.db import models
+from typing import Iterable, Dict, List
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models import F, Count
+from django.db.models.signals import (
+    post_init, pre_save, post_save, pre_delete, post_delete, m2m_changed,
+)
 from django.dispatch import receiver
+from django.utils import timezone
+
+from helpers.text import normalize_name
+from helpers import minhash, geo
+from helpers.bulk import bulk_batch_size
 
 
 class City(models.Model):
     name = models.CharField(max_length=50)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return f'{self.name}'
@@ -62,10 +74,20 @@ class Musician(models.Model):
     city = models.ForeignKey('City', on_delete=models.SET_NULL,
                              related_name='musicians', null=True)
     instruments = models.ManyToManyField('Instrument', related_name='musicians')
+    '''Normalized names for fuzzy search, filled on save'''
+    search_name = models.CharField(max_length=255, blank=True, editable=False)
+    '''Version of cached card, also renewed when instruments change'''
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = models.Manager()
     activated_objects = MusicianManager()
 
+    class Meta:
+        '''Suggestions walk musicians of a city by id'''
+        indexes = [
+            models.Index(fields=['city', 'id'], name='musician_city_id'),
+        ]
+
     def representation_name(self):
         return f'{self.first_name} {self.user.username} {self.last_name}'.strip()
 
@@ -92,6 +114,14 @@ class Band(models.Model):
     city = models.ForeignKey('City', on_delete=models.SET_NULL,
                              related_name='bands', null=True)
     musicians = models.ManyToManyField('Musician', related_name='bands')
+    search_name = models.CharField(max_length=255, blank=True, editable=False)
+    '''Version of cached card, also renewed when styles change'''
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='band_name_id'),
+        ]
 
     def __str__(self):
         return f'{self.name}'
@@ -100,12 +130,610 @@ class Band(models.Model):
         return f'<Band: {self.name} id: {self.id}>'
 
 
+@receiver(pre_save, sender=Musician)
+def normalize_musician_name(sender, instance, **kwargs):
+    instance.search_name = normalize_name(
+        instance.first_name, instance.last_name, instance.user.username)
+
+
+@receiver(pre_save, sender=Band)
+def normalize_band_name(sender, instance, **kwargs):
+    instance.search_name = normalize_name(instance.name)
+
+
 @receiver(post_save, sender=User)
 def create_musician(sender, instance, created, **kwargs):
     if created:
         Musician.objects.create(user=instance)
 
 
+def create_musicians(users: Iterable[User], batch_size: int = 1000) -> List[Musician]:
+    """
+    Profiles for users made with bulk_create, which sends no post_save
+    New musicians aren't activated, so facet counts and index stay the same,
+    search documents of empty bio are created on first profile save
+    """
+    musicians = []
+    for user in users:
+        musician = Musician(user=user)
+        normalize_musician_name(Musician, musician)
+        musicians.append(musician)
+    return Musician.objects.bulk_create(musicians, batch_size=bulk_batch_size(Musician, batch_size))
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    '''Username as loaded from db, missing when deferred'''
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(post_init, sender=Musician)
+def remember_musician_values(sender, instance, **kwargs):
+    '''Values as loaded from db, deferred fields are missing'''
+    instance._loaded_values = {field.attname: instance.__dict__[field.attname]
+                               for field in sender._meta.concrete_fields
+                               if not field.primary_key and field.attname in instance.__dict__}
+
+
+@receiver(post_save, sender=Musician)
+def refresh_musician_values(sender, instance, **kwargs):
+    remember_musician_values(sender, instance)
+
+
+def changed_musician_fields(musician: Musician) -> List[str]:
+    normalize_musician_name(Musician, musician)
+    return [attname for attname, value in musician._loaded_values.items()
+            if musician.__dict__.get(attname, value) != value]
+
+
 @receiver(post_save, sender=User)
-def save_musician(sender, instance, **kwargs):
-    instance.musician.save()
+def save_musician(sender, instance, created, update_fields, **kwargs):
+    """
+    Saves musician loaded through `user.musician` with changed columns only
+    Otherwise musician depends on user only by username in search_name,
+    so other user saves, like last_login update on login, make no queries
+    """
+    if created:
+        return
+    username_changed = False
+    if update_fields is None or 'username' in update_fields:
+        username_changed = instance.username != instance._loaded_username
+        instance._loaded_username = instance.username
+    musician = instance._state.fields_cache.get('musician')
+    if musician is not None:
+        changed = changed_musician_fields(musician)
+        if changed:
+            musician.save(update_fields=[*changed, 'updated_at'])
+    elif username_changed:
+        names = Musician.objects.filter(user=instance).values_list('first_name', 'last_name').first()
+        if names is not None:
+            Musician.objects.filter(user=instance).update(
+                search_name=normalize_name(*names, instance.username))
+
+
+def has_stamp(model) -> bool:
+    return model in (Musician, Band)
+
+
+@receiver(m2m_changed, sender=Musician.instruments.through)
+@receiver(m2m_changed, sender=Band.styles.through)
+@receiver(m2m_changed, sender=Band.musicians.through)
+def touch_updated_at(sender, instance, action, reverse, pk_set, model, **kwargs):
+    """
+    Cards and detail pages show related rows, so relinking renews
+    updated_at of both sides, for those of them which have it
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    now = timezone.now()
+    if has_stamp(type(instance)):
+        type(instance).objects.filter(id=instance.id).update(updated_at=now)
+    if not has_stamp(model):
+        return
+    if action == 'pre_clear':
+        linked = sender.objects.filter(**{type(instance)._meta.model_name: instance.id})
+        model.objects.filter(id__in=linked.values(model._meta.model_name)).update(updated_at=now)
+    elif pk_set:
+        model.objects.filter(id__in=pk_set).update(updated_at=now)
+
+
+@receiver(pre_delete, sender=Musician)
+@receiver(pre_delete, sender=Band)
+def touch_members(sender, instance, **kwargs):
+    '''Membership rows are deleted without m2m_changed, pages of the other side still change'''
+    other = Band if sender is Musician else Musician
+    linked = (Band.musicians.through.objects
+              .filter(**{sender._meta.model_name: instance.id}).values(other._meta.model_name))
+    other.objects.filter(id__in=linked).update(updated_at=timezone.now())
+
+
+class Facet(models.TextChoices):
+    MUSICIAN_CITY = 'MUSICIAN_CITY', 'Activated musicians per city'
+    MUSICIAN_INSTRUMENT = 'MUSICIAN_INSTRUMENT', 'Activated musicians per instrument'
+    BAND_CITY = 'BAND_CITY', 'Bands per city'
+    BAND_STYLE = 'BAND_STYLE', 'Bands per style'
+
+
+class FacetCount(models.Model):
+    """
+    Aggregate of filter options for search forms
+    Maintained incrementally by signals below, rebuild() recounts from scratch
+    QuerySet.update() bypasses signals, run rebuild_facet_counts command after it
+    """
+    facet = models.CharField(max_length=50, choices=Facet.choices)
+    value_id = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('facet', 'value_id')
+
+    def __str__(self):
+        return f'{self.facet} {self.value_id}: {self.count}'
+
+    def __repr__(self):
+        return f'<FacetCount: {self.facet} {self.value_id}: {self.count}>'
+
+    @classmethod
+    def bump(cls, facet: str, value_ids: Iterable[int], delta: int = 1):
+        if not delta:
+            return
+        for value_id in value_ids:
+            if value_id is None:
+                continue
+            updated = (
+                cls.objects.filter(facet=facet, value_id=value_id)
+                .update(count=F('count') + delta)
+            )
+            if not updated:
+                _, created = cls.objects.get_or_create(facet=facet, value_id=value_id,
+                                                       defaults={'count': delta})
+                if not created:
+                    cls.objects.filter(facet=facet, value_id=value_id).update(
+                        count=F('count') + delta)
+
+    @classmethod
+    def counts(cls, facets: Iterable[str]) -> Dict[str, Dict[int, int]]:
+        result = {facet: {} for facet in facets}
+        rows = cls.objects.filter(facet__in=result.keys()).values_list('facet', 'value_id', 'count')
+        for facet, value_id, count in rows:
+            result[facet][value_id] = count
+        return result
+
+    @classmethod
+    def rebuild(cls):
+        aggregates = (
+            (Facet.MUSICIAN_CITY, Musician.activated_objects, 'city'),
+            (Facet.MUSICIAN_INSTRUMENT, Musician.activated_objects, 'instruments'),
+            (Facet.BAND_CITY, Band.objects, 'city'),
+            (Facet.BAND_STYLE, Band.objects, 'styles'),
+        )
+        rows = []
+        for facet, manager, field in aggregates:
+            grouped = (
+                manager.exclude(**{field: None}).order_by()
+                .values_list(field).annotate(total=Count('id', distinct=True))
+            )
+            rows += [cls(facet=facet, value_id=value_id, count=total)
+                     for value_id, total in grouped]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows)
+
+
+FACET_FIELDS = {
+    Musician: ('activated', 'city_id'),
+    Band: ('city_id', ),
+}
+
+
+@receiver(post_init, sender=Musician)
+@receiver(post_init, sender=Band)
+def remember_facet_state(sender, instance, **kwargs):
+    '''Values as loaded from db, deferred fields are missing'''
+    instance._facet_state = {field: instance.__dict__[field]
+                             for field in FACET_FIELDS[sender] if field in instance.__dict__}
+
+
+@receiver(pre_save, sender=Musician)
+@receiver(pre_save, sender=Band)
+def complete_facet_state(sender, instance, **kwargs):
+    fields = FACET_FIELDS[sender]
+    if instance._state.adding or len(instance._facet_state) == len(fields):
+        return
+    old = sender.objects.filter(id=instance.id).values(*fields).first() or {}
+    instance._facet_state = {**old, **instance._facet_state}
+
+
+@receiver(post_save, sender=Musician)
+def count_musician(sender, instance, created, **kwargs):
+    old_activated = False if created else instance._facet_state.get('activated', False)
+    old_city_id = None if created else instance._facet_state.get('city_id')
+    if (old_activated, old_city_id) != (instance.activated, instance.city_id):
+        if old_activated:
+            FacetCount.bump(Facet.MUSICIAN_CITY, [old_city_id], -1)
+        if instance.activated:
+            FacetCount.bump(Facet.MUSICIAN_CITY, [instance.city_id], 1)
+    if old_activated != instance.activated and not created:
+        instrument_ids = instance.instruments.values_list('id', flat=True)
+        FacetCount.bump(Facet.MUSICIAN_INSTRUMENT, instrument_ids,
+                        1 if instance.activated else -1)
+    instance._facet_state = {'activated': instance.activated, 'city_id': instance.city_id}
+
+
+@receiver(post_save, sender=Band)
+def count_band(sender, instance, created, **kwargs):
+    old_city_id = None if created else instance._facet_state.get('city_id')
+    if old_city_id != instance.city_id:
+        FacetCount.bump(Facet.BAND_CITY, [old_city_id], -1)
+        FacetCount.bump(Facet.BAND_CITY, [instance.city_id], 1)
+    instance._facet_state = {'city_id': instance.city_id}
+
+
+@receiver(pre_delete, sender=Musician)
+def uncount_musician(sender, instance, **kwargs):
+    '''m2m rows are deleted without m2m_changed, so relations are uncounted here'''
+    if instance.activated:
+        FacetCount.bump(Facet.MUSICIAN_CITY, [instance.city_id], -1)
+        FacetCount.bump(Facet.MUSICIAN_INSTRUMENT,
+                        instance.instruments.values_list('id', flat=True), -1)
+
+
+@receiver(pre_delete, sender=Band)
+def uncount_band(sender, instance, **kwargs):
+    FacetCount.bump(Facet.BAND_CITY, [instance.city_id], -1)
+    FacetCount.bump(Facet.BAND_STYLE, instance.styles.values_list('id', flat=True), -1)
+
+
+def count_m2m(facet: str, field: str, instance, action: str, reverse: bool,
+              pk_set, owners: models.QuerySet):
+    """
+    Shared m2m_changed handler
+    `owners` — counted side of relation (activated musicians or all bands)
+    `field` — relation name on owners side
+    add sends only new ids, remove sends all requested ids, so removal
+    is counted on pre_remove while relations are still in place
+    """
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    if not reverse:
+        if not owners.filter(id=instance.id).exists():
+            return
+        if action == 'post_add':
+            FacetCount.bump(facet, pk_set, 1)
+            return
+        present = getattr(instance, field).all()
+        if action == 'pre_remove':
+            present = present.filter(id__in=pk_set)
+        FacetCount.bump(facet, present.values_list('id', flat=True), -1)
+        return
+
+    if action == 'post_add':
+        delta = owners.filter(id__in=pk_set).count()
+    else:
+        present = owners.filter(**{field: instance.id})
+        if action == 'pre_remove':
+            present = present.filter(id__in=pk_set)
+        delta = -present.count()
+    FacetCount.bump(facet, [instance.id], delta)
+
+
+@receiver(m2m_changed, sender=Musician.instruments.through)
+def count_musician_instruments(sender, instance, action, reverse, pk_set, **kwargs):
+    count_m2m(Facet.MUSICIAN_INSTRUMENT, 'instruments', instance, action, reverse,
+              pk_set, Musician.activated_objects.all())
+
+
+@receiver(m2m_changed, sender=Band.styles.through)
+def count_band_styles(sender, instance, action, reverse, pk_set, **kwargs):
+    count_m2m(Facet.BAND_STYLE, 'styles', instance, action, reverse,
+              pk_set, Band.objects.all())
+
+
+@receiver(post_delete, sender=City)
+def drop_city_counts(sender, instance, **kwargs):
+    FacetCount.objects.filter(facet__in=(Facet.MUSICIAN_CITY, Facet.BAND_CITY),
+                              value_id=instance.id).delete()
+
+
+@receiver(post_delete, sender=Instrument)
+def drop_instrument_counts(sender, instance, **kwargs):
+    FacetCount.objects.filter(facet=Facet.MUSICIAN_INSTRUMENT, value_id=instance.id).delete()
+
+
+@receiver(post_delete, sender=Style)
+def drop_style_counts(sender, instance, **kwargs):
+    FacetCount.objects.filter(facet=Facet.BAND_STYLE, value_id=instance.id).delete()
+
+
+class BandBucket(models.Model):
+    """
+    Locality-sensitive hashing index of bands over styles and city
+    Every band has minhash.BANDS buckets, bands sharing a bucket are likely similar
+    Kept in sync by signals below, rebuild() reindexes all bands
+    """
+    REBUILD_BATCH_SIZE = 500
+
+    band = models.ForeignKey('Band', on_delete=models.CASCADE, related_name='buckets')
+    bucket = models.BigIntegerField(db_index=True)
+
+    class Meta:
+        unique_together = ('band', 'bucket')
+
+    def __str__(self):
+        return f'{self.band_id}: {self.bucket}'
+
+    def __repr__(self):
+        return f'<BandBucket: {self.band_id}: {self.bucket}>'
+
+    @classmethod
+    def index(cls, band_ids: Iterable[int]):
+        """Recomputes buckets of bands, rows are rewritten only when signature changed"""
+        band_ids = list(band_ids)
+        features = {band_id: [] for band_id in band_ids}
+        cities = Band.objects.filter(id__in=band_ids).values_list('id', 'city_id')
+        styles = Band.styles.through.objects.filter(band_id__in=band_ids).values_list('band_id', 'style_id')
+        present = {}
+        for band_id, bucket in cls.objects.filter(band_id__in=band_ids).values_list('band_id', 'bucket'):
+            present.setdefault(band_id, set()).add(bucket)
+
+        style_ids = {}
+        for band_id, style_id in styles:
+            style_ids.setdefault(band_id, []).append(style_id)
+        for band_id, city_id in cities:
+            features[band_id] = minhash.band_features(style_ids.get(band_id, ()), city_id)
+
+        changed, rows = [], []
+        for band_id, band_features in features.items():
+            buckets = set(minhash.buckets(band_features))
+            if buckets != present.get(band_id, set()):
+                changed.append(band_id)
+                rows += [cls(band_id=band_id, bucket=bucket) for bucket in buckets]
+        if changed:
+            cls.objects.filter(band_id__in=changed).delete()
+            cls.objects.bulk_create(rows)
+
+    @classmethod
+    def similar(cls, band: 'Band', limit: int = 5) -> List['Band']:
+        """Bands sharing most buckets, one indexed lookup whatever number of bands"""
+        buckets = cls.objects.filter(band_id=band.id).values('bucket')
+        ranked = (
+            cls.objects.filter(bucket__in=buckets).exclude(band_id=band.id)
+            .values('band_id').annotate(shared=Count('id')).order_by('-shared', 'band_id')
+        )
+        band_ids = [row['band_id'] for row in ranked[:limit]]
+        bands = Band.objects.in_bulk(band_ids)
+        return [bands[band_id] for band_id in band_ids if band_id in bands]
+
+    @classmethod
+    def rebuild(cls):
+        with transaction.atomic():
+            cls.objects.all().delete()
+            band_ids = list(Band.objects.values_list('id', flat=True))
+            '''Batches keep IN lists under database parameter limits'''
+            for start in range(0, len(band_ids), cls.REBUILD_BATCH_SIZE):
+                cls.index(band_ids[start:start + cls.REBUILD_BATCH_SIZE])
+
+
+@receiver(pre_save, sender=Band)
+def check_band_city(sender, instance, **kwargs):
+    '''Runs after complete_facet_state, so old city is known'''
+    instance._city_changed = (instance._state.adding
+                              or instance._facet_state.get('city_id') != instance.city_id)
+
+
+@receiver(post_save, sender=Band)
+def index_band(sender, instance, **kwargs):
+    if instance.__dict__.pop('_city_changed', True):
+        BandBucket.index([instance.id])
+
+
+@receiver(m2m_changed, sender=Band.styles.through)
+def index_band_styles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if not reverse:
+        if action != 'pre_clear':
+            BandBucket.index([instance.id])
+        return
+    if action == 'pre_clear':
+        instance._cleared_band_ids = list(instance.bands.values_list('id', flat=True))
+    elif action == 'post_clear':
+        BandBucket.index(instance.__dict__.pop('_cleared_band_ids', []))
+    else:
+        BandBucket.index(pk_set)
+
+
+@receiver(pre_delete, sender=City)
+@receiver(pre_delete, sender=Style)
+def remember_similar_bands(sender, instance, **kwargs):
+    """Band city is nulled and style links deleted without signals, bands are reindexed after"""
+    instance._band_ids = list(instance.bands.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=Style)
+def reindex_similar_bands(sender, instance, **kwargs):
+    BandBucket.index(instance.__dict__.pop('_band_ids', []))
+
+
+class MusicianStyle(models.Model):
+    """
+    Styles of all bands of a musician, precomputed for matchmaking,
+    so scoring doesn't join memberships with band styles on every band page
+    Kept in sync by signals below, rebuild() recomputes all musicians
+    """
+    REBUILD_BATCH_SIZE = 500
+
+    musician = models.ForeignKey('Musician', on_delete=models.CASCADE, related_name='played_styles')
+    style = models.ForeignKey('Style', on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('musician', 'style')
+        indexes = [
+            models.Index(fields=['style', 'musician'], name='musician_style_style'),
+        ]
+
+    def __str__(self):
+        return f'{self.musician_id}: {self.style_id}'
+
+    def __repr__(self):
+        return f'<MusicianStyle: {self.musician_id}: {self.style_id}>'
+
+    @classmethod
+    def index(cls, musician_ids: Iterable[int]):
+        """Recomputes styles of musicians, rows are rewritten only when styles changed"""
+        played = {musician_id: set() for musician_id in musician_ids}
+        links = (Band.musicians.through.objects
+                 .filter(musician_id__in=list(played), band__styles__isnull=False)
+                 .values_list('musician_id', 'band__styles').distinct())
+        for musician_id, style_id in links:
+            played[musician_id].add(style_id)
+        present = {}
+        rows = cls.objects.filter(musician_id__in=list(played)).values_list('musician_id', 'style_id')
+        for musician_id, style_id in rows:
+            present.setdefault(musician_id, set()).add(style_id)
+
+        changed, rows = [], []
+        for musician_id, style_ids in played.items():
+            if style_ids != present.get(musician_id, set()):
+                changed.append(musician_id)
+                rows += [cls(musician_id=musician_id, style_id=style_id) for style_id in style_ids]
+        if changed:
+            cls.objects.filter(musician_id__in=changed).delete()
+            cls.objects.bulk_create(rows)
+
+    @classmethod
+    def rebuild(cls):
+        with transaction.atomic():
+            cls.objects.all().delete()
+            musician_ids = list(Band.musicians.through.objects
+                                .order_by().values_list('musician_id', flat=True).distinct())
+            '''Batches keep IN lists under database parameter limits'''
+            for start in range(0, len(musician_ids), cls.REBUILD_BATCH_SIZE):
+                cls.index(musician_ids[start:start + cls.REBUILD_BATCH_SIZE])
+
+
+def band_member_ids(band_ids: Iterable[int]) -> List[int]:
+    return list(Band.musicians.through.objects.filter(band_id__in=band_ids)
+                .order_by().values_list('musician_id', flat=True).distinct())
+
+
+@receiver(m2m_changed, sender=Band.musicians.through)
+def index_musician_styles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_member_ids = band_member_ids([instance.id])
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            MusicianStyle.index([instance.id])
+        elif action == 'post_clear':
+            MusicianStyle.index(instance.__dict__.pop('_cleared_member_ids', []))
+        else:
+            MusicianStyle.index(pk_set)
+
+
+@receiver(m2m_changed, sender=Band.styles.through)
+def index_member_styles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_member_ids = band_member_ids(instance.bands.values('id'))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            MusicianStyle.index(band_member_ids([instance.id]))
+        elif action == 'post_clear':
+            MusicianStyle.index(instance.__dict__.pop('_cleared_member_ids', []))
+        else:
+            MusicianStyle.index(band_member_ids(pk_set))
+
+
+@receiver(pre_delete, sender=Band)
+def remember_band_members(sender, instance, **kwargs):
+    """Membership rows are deleted without m2m_changed, members are reindexed after"""
+    instance._member_ids = band_member_ids([instance.id])
+
+
+@receiver(post_delete, sender=Band)
+def reindex_band_members(sender, instance, **kwargs):
+    MusicianStyle.index(instance.__dict__.pop('_member_ids', []))
+
+
+class CityNeighbor(models.Model):
+    """
+    Precomputed distances between cities closer than MAX_DISTANCE_KM
+    Stored in both directions, so proximity search is one lookup by city
+    Kept in sync by signals below, import_city_coordinates command rebuilds it
+    """
+    MAX_DISTANCE_KM = 200
+
+    city = models.ForeignKey('City', on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey('City', on_delete=models.CASCADE, related_name='+')
+    distance_km = models.FloatField()
+
+    class Meta:
+        unique_together = ('city', 'neighbor')
+        indexes = [
+            models.Index(fields=['city', 'distance_km'], name='city_neighbor_distance'),
+        ]
+
+    def __str__(self):
+        return f'{self.city_id} - {self.neighbor_id}: {self.distance_km:.1f} km'
+
+    def __repr__(self):
+        return f'<CityNeighbor: {self.city_id} - {self.neighbor_id}: {self.distance_km:.1f} km>'
+
+    @classmethod
+    def within(cls, city_id: int, distance_km: float) -> List[int]:
+        """City itself and all cities not farther than distance_km"""
+        neighbors = cls.objects.filter(city_id=city_id, distance_km__lte=distance_km)
+        return [city_id, *neighbors.values_list('neighbor_id', flat=True)]
+
+    @classmethod
+    def index(cls, city_ids: Iterable[int]):
+        """Recomputes neighbors of changed cities against all located cities"""
+        city_ids = set(city_ids)
+        points = {
+            city_id: (latitude, longitude) for city_id, latitude, longitude
+            in City.objects.exclude(latitude=None).exclude(longitude=None)
+            .values_list('id', 'latitude', 'longitude')
+        }
+        rows = []
+        for city_id in city_ids & set(points):
+            latitude, longitude = points[city_id]
+            for other_id, (other_latitude, other_longitude) in points.items():
+                if other_id == city_id:
+                    continue
+                distance = geo.haversine_km(latitude, longitude, other_latitude, other_longitude)
+                if distance <= cls.MAX_DISTANCE_KM and not (other_id in city_ids and other_id < city_id):
+                    rows += [cls(city_id=city_id, neighbor_id=other_id, distance_km=distance),
+                             cls(city_id=other_id, neighbor_id=city_id, distance_km=distance)]
+        with transaction.atomic():
+            cls.objects.filter(models.Q(city_id__in=city_ids) | models.Q(neighbor_id__in=city_ids)).delete()
+            cls.objects.bulk_create(rows, batch_size=bulk_batch_size(cls, 1000))
+
+    @classmethod
+    def rebuild(cls):
+        points = {
+            city_id: (latitude, longitude) for city_id, latitude, longitude
+            in City.objects.exclude(latitude=None).exclude(longitude=None)
+            .values_list('id', 'latitude', 'longitude')
+        }
+        rows = []
+        for city_id, other_id, distance in geo.pairs_within(points, cls.MAX_DISTANCE_KM):
+            rows += [cls(city_id=city_id, neighbor_id=other_id, distance_km=distance),
+                     cls(city_id=other_id, neighbor_id=city_id, distance_km=distance)]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=bulk_batch_size(cls, 1000))
+
+
+@receiver(post_init, sender=City)
+def remember_coordinates(sender, instance, **kwargs):
+    '''Read from __dict__, so deferred coordinates are not loaded'''
+    instance._coordinates = (instance.__dict__.get('latitude'), instance.__dict__.get('longitude'))
+
+
+@receiver(post_save, sender=City)
+def index_city_neighbors(sender, instance, created, **kwargs):
+    coordinates = (instance.latitude, instance.longitude)
+    moved = None not in coordinates if created else coordinates != instance._coordinates
+    if moved:
+        CityNeighbor.index([instance.id])
+        instance._coordinates = coordinates
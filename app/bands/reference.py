@@ -0,0 +1,103 @@
+import time
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, NamedTuple
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from bands.models import City, Instrument, InstrumentCategory, Style
+from helpers.metrics import record_cache
+
+
+class Table(NamedTuple):
+    version: Optional[int]
+    loaded_at: float
+    rows: list
+    by_id: dict
+
+
+class ReferenceData:
+    """
+    Process-local cache of lookup tables which almost never change
+    Every table has version key in shared cache, bumped when any row changes,
+    so all workers reload the table on next access
+    Tables also expire after `timeout` seconds in case a bump was lost
+    """
+
+    VERSION_KEY = 'reference_data:{}:version'
+    CHANGED_KEY = 'reference_data:{}:changed_at'
+    timeout = 300
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables = {}
+
+    def version_key(self, model) -> str:
+        return self.VERSION_KEY.format(model._meta.label_lower)
+
+    def changed_key(self, model) -> str:
+        return self.CHANGED_KEY.format(model._meta.label_lower)
+
+    def table(self, model) -> Table:
+        version = cache.get(self.version_key(model))
+        table = self.tables.get(model)
+        stale = (table is None or table.version != version
+                 or time.monotonic() - table.loaded_at > self.timeout)
+        record_cache('reference_data', not stale)
+        if stale:
+            rows = list(model.objects.order_by('id'))
+            table = Table(version, time.monotonic(), rows, {row.id: row for row in rows})
+            with self.lock:
+                self.tables[model] = table
+        return table
+
+    def all(self, model) -> List[models.Model]:
+        return self.table(model).rows
+
+    def get(self, model, id: int) -> Optional[models.Model]:
+        return self.table(model).by_id.get(id)
+
+    def stamp(self, *models) -> str:
+        '''Versions of tables together, for keys of caches rendering their rows'''
+        versions = cache.get_many([self.version_key(model) for model in models])
+        return '.'.join(str(versions.get(self.version_key(model), 0)) for model in models)
+
+    def changed_at(self, *models) -> datetime:
+        '''Last change of any of tables, for Last-Modified of pages showing their rows'''
+        keys = [self.changed_key(model) for model in models]
+        stamps = cache.get_many(keys)
+        for key in keys:
+            if key not in stamps:
+                '''Lost stamp restarts from now, so clients can't keep pages older than it'''
+                cache.add(key, time.time(), None)
+                stamps[key] = cache.get(key)
+        return datetime.fromtimestamp(max(stamps.values()), timezone.utc)
+
+    def invalidate(self, model):
+        key = self.version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+        cache.set(self.changed_key(model), time.time(), None)
+        with self.lock:
+            self.tables.pop(model, None)
+
+
+reference_data = ReferenceData()
+
+REFERENCE_MODELS = (City, Instrument, InstrumentCategory, Style)
+
+
+def invalidate_reference_data(sender, **kwargs):
+    '''Bump now for this transaction and again after commit for other workers'''
+    reference_data.invalidate(sender)
+    transaction.on_commit(lambda: reference_data.invalidate(sender))
+
+
+for reference_model in REFERENCE_MODELS:
+    receiver(post_save, sender=reference_model)(invalidate_reference_data)
+    receiver(post_delete, sender=reference_model)(invalidate_reference_data)
@@ -1,20 +1,39 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
 from django.shortcuts import reverse
-from django.http import HttpResponse, HttpRequest
+from django.http import HttpResponse, HttpRequest, Http404
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.contrib import auth
+from django.db import connection
 from django.db.models.query import QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.utils import timezone
 import factory
 
 from bands.models import (
     City, InstrumentCategory, Instrument, Style,
-    Musician, Band,
+    Musician, Band, Facet, FacetCount, BandBucket, MusicianStyle, CityNeighbor, create_musicians,
 )
+from bands.forms import MusicianFilterForm, MusicianProfileForm, BandEditForm
+from bands.reference import reference_data
+from bands.facets import musician_index, MusicianFacetIndex, IdSet, ids_to_bits
+from bands.matching import suggest_musicians, BitSlicedCounter
 from bands.views import (
     UserDashboardView, ProfileEditView, MusiciansView, BandsDashboardView,
     BandEditView, BandsView,
 )
 from users.views import LogInView, LogOutView
+from helpers.query_budget import QueryBudgetMixin
+from helpers.authority import check_user
+from helpers.pagination import EstimatedCountPaginator
+from helpers import minhash, geo
 
 
 class CityFactory(factory.DjangoModelFactory):
@@ -304,6 +323,65 @@ class TestProfileView(TestCase):
         self.assertEqual(user.musician.instruments.all()[0].name, 'Guitar')
 
 
+class TestMusicianSync(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sync_user', password='password')
+
+    def musician_queries(self, queries):
+        return [query['sql'] for query in queries if '"bands_musician"' in query['sql']]
+
+    def test_login_skips_musician(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.client.login(username='sync_user', password='password'))
+        self.assertEqual(self.musician_queries(queries), [])
+
+    def test_unrelated_user_save_skips_musician(self):
+        user = User.objects.get(id=self.user.id)
+        user.email = 'sync@test.test'
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertEqual(self.musician_queries(queries), [])
+
+    def test_changed_musician_columns_only(self):
+        city = CityFactory()
+        user = User.objects.get(id=self.user.id)
+        user.musician.city = city
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        updates = [sql for sql in self.musician_queries(queries) if sql.startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"city_id"', updates[0])
+        self.assertNotIn('"bio"', updates[0])
+        self.assertEqual(Musician.objects.get(user=user).city, city)
+
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertEqual(self.musician_queries(queries), [])
+
+    def test_username_change_updates_search_name(self):
+        Musician.objects.filter(user=self.user).update(first_name='Björk')
+        user = User.objects.get(id=self.user.id)
+        user.username = 'renamed'
+        user.save()
+        self.assertEqual(Musician.objects.get(user=user).search_name, 'bjork renamed')
+
+        user.username = 'not_saved'
+        user.save(update_fields=['email'])
+        self.assertEqual(Musician.objects.get(user=user).search_name, 'bjork renamed')
+
+    def test_create_musicians_in_bulk(self):
+        User.objects.bulk_create([User(username=f'bulk_{n}') for n in range(5)])
+        users = User.objects.filter(username__startswith='bulk_')
+        with CaptureQueriesContext(connection) as queries:
+            create_musicians(users, batch_size=3)
+        inserts = [sql for sql in self.musician_queries(queries) if sql.startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(
+            sorted(Musician.objects.filter(user__in=users).values_list('search_name', flat=True)),
+            [f'bulk {n}' for n in range(5)])
+
+
 class TestMusiciansViews(TestCase):
 
     MUSICIANS_URL = reverse(MusiciansView.name)
@@ -367,6 +445,8 @@ class TestMusiciansViews(TestCase):
         InstrumentCategoryFactory.reset_sequence()
 
     def setUp(self):
+        '''Data outlives test transactions here, so cached pages are dropped'''
+        caches['responses'].clear()
         # to reset django cache
         request = HttpRequest()
         musicians_view = MusiciansView()
@@ -438,6 +518,913 @@ class TestMusiciansViews(TestCase):
             self.assertTrue(musician.is_busy)
 
 
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TestMusiciansQueryBudget(QueryBudgetMixin, TestCase):
+
+    MUSICIANS_URL = reverse(MusiciansView.name)
+
+    def setUp(self):
+        cities = CityFactory.create_batch(size=2)
+        instruments = InstrumentFactory.create_batch(size=4)
+        users = UserFactory.create_batch(size=12)
+        for n, user in enumerate(users):
+            user.musician.city = cities[n % 2]
+            user.musician.activated = True
+            user.musician.save()
+            user.musician.instruments.add(*instruments[n % 2:])
+        '''Budget is for warm workers, reference data is already loaded'''
+        reference_data.all(City)
+        reference_data.all(Instrument)
+
+    def tearDown(self):
+        StyleFactory.reset_sequence()
+        UserFactory.reset_sequence()
+        CityFactory.reset_sequence()
+        InstrumentFactory.reset_sequence()
+        InstrumentCategoryFactory.reset_sequence()
+
+    def test_musicians_list_budget(self):
+        response: HttpResponse = self.assertQueryBudget(MusiciansView, self.MUSICIANS_URL)
+        self.assertEqual(len(response.context[0].get('musicians')), 9)
+
+        response: HttpResponse = self.assertQueryBudget(MusiciansView,
+                                                        f'{self.MUSICIANS_URL}?page=2')
+        self.assertEqual(len(response.context[0].get('musicians')), 3)
+
+    def test_musicians_filtered_list_budget(self):
+        city = City.objects.first()
+        instrument = Instrument.objects.last()
+        response: HttpResponse = self.assertQueryBudget(
+            MusiciansView, f'{self.MUSICIANS_URL}?city={city.id}&instrument={instrument.id}')
+        self.assertEqual(len(response.context[0].get('musicians')), 6)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TestMusiciansCursorPagination(TestCase):
+
+    MUSICIANS_URL = reverse(MusiciansView.name)
+
+    def setUp(self):
+        users = UserFactory.create_batch(size=20)
+        for n, user in enumerate(users):
+            user.musician.is_busy = bool(n % 2)
+            user.musician.activated = True
+            user.musician.save()
+
+    def tearDown(self):
+        UserFactory.reset_sequence()
+
+    def test_cursor_walk(self):
+        response: HttpResponse = self.client.get(self.MUSICIANS_URL)
+        first_page = response.context[0].get('musicians')
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        seen = [musician.id for musician in first_page]
+        page = first_page
+        while page.has_next():
+            response = self.client.get(f'{self.MUSICIANS_URL}?cursor={page.next_cursor}')
+            page = response.context[0].get('musicians')
+            seen += [musician.id for musician in page]
+
+        expected = list(Musician.activated_objects.order_by('is_busy', 'id')
+                        .values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(f'{self.MUSICIANS_URL}?cursor={page.previous_cursor}')
+        previous_page = response.context[0].get('musicians')
+        self.assertEqual([musician.id for musician in previous_page], expected[9:18])
+        self.assertTrue(previous_page.has_next())
+        self.assertTrue(previous_page.has_previous())
+
+    def test_cursor_no_count(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.MUSICIANS_URL)
+        self.assertFalse(any('COUNT' in query['sql'] for query in context.captured_queries))
+
+    def test_invalid_cursor(self):
+        response: HttpResponse = self.client.get(f'{self.MUSICIANS_URL}?cursor=broken')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context[0].get('musicians')), 9)
+
+    def test_page_number_mode(self):
+        response: HttpResponse = self.client.get(f'{self.MUSICIANS_URL}?page=3')
+        page = response.context[0].get('musicians')
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 2)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TestEstimatedCountPaginator(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        users = UserFactory.create_batch(size=5)
+        for user in users:
+            user.musician.activated = True
+            user.musician.save()
+
+    def tearDown(self):
+        cache.clear()
+        UserFactory.reset_sequence()
+
+    def test_small_count_is_exact(self):
+        paginator = EstimatedCountPaginator(Musician.activated_objects.order_by('id'), 2)
+        self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.is_estimated)
+
+    def test_large_count_is_cached(self):
+        EstimatedCountPaginator.threshold, threshold = 3, EstimatedCountPaginator.threshold
+        try:
+            paginator = EstimatedCountPaginator(Musician.activated_objects.order_by('id'), 2)
+            self.assertEqual(paginator.count, 5)
+            self.assertFalse(paginator.is_estimated)
+
+            paginator = EstimatedCountPaginator(Musician.activated_objects.order_by('id'), 2)
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 5)
+            self.assertTrue(paginator.is_estimated)
+            self.assertEqual(paginator.num_pages, 3)
+        finally:
+            EstimatedCountPaginator.threshold = threshold
+
+    def test_musicians_page_mode_count(self):
+        response: HttpResponse = self.client.get(f'{reverse(MusiciansView.name)}?page=1')
+        self.assertContains(response, '5 results')
+
+
+@override_settings(MUSICIAN_FACET_INDEX=True, RESPONSE_CACHE_TIMEOUT=0)
+class TestMusicianFacetIndex(TransactionTestCase):
+
+    MUSICIANS_URL = reverse(MusiciansView.name)
+
+    def setUp(self):
+        cache.clear()
+        musician_index.invalidate()
+        self.cities = CityFactory.create_batch(size=2)
+        self.instruments = InstrumentFactory.create_batch(size=3)
+        users = UserFactory.create_batch(size=12)
+        for n, user in enumerate(users):
+            user.musician.city = self.cities[n % 2]
+            user.musician.is_busy = n % 3 == 0
+            user.musician.activated = n != 11
+            user.musician.save()
+            user.musician.instruments.add(self.instruments[n % 3])
+
+    def tearDown(self):
+        cache.clear()
+        musician_index.invalidate()
+        UserFactory.reset_sequence()
+        CityFactory.reset_sequence()
+        InstrumentFactory.reset_sequence()
+        InstrumentCategoryFactory.reset_sequence()
+
+    def assertMatchesDatabase(self, city=None, instrument=None):
+        musicians = Musician.activated_objects.order_by('is_busy', 'id')
+        if city:
+            musicians = musicians.filter(city=city)
+        if instrument:
+            musicians = musicians.filter(instruments=instrument)
+        bits = musician_index.filter(city_id=city and city.id,
+                                     instrument_id=instrument and instrument.id)
+        ids, _, _ = musician_index.page(bits, per_page=100)
+        self.assertEqual(ids, list(musicians.values_list('id', flat=True)))
+        self.assertEqual(musician_index.count(bits), musicians.count())
+
+    def test_filters(self):
+        self.assertMatchesDatabase()
+        self.assertMatchesDatabase(city=self.cities[0])
+        self.assertMatchesDatabase(instrument=self.instruments[1])
+        self.assertMatchesDatabase(city=self.cities[1], instrument=self.instruments[2])
+
+    def test_incremental_updates(self):
+        musician_index.ensure_fresh()
+        musician = Musician.activated_objects.filter(city=self.cities[0]).first()
+        musician.city = self.cities[1]
+        musician.is_busy = not musician.is_busy
+        musician.save()
+        musician.instruments.clear()
+        musician.instruments.add(self.instruments[0], self.instruments[1])
+        self.instruments[2].musicians.remove(Musician.objects.last())
+        Musician.objects.filter(activated=True).last().user.delete()
+
+        with self.assertNumQueries(0):
+            '''Updated in place, no rebuild'''
+            musician_index.filter(city_id=self.cities[1].id)
+        self.assertMatchesDatabase(city=self.cities[1])
+        self.assertMatchesDatabase(instrument=self.instruments[0])
+        self.assertMatchesDatabase(instrument=self.instruments[2])
+
+        self.cities[0].delete()
+        self.assertMatchesDatabase(city=self.cities[1])
+
+    def test_removal_changes_only_sets_of_musician(self):
+        musician_index.ensure_fresh()
+        musician = Musician.activated_objects.filter(instruments=self.instruments[0]).first()
+        untouched = {instrument.id: musician_index.instruments[instrument.id].bits
+                     for instrument in self.instruments[1:]}
+        musician.user.delete()
+        for instrument_id, bits in untouched.items():
+            self.assertIs(musician_index.instruments[instrument_id].bits, bits)
+        self.assertMatchesDatabase(instrument=self.instruments[0])
+        self.assertMatchesDatabase(city=musician.city)
+
+    def test_sparse_sets(self):
+        sparse = IdSet([10 ** 6, 7])
+        self.assertIsNone(sparse.bits)
+        self.assertEqual(list(sparse.ids), [7, 10 ** 6])
+        sparse.add(3)
+        sparse.discard(10 ** 6)
+        sparse.discard(5)
+        self.assertEqual(list(sparse), [3, 7])
+        '''Bitmap once it takes less memory than array'''
+        for musician_id in range(1, 20):
+            sparse.add(musician_id)
+        self.assertIsNone(sparse.ids)
+        sparse.discard(7)
+        self.assertEqual(list(sparse), [n for n in range(1, 20) if n != 7])
+        musician_index.ensure_fresh()
+        self.assertEqual(musician_index.bits(musician_index.cities, [city.id for city in self.cities]),
+                         ids_to_bits(Musician.objects.values_list('id', flat=True), 10 ** 3))
+
+    def test_stale_generation_rebuilds(self):
+        musician_index.ensure_fresh()
+        Musician.objects.update(is_busy=True)
+        cache.incr(MusicianFacetIndex.GENERATION_KEY)
+        self.assertMatchesDatabase()
+        bits = musician_index.filter()
+        self.assertEqual(bits & musician_index.busy, bits)
+
+    def test_view_cursor_walk(self):
+        expected = list(Musician.activated_objects.filter(city=self.cities[0])
+                        .order_by('is_busy', 'id').values_list('id', flat=True))
+        url = f'{self.MUSICIANS_URL}?city={self.cities[0].id}'
+        response: HttpResponse = self.client.get(url)
+        self.assertEqual(response.context[0].get('results_count'), len(expected))
+        page = response.context[0].get('musicians')
+        seen = [musician.id for musician in page]
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(f'{self.MUSICIANS_URL}?cursor=')
+        page = response.context[0].get('musicians')
+        self.assertEqual(len(page), 9)
+        response = self.client.get(f'{self.MUSICIANS_URL}?cursor={page.next_cursor}')
+        page = response.context[0].get('musicians')
+        self.assertEqual(len(page), 2)
+        self.assertFalse(page.has_next())
+        response = self.client.get(f'{self.MUSICIANS_URL}?cursor={page.previous_cursor}')
+        page = response.context[0].get('musicians')
+        self.assertEqual(len(page), 9)
+        self.assertFalse(page.has_previous())
+
+
+class TestFacetCounts(TestCase):
+
+    def setUp(self):
+        self.cities = CityFactory.create_batch(size=2)
+        self.instruments = InstrumentFactory.create_batch(size=2)
+        self.styles = StyleFactory.create_batch(size=2)
+        self.users = UserFactory.create_batch(size=4)
+        for n, user in enumerate(self.users):
+            user.musician.city = self.cities[n % 2]
+            user.musician.activated = n < 3
+            user.musician.save()
+            user.musician.instruments.add(self.instruments[n % 2])
+        self.bands = [BandFactory.create(styles=self.styles[:n + 1], city=self.cities[n],
+                                         admin=self.users[n]) for n in range(2)]
+
+    def tearDown(self):
+        StyleFactory.reset_sequence()
+        UserFactory.reset_sequence()
+        BandFactory.reset_sequence()
+        CityFactory.reset_sequence()
+        InstrumentFactory.reset_sequence()
+        InstrumentCategoryFactory.reset_sequence()
+
+    def assertCountsConsistent(self):
+        facets = [facet for facet, _ in Facet.choices]
+        maintained = {facet: {value_id: count for value_id, count in values.items() if count}
+                      for facet, values in FacetCount.counts(facets).items()}
+        FacetCount.rebuild()
+        self.assertEqual(maintained, FacetCount.counts(facets))
+
+    def test_counts(self):
+        counts = FacetCount.counts([Facet.MUSICIAN_CITY, Facet.BAND_STYLE])
+        self.assertEqual(counts[Facet.MUSICIAN_CITY], {self.cities[0].id: 2, self.cities[1].id: 1})
+        self.assertEqual(counts[Facet.BAND_STYLE], {self.styles[0].id: 2, self.styles[1].id: 1})
+        self.assertCountsConsistent()
+
+    def test_activation_and_city_change(self):
+        musician = Musician.objects.get(id=self.users[3].musician.id)
+        musician.activated = True
+        musician.city = self.cities[0]
+        musician.save()
+        musician = Musician.objects.only('id').get(id=self.users[0].musician.id)
+        musician.activated = False
+        musician.save()
+        self.assertCountsConsistent()
+
+    def test_m2m_changes(self):
+        musician = self.users[0].musician
+        musician.instruments.add(*self.instruments)
+        musician.instruments.remove(self.instruments[0], self.instruments[0])
+        self.instruments[1].musicians.remove(self.users[1].musician, self.users[3].musician)
+        self.instruments[0].musicians.add(self.users[1].musician)
+        self.bands[1].styles.clear()
+        self.styles[1].bands.add(*self.bands)
+        self.styles[0].bands.clear()
+        self.assertCountsConsistent()
+
+    def test_deletes(self):
+        self.users[1].delete()
+        self.bands[0].delete()
+        self.cities[1].delete()
+        self.instruments[0].delete()
+        self.assertCountsConsistent()
+
+    def test_filter_form_labels(self):
+        form = MusicianFilterForm()
+        labels = [label for _, label in form.fields['instrument'].choices]
+        self.assertIn('instrument_0 (2)', labels)
+        self.assertIn('instrument_1 (1)', labels)
+
+
+class TestReferenceData(TestCase):
+
+    def setUp(self):
+        self.cities = CityFactory.create_batch(size=2)
+        self.instruments = InstrumentFactory.create_batch(size=2)
+
+    def tearDown(self):
+        CityFactory.reset_sequence()
+        InstrumentFactory.reset_sequence()
+        InstrumentCategoryFactory.reset_sequence()
+
+    def test_choices_cached(self):
+        list(MusicianFilterForm().fields['city'].choices)
+        with CaptureQueriesContext(connection) as context:
+            form = MusicianFilterForm()
+            choices = [label for _, label in form.fields['city'].choices]
+        self.assertEqual(choices[1:], ['city_0 (0)', 'city_1 (0)'])
+        self.assertFalse(any('bands_city' in query['sql'] for query in context.captured_queries))
+
+    def test_invalidation(self):
+        self.assertEqual(reference_data.get(City, self.cities[0].id).name, 'city_0')
+        self.cities[0].name = 'renamed'
+        self.cities[0].save()
+        self.assertEqual(reference_data.get(City, self.cities[0].id).name, 'renamed')
+        self.cities[1].delete()
+        self.assertEqual(reference_data.all(City), [self.cities[0]])
+
+    def test_validation(self):
+        form = MusicianFilterForm({'city': self.cities[1].id, 'instrument': 'wrong'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('instrument', form.errors)
+        self.assertEqual(form.cleaned_data['city'], self.cities[1])
+
+        form = MusicianProfileForm({'instruments': [self.instruments[0].id, 0]})
+        self.assertFalse(form.is_valid())
+        form = MusicianProfileForm({'instruments': [instrument.id for instrument in self.instruments]})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['instruments'], self.instruments)
+
+
+class TestMatchmaking(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        musician_index.invalidate()
+        self.cities = CityFactory.create_batch(size=2)
+        self.instruments = InstrumentFactory.create_batch(size=3)
+        self.styles = StyleFactory.create_batch(size=2)
+        self.users = UserFactory.create_batch(size=10)
+        for n, user in enumerate(self.users):
+            user.musician.city = self.cities[n % 2]
+            user.musician.is_busy = n == 9
+            user.musician.activated = n != 8
+            user.musician.save()
+            user.musician.instruments.add(self.instruments[n % 3])
+        self.band = BandFactory.create(styles=(self.styles[0], ), city=self.cities[0],
+                                       admin=self.users[0])
+        self.band.musicians.add(self.users[0].musician, self.users[1].musician)
+        other_band = BandFactory.create(styles=self.styles, admin=self.users[1])
+        other_band.musicians.add(self.users[6].musician, self.users[7].musician)
+
+    def tearDown(self):
+        cache.clear()
+        musician_index.invalidate()
+        UserFactory.reset_sequence()
+        CityFactory.reset_sequence()
+        StyleFactory.reset_sequence()
+        BandFactory.reset_sequence()
+        InstrumentFactory.reset_sequence()
+        InstrumentCategoryFactory.reset_sequence()
+
+    def test_ranking(self):
+        '''Members play instruments 0 and 1, so only instrument 2 is lacking'''
+        suggested = [musician.user for musician in suggest_musicians(self.band, limit=10)]
+        users = self.users
+        self.assertEqual(suggested, [
+            users[2],  # city, lacking instrument
+            users[6],  # city, style
+            users[4],  # city
+            users[5],  # lacking instrument
+            users[7],  # style
+        ])
+
+    def test_index_matches_database(self):
+        expected = suggest_musicians(self.band, limit=10)
+        with override_settings(MUSICIAN_FACET_INDEX=1):
+            self.assertEqual(suggest_musicians(self.band, limit=10), expected)
+            self.assertEqual(suggest_musicians(self.band, limit=2), expected[:2])
+
+    def test_band_page_queries(self):
+        '''Suggestions read precomputed styles of musicians, so queries don't grow with bands'''
+        url = reverse(BandsView.name, args=(self.band.id, ))
+        '''Same styles and city, so similar bands are always shown, few musicians, so every
+        level of suggestions is queried'''
+        BandFactory.create(styles=(self.styles[0], ), city=self.cities[0], admin=self.users[2])
+        self.client.get(url)
+        with self.assertNumQueries(19):
+            self.client.get(url)
+        for user in self.users[2:6]:
+            BandFactory.create(styles=self.styles, admin=user).musicians.add(user.musician)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        self.assertEqual(len(context.captured_queries), 19)
+        self.assertFalse(any('bands_band_musicians' in query['sql'] and 'bands_band_styles' in query['sql']
+                             for query in context.captured_queries))
+
+    def test_musician_styles_follow_bands(self):
+        def styles(user):
+            played = MusicianStyle.objects.filter(musician=user.musician)
+            return set(played.values_list('style_id', flat=True))
+
+        self.assertEqual(styles(self.users[0]), {self.styles[0].id})
+        self.assertEqual(styles(self.users[6]), {style.id for style in self.styles})
+        self.band.styles.add(self.styles[1])
+        self.assertEqual(styles(self.users[0]), {style.id for style in self.styles})
+        self.styles[1].bands.clear()
+        self.assertEqual(styles(self.users[6]), {self.styles[0].id})
+        self.users[6].musician.bands.clear()
+        self.assertEqual(styles(self.users[6]), set())
+        self.band.musicians.add(self.users[6].musician)
+        self.assertEqual(styles(self.users[6]), {self.styles[0].id})
+        rows = set(MusicianStyle.objects.values_list('musician_id', 'style_id'))
+        MusicianStyle.rebuild()
+        self.assertEqual(set(MusicianStyle.objects.values_list('musician_id', 'style_id')), rows)
+        self.band.delete()
+        self.assertEqual(styles(self.users[0]), set())
+
+    def test_bit_sliced_counter(self):
+        counter = BitSlicedCounter()
+        counter.add(0b1110, 3)
+        counter.add(0b0101, 1)
+        counter.add(0b0110, 2)
+        self.assertEqual([counter.equal_to(score, 0b1111) for score in range(7)],
+                         [0, 0b0001, 0, 0b1000, 0, 0b0010, 0b0100])
+        self.assertEqual(counter.top(0b1111, 3), [2, 1, 3])
+        self.assertEqual(counter.top(0b1101, 10), [2, 3, 0])
+        '''Higher plane first, as for band without city'''
+        counter = BitSlicedCounter()
+        counter.add(0b0110, 2)
+        counter.add(0b0011, 1)
+        self.assertEqual(counter.top(0b1111, 10), [1, 2, 0])
+
+    def test_band_page_shows_suggestions(self):
+        response = self.client.get(reverse(BandsView.name, args=(self.band.id, )))
+        self.assertEqual(response.context['suggested_musicians'][0].user, self.users[2])
+        self.assertContains(response, 'Suggested musicians')
+
+
+class TestSimilarBands(TestCase):
+
+    def setUp(self):
+        self.city = CityFactory.create()
+        self.styles = StyleFactory.create_batch(size=4)
+        self.admin = UserFactory.create()
+        self.band = BandFactory.create(styles=self.styles[:3], city=self.city, admin=self.admin)
+        self.twin = BandFactory.create(styles=self.styles[:3], city=self.city, admin=self.admin)
+        self.unrelated = BandFactory.create(styles=self.styles[3:], admin=self.admin)
+
+    def tearDown(self):
+        UserFactory.reset_sequence()
+        CityFactory.reset_sequence()
+        StyleFactory.reset_sequence()
+        BandFactory.reset_sequence()
+
+    def test_identical_bands_share_all_buckets(self):
+        self.assertEqual(BandBucket.objects.filter(band=self.band).count(), minhash.BANDS)
+        self.assertEqual(BandBucket.similar(self.band), [self.twin])
+        self.assertEqual(BandBucket.similar(self.unrelated), [])
+
+    def test_signature_estimates_jaccard(self):
+        first = minhash.signature(f'style:{n}' for n in range(20))
+        second = minhash.signature(f'style:{n}' for n in range(10, 30))
+        agreement = sum(a == b for a, b in zip(first, second)) / len(first)
+        self.assertLess(abs(agreement - 1 / 3), 0.25)
+        self.assertEqual(minhash.buckets([]), [])
+
+    def test_index_follows_styles_and_city(self):
+        self.twin.styles.set(self.styles[3:])
+        self.twin.city = None
+        self.twin.save()
+        self.assertEqual(BandBucket.similar(self.band), [])
+        self.assertEqual(BandBucket.similar(self.unrelated), [self.twin])
+
+        self.styles[3].bands.clear()
+        self.assertEqual(BandBucket.similar(self.unrelated), [])
+
+        self.twin.styles.set(self.styles[:3])
+        self.twin.city = self.city
+        self.twin.save()
+        self.city.delete()
+        self.assertEqual(BandBucket.similar(self.band), [self.twin])
+
+    def test_unchanged_signature_is_not_rewritten(self):
+        with CaptureQueriesContext(connection) as context:
+            BandBucket.index([self.band.id])
+        self.assertFalse([query for query in context.captured_queries
+                          if 'DELETE' in query['sql'] or 'INSERT' in query['sql']])
+
+    def test_band_page_shows_similar_bands(self):
+        response = self.client.get(reverse(BandsView.name, args=(self.band.id, )))
+        self.assertEqual(response.context['similar_bands'], [self.twin])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TestCityNeighbors(TestCase):
+
+    def setUp(self):
+        self.berlin = City.objects.create(name='Berlin', latitude=52.52, longitude=13.405)
+        self.potsdam = City.objects.create(name='Potsdam', latitude=52.39, longitude=13.065)
+        self.hamburg = City.objects.create(name='Hamburg', latitude=53.55, longitude=9.99)
+        self.nowhere = City.objects.create(name='Nowhere')
+
+    def tearDown(self):
+        UserFactory.reset_sequence()
+        BandFactory.reset_sequence()
+
+    def test_neighbors_are_stored_both_ways(self):
+        self.assertEqual(CityNeighbor.within(self.berlin.id, 50), [self.berlin.id, self.potsdam.id])
+        self.assertEqual(CityNeighbor.within(self.potsdam.id, 50), [self.potsdam.id, self.berlin.id])
+        self.assertEqual(CityNeighbor.within(self.berlin.id, 20), [self.berlin.id])
+        self.assertEqual(CityNeighbor.within(self.hamburg.id, 200), [self.hamburg.id])
+        self.assertEqual(CityNeighbor.within(self.nowhere.id, 200), [self.nowhere.id])
+        distance = CityNeighbor.objects.get(city=self.berlin, neighbor=self.potsdam).distance_km
+        self.assertAlmostEqual(distance, 26.7, delta=1)
+
+    def test_moved_city_is_reindexed(self):
+        self.hamburg.latitude, self.hamburg.longitude = 52.45, 13.3
+        self.hamburg.save()
+        self.assertEqual(set(CityNeighbor.within(self.berlin.id, 50)),
+                         {self.berlin.id, self.potsdam.id, self.hamburg.id})
+        self.hamburg.name = 'Renamed'
+        with self.assertNumQueries(1):
+            self.hamburg.save()
+
+    def test_rebuild_matches_incremental_index(self):
+        rows = set(CityNeighbor.objects.values_list('city_id', 'neighbor_id'))
+        CityNeighbor.rebuild()
+        self.assertEqual(set(CityNeighbor.objects.values_list('city_id', 'neighbor_id')), rows)
+
+    def test_rebuild_over_sqlite_batch_limit(self):
+        '''SQLite inserts at most 500 rows per statement'''
+        City.objects.bulk_create(
+            City(name=f'Block {number}', latitude=50 + number / 1000, longitude=10)
+            for number in range(40))
+        CityNeighbor.rebuild()
+        self.assertGreater(CityNeighbor.objects.count(), 1000)
+
+    def test_import_coordinates(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write('name,latitude,longitude\nNowhere,52.4,13.1\nLeipzig,51.34,12.37\n')
+        call_command('import_city_coordinates', file.name, '--create', stdout=io.StringIO())
+        os.remove(file.name)
+        self.assertIn(self.nowhere.id, CityNeighbor.within(self.potsdam.id, 10))
+        leipzig = City.objects.get(name='Leipzig')
+        self.assertIn(self.berlin.id, CityNeighbor.within(leipzig.id, 200))
+        self.assertIn(leipzig, reference_data.all(City))
+
+    def test_distance_filters(self):
+        users = UserFactory.create_batch(size=2)
+        for user, city in zip(users, (self.berlin, self.potsdam)):
+            user.musician.city = city
+            user.musician.activated = True
+            user.musician.save()
+        BandFactory.create(city=self.potsdam, admin=users[0])
+
+        url = reverse(MusiciansView.name)
+        response = self.client.get(url, {'city': self.berlin.id})
+        self.assertEqual(len(response.context['musicians']), 1)
+        response = self.client.get(url, {'city': self.berlin.id, 'distance': '50'})
+        self.assertEqual(len(response.context['musicians']), 2)
+        with override_settings(MUSICIAN_FACET_INDEX=1):
+            musician_index.invalidate()
+            response = self.client.get(url, {'city': self.berlin.id, 'distance': '50'})
+            self.assertEqual(response.context['results_count'], 2)
+        musician_index.invalidate()
+
+        url = reverse(BandsView.name)
+        response = self.client.get(url, {'city': self.berlin.id})
+        self.assertEqual(len(response.context['bands']), 0)
+        response = self.client.get(url, {'city': self.berlin.id, 'distance': '50'})
+        self.assertEqual(len(response.context['bands']), 1)
+
+    def test_pairs_within_matches_all_pairs(self):
+        points = {n: (50 + (n * 7919 % 100) / 50, 10 + (n * 104729 % 100) / 50) for n in range(60)}
+        expected = {
+            (min(a, b), max(a, b)) for a in points for b in points
+            if a != b and geo.haversine_km(*points[a], *points[b]) <= 80
+        }
+        found = {(min(a, b), max(a, b)) for a, b, _ in geo.pairs_within(points, 80)}
+        self.assertEqual(found, expected)
+
+
+class TestResponseCache(TestCase):
+
+    MUSICIANS_URL = reverse(MusiciansView.name)
+    BANDS_URL = reverse(BandsView.name)
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.city = CityFactory()
+        self.instrument = InstrumentFactory()
+        self.user = UserFactory()
+        self.user.musician.first_name = 'Cached'
+        self.user.musician.activated = True
+        self.user.musician.city = self.city
+        self.user.musician.save()
+
+    def get(self, url: str, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_anonymous_hit(self):
+        first, _ = self.get(self.MUSICIANS_URL)
+        second, executed = self.get(self.MUSICIANS_URL)
+        self.assertEqual(executed, 0)
+        self.assertEqual(first.content, second.content)
+        self.assertContains(second, 'Cached')
+
+    def test_params_are_normalized(self):
+        self.get(f'{self.MUSICIANS_URL}?city={self.city.id}&instrument={self.instrument.id}')
+        _, executed = self.get(f'{self.MUSICIANS_URL}?instrument={self.instrument.id}&city={self.city.id}')
+        self.assertEqual(executed, 0)
+        _, executed = self.get(f'{self.MUSICIANS_URL}?city={self.city.id}')
+        self.assertGreater(executed, 0)
+
+    def test_save_invalidates(self):
+        self.get(self.MUSICIANS_URL)
+        Musician.objects.filter(user=self.user).update(first_name='Stale')
+        response, _ = self.get(self.MUSICIANS_URL)
+        self.assertContains(response, 'Cached')
+
+        musician = Musician.objects.get(user=self.user)
+        musician.save()
+        response, executed = self.get(self.MUSICIANS_URL)
+        self.assertGreater(executed, 0)
+        self.assertContains(response, 'Stale')
+
+    def test_m2m_and_reference_changes_invalidate(self):
+        self.get(self.BANDS_URL)
+        band = BandFactory(admin=self.user)
+        self.assertContains(self.get(self.BANDS_URL)[0], band.name)
+
+        self.get(self.MUSICIANS_URL)
+        self.user.musician.instruments.add(self.instrument)
+        self.assertGreater(self.get(self.MUSICIANS_URL)[1], 0)
+
+        self.get(self.MUSICIANS_URL)
+        self.city.name = 'Renamed'
+        self.city.save()
+        self.assertGreater(self.get(self.MUSICIANS_URL)[1], 0)
+
+    def test_bypassed(self):
+        self.get(f'{self.MUSICIANS_URL}?q=cached')
+        self.assertGreater(self.get(f'{self.MUSICIANS_URL}?q=cached')[1], 0)
+
+        self.get(self.MUSICIANS_URL)
+        self.client.cookies['messages'] = 'pending'
+        self.assertGreater(self.get(self.MUSICIANS_URL)[1], 0)
+        del self.client.cookies['messages']
+
+        self.client.force_login(self.user)
+        self.get(self.MUSICIANS_URL)
+        self.assertGreater(self.get(self.MUSICIANS_URL)[1], 0)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.get(self.MUSICIANS_URL)
+        self.assertGreater(self.get(self.MUSICIANS_URL)[1], 0)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TestCardCache(TestCase):
+
+    MUSICIANS_URL = reverse(MusiciansView.name)
+    BANDS_URL = reverse(BandsView.name)
+
+    def setUp(self):
+        caches['template_fragments'].clear()
+        self.city = CityFactory(name='Oslo')
+        self.instrument = InstrumentFactory()
+        self.style = StyleFactory()
+        self.user = UserFactory()
+        self.musician = self.user.musician
+        self.musician.first_name = 'Carded'
+        self.musician.activated = True
+        self.musician.city = self.city
+        self.musician.save()
+        self.band = BandFactory(admin=self.user, name='Card band')
+
+    def stamp(self, model, id):
+        return model.objects.values_list('updated_at', flat=True).get(id=id)
+
+    def test_relinking_renews_updated_at(self):
+        before = self.stamp(Musician, self.musician.id)
+        self.musician.instruments.add(self.instrument)
+        after_add = self.stamp(Musician, self.musician.id)
+        self.assertGreater(after_add, before)
+        self.instrument.musicians.remove(self.musician)
+        self.assertGreater(self.stamp(Musician, self.musician.id), after_add)
+
+        before = self.stamp(Band, self.band.id)
+        self.style.bands.add(self.band)
+        after_add = self.stamp(Band, self.band.id)
+        self.assertGreater(after_add, before)
+        self.style.bands.clear()
+        self.assertGreater(self.stamp(Band, self.band.id), after_add)
+
+    def test_unchanged_card_is_reused(self):
+        self.client.force_login(self.user)
+        self.client.get(self.MUSICIANS_URL)
+        Musician.objects.filter(id=self.musician.id).update(first_name='Hidden')
+        self.assertContains(self.client.get(self.MUSICIANS_URL), 'Carded')
+
+        self.musician.refresh_from_db()
+        self.musician.save()
+        self.assertContains(self.client.get(self.MUSICIANS_URL), 'Hidden')
+
+    def test_related_changes_rerender(self):
+        self.client.force_login(self.user)
+        self.client.get(self.MUSICIANS_URL)
+        self.musician.instruments.add(self.instrument)
+        self.assertContains(self.client.get(self.MUSICIANS_URL), self.instrument.name)
+
+        self.city.name = 'Bergen'
+        self.city.save()
+        self.assertContains(self.client.get(self.MUSICIANS_URL), 'Bergen')
+
+        self.client.get(self.BANDS_URL)
+        self.band.styles.add(self.style)
+        self.assertContains(self.client.get(self.BANDS_URL), self.style.name)
+
+        self.style.name = 'Renamed style'
+        self.style.save()
+        self.assertContains(self.client.get(self.BANDS_URL), 'Renamed style')
+
+
+class TestConditionalGet(TestCase):
+
+    def setUp(self):
+        self.user = UserFactory()
+        self.musician = self.user.musician
+        self.musician.city = CityFactory()
+        self.musician.save()
+        self.band = BandFactory(admin=self.user)
+        self.band.musicians.add(self.musician)
+        self.musician_url = reverse(MusiciansView.name, args=(self.musician.id, ))
+        self.band_url = reverse(BandsView.name, args=(self.band.id, ))
+
+    def conditional_get(self, url: str, response: HttpResponse, expected_queries: int = 1, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            repeated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+        self.assertEqual(len(queries), expected_queries)
+        return repeated
+
+    def test_not_modified_after_one_query(self):
+        response = self.client.get(self.musician_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.conditional_get(self.musician_url, response).status_code, 304)
+
+        response = self.client.get(self.band_url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.conditional_get(self.band_url, response).status_code, 304)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.musician_url)
+        repeated = self.client.get(self.musician_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(repeated.status_code, 304)
+
+    def test_changes_move_stamps(self):
+        instrument = InstrumentFactory()
+        response = self.client.get(self.musician_url)
+        self.musician.instruments.add(instrument)
+        self.assertEqual(self.client.get(self.musician_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+        response = self.client.get(self.musician_url)
+        self.band.name = 'Renamed band'
+        self.band.save()
+        repeated = self.client.get(self.musician_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(repeated, 'Renamed band')
+
+        '''Http dates have whole seconds, so stamps are moved to the past first'''
+        self.move_stamps_to_past()
+        response = self.client.get(self.musician_url)
+        self.band.delete()
+        repeated = self.client.get(self.musician_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertNotEqual(repeated.status_code, 304)
+
+        self.move_stamps_to_past()
+        response = self.client.get(self.musician_url)
+        self.musician.city.name = 'Renamed city'
+        self.musician.city.save()
+        repeated = self.client.get(self.musician_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertContains(repeated, 'Renamed city')
+
+    def move_stamps_to_past(self):
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Musician.objects.update(updated_at=an_hour_ago)
+        Band.objects.update(updated_at=an_hour_ago)
+        for model in (City, Instrument):
+            cache.set(reference_data.changed_key(model), an_hour_ago.timestamp(), None)
+
+    def test_not_modified_repeats_validators(self):
+        response = self.client.get(self.musician_url)
+        repeated = self.client.get(self.musician_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(repeated['ETag'], response['ETag'])
+        self.assertEqual(repeated['Last-Modified'], response['Last-Modified'])
+
+    def test_band_page_follows_other_musicians(self):
+        response = self.client.get(self.band_url)
+        other = UserFactory().musician
+        other.activated = True
+        other.save()
+        self.assertEqual(self.client.get(self.band_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_etag_varies_by_user(self):
+        response = self.client.get(self.musician_url)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.musician_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_missing_object(self):
+        self.assertEqual(self.client.get(reverse(MusiciansView.name, args=(10 ** 6, ))).status_code, 404)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TestBandsListingsQueries(QueryBudgetMixin, TestCase):
+
+    BANDS_URL = reverse(BandsView.name)
+    BANDS_DASHBOARD_URL = reverse(BandsDashboardView.name)
+
+    @classmethod
+    def setUpTestData(cls):
+        '''1000 bands of one admin, each with city and 2 styles'''
+        cls.admin = User.objects.create_user(username='bands_admin', password='password')
+        cities = CityFactory.create_batch(size=5)
+        styles = StyleFactory.create_batch(size=4)
+        Band.objects.bulk_create([
+            Band(name=f'bulk_band_{n:04}', admin=cls.admin, city=cities[n % 5])
+            for n in range(1000)
+        ])
+        Band.styles.through.objects.bulk_create([
+            Band.styles.through(band_id=band_id, style_id=styles[(band_id + shift) % 4].id)
+            for band_id in Band.objects.values_list('id', flat=True) for shift in range(2)
+        ])
+        reference_data.all(City)
+        reference_data.all(Style)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        StyleFactory.reset_sequence()
+        CityFactory.reset_sequence()
+
+    def test_bands_list_queries(self):
+        response: HttpResponse = self.assertQueryBudget(BandsView, self.BANDS_URL)
+        page = response.context[0].get('bands')
+        self.assertEqual(len(page), 10)
+        with self.assertNumQueries(0):
+            styles = [list(band.styles.all()) for band in page]
+        self.assertTrue(all(len(band_styles) == 2 for band_styles in styles))
+
+        style = Style.objects.first()
+        response: HttpResponse = self.assertQueryBudget(
+            BandsView, f'{self.BANDS_URL}?style={style.id}&cursor={page.next_cursor}')
+        self.assertEqual(len(response.context[0].get('bands')), 10)
+
+    def test_bands_dashboard_queries(self):
+        self.client.force_login(self.admin)
+        response: HttpResponse = self.assertQueryBudget(BandsDashboardView,
+                                                        self.BANDS_DASHBOARD_URL)
+        self.assertEqual(len(response.context[0].get('bands')), 1000)
+
+
 class TestBandAdminViews(TestCase):
 
     MUSICIANS_URL = reverse(MusiciansView.name)
@@ -492,6 +1479,7 @@ class TestBandAdminViews(TestCase):
         InstrumentCategoryFactory.reset_sequence()
 
     def setUp(self):
+        caches['responses'].clear()
         # to reset django cache
         # request = HttpRequest()
         # dashboard_view = BandsDashboardView()
@@ -593,6 +1581,60 @@ class TestBandAdminViews(TestCase):
                                                   **header)
         self.assertEqual(response.status_code, 404)
 
+    def test_band_edit_single_fetch(self):
+        band_0 = Band.objects.filter(name='band_0').first()
+        with CaptureQueriesContext(connection) as context:
+            response: HttpResponse = self.client.get(f'{self.BAND_EDIT_URL}{band_0.id}/')
+        self.assertEqual(response.status_code, 200)
+        band_selects = [query['sql'] for query in context.captured_queries
+                        if query['sql'].startswith('SELECT') and 'FROM "bands_band"' in query['sql']]
+        self.assertEqual(len(band_selects), 1)
+
+    def test_band_edit_renders_only_selected_musicians(self):
+        band_0 = Band.objects.filter(name='band_0').first()
+        user_3 = User.objects.filter(username='user_3').first()
+        band_0.musicians.add(user_3.musician)
+        with CaptureQueriesContext(connection) as context:
+            response: HttpResponse = self.client.get(f'{self.BAND_EDIT_URL}{band_0.id}/')
+        '''Request user, then selected musicians joined with their users'''
+        user_selects = [query['sql'] for query in context.captured_queries
+                        if '"auth_user"' in query['sql']]
+        self.assertEqual(len(user_selects), 2)
+        self.assertContains(response, f'<option value="{user_3.musician.id}" selected>')
+        self.assertContains(response, 'data-autocomplete-url="/search/autocomplete/musicians/"')
+        self.assertNotContains(response, 'user_2')
+
+    def test_band_musicians_validated_in_one_query(self):
+        musician_ids = list(Musician.activated_objects.values_list('id', flat=True))
+        field = BandEditForm.base_fields['musicians']
+        with self.assertNumQueries(1):
+            self.assertEqual(len(field.clean([str(pk) for pk in musician_ids])), len(musician_ids))
+        user_0 = User.objects.filter(username='user_0').first()
+        user_0.musician.activated = False
+        user_0.musician.save()
+        with self.assertRaises(ValidationError):
+            field.clean([str(user_0.musician.id)])
+        with self.assertRaises(ValidationError):
+            field.clean(['x'])
+
+    def test_check_user_without_fetch(self):
+        band_0 = Band.objects.filter(name='band_0').first()
+        band_1 = Band.objects.filter(name='band_1').first()
+
+        class OwnerView:
+            @check_user(model=Band, attribute='admin', fetch=False)
+            def get(self, request, id=None):
+                return self.object
+
+        request = HttpRequest()
+        request.user = auth.get_user(self.client)
+        with self.assertNumQueries(1):
+            self.assertIsNone(OwnerView().get(request, id=band_0.id))
+        with self.assertRaises(PermissionDenied):
+            OwnerView().get(request, id=band_1.id)
+        with self.assertRaises(Http404):
+            OwnerView().get(request, id=band_1.id + 5)
+
     def test_band_delete(self):
         band_0 = Band.objects.filter(name='band_0').first()
         response: HttpResponse = self.client.delete(f'{self.BAND_EDIT_URL}{band_0.id}/')
@@ -649,12 +1691,15 @@ class TestBandsView(TestCase):
         InstrumentFactory.reset_sequence()
         InstrumentCategoryFactory.reset_sequence()
 
+    def setUp(self):
+        caches['responses'].clear()
+
     def test_bands_list_view(self):
         response: HttpResponse = self.client.get(self.BANDS_URL)
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'bands/bands.html')
-        bands: QuerySet = response.context[0].get('bands')
-        self.assertEqual(bands.count(), 4)
+        bands = response.context[0].get('bands')
+        self.assertEqual(len(bands), 4)
 
     def test_band_detail_view(self):
         band = Band.objects.last()
@@ -672,14 +1717,30 @@ class TestBandsView(TestCase):
         city = City.objects.first()
         response: HttpResponse = self.client.get(f'{self.BANDS_URL}?city={city.id}')
         self.assertTemplateUsed(response, 'bands/bands.html')
-        bands: QuerySet = response.context[0].get('bands')
-        self.assertEqual(bands.count(), 2)
-        self.assertEqual(bands.order_by('id').all()[0].name, 'band_0')
-        self.assertEqual(bands.order_by('id').all()[1].name, 'band_1')
+        bands = response.context[0].get('bands')
+        self.assertEqual(len(bands), 2)
+        self.assertEqual(bands[0].name, 'band_0')
+        self.assertEqual(bands[1].name, 'band_1')
 
         style = Style.objects.last()
         response: HttpResponse = self.client.get(f'{self.BANDS_URL}?style={style.id}')
-        bands: QuerySet = response.context[0].get('bands')
-        self.assertEqual(bands.count(), 2)
-        self.assertEqual(bands.order_by('id').all()[0].name, 'band_2')
-        self.assertEqual(bands.order_by('id').all()[1].name, 'band_3')
+        bands = response.context[0].get('bands')
+        self.assertEqual(len(bands), 2)
+        self.assertEqual(bands[0].name, 'band_2')
+        self.assertEqual(bands[1].name, 'band_3')
+
+    def test_bands_pagination(self):
+        user = User.objects.first()
+        BandFactory.create_batch(size=10, admin=user)
+        expected = list(Band.objects.order_by('name', 'id').values_list('id', flat=True))
+
+        response: HttpResponse = self.client.get(self.BANDS_URL)
+        page = response.context[0].get('bands')
+        self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next())
+        response: HttpResponse = self.client.get(
+            f'{self.BANDS_URL}?cursor={page.next_cursor}')
+        next_page = response.context[0].get('bands')
+        self.assertEqual([band.id for band in page] + [band.id for band in next_page], expected)
+        self.assertFalse(next_page.has_next())
+        Band.objects.filter(id__in=[band.id for band in next_page]).delete()
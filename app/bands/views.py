@@ -1,17 +1,39 @@
-from typing import Union, Optional
+from typing import Union, Optional, Tuple, List
+from datetime import datetime
 
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpRequest, HttpResponseRedirect, QueryDict
 from django.template.response import TemplateResponse
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views import View
 from django.contrib import messages
+from django.db.models import Max
 from django.db.models.query import QuerySet
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.paginator import Page, EmptyPage, PageNotAnInteger
 
 from bands.forms import MusicianProfileForm, MusicianFilterForm, BandEditForm, BandFilterForm
-from bands.models import Musician, Instrument, Band
+from bands.models import Musician, Band, BandBucket, CityNeighbor, City, Instrument, Style
+from bands.facets import musician_index
+from bands.reference import reference_data
+from bands.matching import suggest_musicians
 from helpers.authority import check_user
+from helpers.pagination import (
+    CursorPaginator, CursorPage, InvalidCursor, EstimatedCountPaginator,
+    CursorPaginationMixin,
+)
+from helpers.conditional import ConditionalDetailMixin
+from helpers.response_cache import ResponseCacheMixin, generations
+from search.backends import search_page
+
+
+def nearby_city_ids(city_id: Union[str, int], distance: Optional[str]) -> List[int]:
+    '''City and its neighbors from precomputed distances, so filter is plain IN query'''
+    try:
+        distance_km = min(float(distance), CityNeighbor.MAX_DISTANCE_KM)
+    except (TypeError, ValueError):
+        return [int(city_id)]
+    return CityNeighbor.within(int(city_id), distance_km)
 
 
 class HomeView(View):
@@ -52,50 +74,112 @@ class ProfileEditView(LoginRequiredMixin, View):
         return render(request, 'bands/profile_edit.html', {'form': form})
 
 
-class MusiciansView(View):
+class MusiciansView(ConditionalDetailMixin, ResponseCacheMixin, CursorPaginationMixin, View):
 
     name = 'musicians'
+    cache_models = (Musician, City, Instrument)
+    cache_params = ('city', 'instrument', 'distance', 'page', 'cursor')
     form = MusicianFilterForm
+    query_budget = 4
+    per_page = 9
+    ordering = ('is_busy', 'id')
 
     def get(self, request: HttpRequest, id: Union[str, int] = None) -> TemplateResponse:
         form = self.form(request.GET)
         if not id:
-            musicians = Musician.activated_objects.all()
+            musicians = (
+                Musician.activated_objects
+                .select_related('city', 'user')
+                .prefetch_related('instruments')
+            )
             '''Check for filter params'''
             if request.GET:
                 musicians = self.apply_filters(musicians, request.GET)
-            '''Apply order'''
-            musicians = musicians.order_by('is_busy')
-
-            '''Show 9 musicians per page'''
-            paginator = Paginator(musicians, 9)
-            page = request.GET.get('page')
-            try:
-                musicians = paginator.page(page)
-            except PageNotAnInteger:
-                musicians = paginator.page(1)
-            except EmptyPage:
-                musicians = paginator.page(paginator.num_pages)
+            '''Apply stable order'''
+            musicians = musicians.order_by(*self.ordering)
+
+            '''Page numbers are kept for old links and search results, cursor mode is default'''
+            results_count = None
+            if request.GET.get('q'):
+                musicians = search_page(musicians, request.GET['q'], request.GET.get('page'), self.per_page)
+            elif 'page' in request.GET:
+                musicians = self.paginate_by_page(musicians, request.GET.get('page'))
+            elif musician_index.enabled():
+                musicians, results_count = self.paginate_by_index(musicians, request.GET)
+            else:
+                musicians = self.paginate_by_cursor(musicians, request.GET.get('cursor'))
 
             context = {
                 'musicians': musicians,
                 'form': form,
+                'query': self.filters_query(request.GET),
+                'results_count': results_count,
+                'card_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+                'card_version': reference_data.stamp(City, Instrument),
             }
             return render(request, 'bands/musicians.html', context)
         musician = get_object_or_404(Musician, id=id)
         return render(request, 'bands/musician.html', {'musician': musician})
 
+    def detail_stamp(self, id: int) -> Optional[Tuple[datetime, str]]:
+        """
+        Page also shows names of bands, their stamps are taken in same query
+        City and instrument names come from reference data, its change time is taken from cache
+        """
+        row = (Musician.objects.filter(id=id)
+               .annotate(bands_updated_at=Max('bands__updated_at'))
+               .values_list('updated_at', 'bands_updated_at').first())
+        if row is None:
+            return None
+        last_modified = max(stamp for stamp in (*row, reference_data.changed_at(City, Instrument))
+                            if stamp is not None)
+        return last_modified, f'{last_modified.isoformat()}:{reference_data.stamp(City, Instrument)}'
+
+    def paginate_by_page(self, musicians: QuerySet, page: Optional[str]) -> Page:
+        paginator = EstimatedCountPaginator(musicians, self.per_page)
+        try:
+            return paginator.page(page)
+        except PageNotAnInteger:
+            return paginator.page(1)
+        except EmptyPage:
+            return paginator.page(paginator.num_pages)
+
+    def paginate_by_index(self, musicians: QuerySet, filters: QueryDict) -> Tuple[CursorPage, int]:
+        '''Filter, count and page with facet index, database only loads visible cards'''
+        paginator = CursorPaginator(musicians, self.per_page, ordering=self.ordering)
+        cursor, direction = None, 'next'
+        if filters.get('cursor'):
+            try:
+                cursor, direction = paginator.decode_cursor(filters['cursor'])
+            except InvalidCursor:
+                pass
+
+        city_id = filters.get('city')
+        instrument_id = filters.get('instrument')
+        bits = musician_index.filter(
+            city_ids=nearby_city_ids(city_id, filters.get('distance')) if city_id else None,
+            instrument_id=int(instrument_id) if instrument_id else None,
+        )
+        ids, has_next, has_previous = musician_index.page(bits, self.per_page, cursor, direction)
+
+        '''Queryset is still filtered, so stale index can't show wrong musicians'''
+        rows = musicians.in_bulk(ids)
+        page = CursorPage([rows[musician_id] for musician_id in ids if musician_id in rows],
+                          paginator, has_next=has_next, has_previous=has_previous)
+        return page, musician_index.count(bits)
+
     def apply_filters(self, musicians: QuerySet, filters: QueryDict) -> Optional[QuerySet]:
         '''Extract all filters'''
         city_id = filters.get('city')
         instrument_id = filters.get('instrument')
 
         '''Apply filters'''
-        if city_id:
+        if city_id and filters.get('distance'):
+            musicians = musicians.filter(city_id__in=nearby_city_ids(city_id, filters['distance'])).all()
+        elif city_id:
             musicians = musicians.filter(city_id=city_id).all()
         if instrument_id:
-            instrument = Instrument.objects.filter(id=instrument_id).first()
-            musicians = musicians.filter(instruments__in=[instrument]).all()
+            musicians = musicians.filter(instruments__id=instrument_id).all()
 
         return musicians
 
@@ -104,9 +188,10 @@ class BandsDashboardView(LoginRequiredMixin, View):
 
     name = 'bands_dashboard'
     login_url = '/users/login/'
+    query_budget = 3
 
     def get(self, request: HttpRequest) -> TemplateResponse:
-        bands = Band.objects.filter(admin=request.user).all()
+        bands = Band.objects.filter(admin=request.user).select_related('city').order_by('id')
         return render(request, 'bands/bands_dashboard.html', {'bands': bands})
 
 
@@ -123,11 +208,8 @@ class BandEditView(LoginRequiredMixin, View):
             form = self.form()
             return render(request, 'bands/band_edit.html', {'form': form})
 
-        '''Check if band exists and correct user trying to edit band'''
-        band = get_object_or_404(Band, id=id)
-        # if not band.admin == request.user:
-        #     raise PermissionDenied
-        form = self.form(instance=band)
+        '''Band is loaded and checked by check_user'''
+        form = self.form(instance=self.object)
         return render(request, 'bands/band_edit.html', {'form': form})
 
     def post(self, request: HttpRequest) -> Union[TemplateResponse, HttpResponseRedirect]:
@@ -148,8 +230,7 @@ class BandEditView(LoginRequiredMixin, View):
     @check_user(model=Band, attribute='admin')
     def put(self, request: HttpRequest, id: Union[str, int]) -> HttpResponseRedirect:
         '''edit existed record'''
-        band = get_object_or_404(Band, id=id)
-        form = self.form(request.POST, instance=band)
+        form = self.form(request.POST, instance=self.object)
         if form.is_valid():
             band = form.save()
             messages.info(request, 'Band info updated')
@@ -158,38 +239,65 @@ class BandEditView(LoginRequiredMixin, View):
 
     @check_user(model=Band, attribute='admin')
     def delete(self, request: HttpRequest, id: Union[str, int]) -> HttpResponseRedirect:
-        band = get_object_or_404(Band, id=id)
-        band.delete()
+        self.object.delete()
         messages.info(request, 'Band deleted')
         return redirect(BandsDashboardView.name)
 
 
-class BandsView(View):
+class BandsView(ConditionalDetailMixin, ResponseCacheMixin, CursorPaginationMixin, View):
 
     name = 'bands'
+    cache_models = (Band, City, Style)
+    cache_params = ('city', 'style', 'distance', 'cursor')
     form = BandFilterForm
+    query_budget = 3
+    per_page = 10
+    ordering = ('name', 'id')
 
     def get(self, request: HttpRequest, id: Union[int, str] = None) -> TemplateResponse:
         form = self.form(request.GET)
         if id is None:
-            bands = Band.objects.all()
+            bands = Band.objects.prefetch_related('styles')
             '''Check filters'''
             if request.GET:
                 bands = self.apply_filters(bands, request.GET)
+            '''Search results are ranked, so they are paged by number'''
+            if request.GET.get('q'):
+                bands = search_page(bands, request.GET['q'], request.GET.get('page'), self.per_page)
+            else:
+                bands = self.paginate_by_cursor(bands, request.GET.get('cursor'))
             context = {
                 'form': form,
                 'bands': bands,
+                'query': self.filters_query(request.GET),
+                'card_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+                'card_version': reference_data.stamp(Style),
             }
             return render(request, 'bands/bands.html', context)
 
         band = get_object_or_404(Band, id=id)
-        return render(request, 'bands/band.html', {'band': band})
+        context = {
+            'band': band,
+            'suggested_musicians': suggest_musicians(band),
+            'similar_bands': BandBucket.similar(band),
+        }
+        return render(request, 'bands/band.html', context)
+
+    def detail_stamp(self, id: int) -> Optional[Tuple[None, str]]:
+        '''Suggested and similar bands change with any musician or band, so there's no Last-Modified'''
+        updated_at = Band.objects.filter(id=id).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        versions = '.'.join(str(generation) for generation in generations((Musician, Band)))
+        return None, f'{updated_at.isoformat()}:{versions}:{reference_data.stamp(City, Style)}'
 
     def apply_filters(self, bands: QuerySet, filters: QueryDict) -> QuerySet:
         city_id = filters.get('city')
         style_id = filters.get('style')
 
-        if city_id:
+        if city_id and filters.get('distance'):
+            bands = bands.filter(city_id__in=nearby_city_ids(city_id, filters['distance'])).all()
+        elif city_id:
             bands = bands.filter(city_id=city_id).all()
 
         if style_id:
@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from bench.sessions import SESSION_ENGINES, run_flow
+
+
+class Command(BaseCommand):
+    help = 'Count queries and writes of login, dashboard, profile edit flow for every session backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', action='append', dest='backends',
+                            choices=sorted(SESSION_ENGINES), help='Default is all backends')
+        parser.add_argument('--output', help='Write report to file instead of stdout')
+
+    def handle(self, *args, **options):
+        backends = options['backends'] or list(SESSION_ENGINES)
+        '''First run fills in-process caches like reference data, so it is not reported'''
+        run_flow(SESSION_ENGINES[backends[0]])
+        report = json.dumps({backend: run_flow(SESSION_ENGINES[backend]) for backend in backends},
+                            indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(report)
+            self.stdout.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,38 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from bench.runner import BenchmarkRunner
+
+
+class Command(BaseCommand):
+    help = 'Request every page concurrently through WSGI app and report latency and queries as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requests per url')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--user', help='Username to log in as, default is most active band admin')
+        parser.add_argument('--url', action='append', dest='names',
+                            help='Only this url, pages with id are named like bands_detail')
+        parser.add_argument('--output', help='Write report to file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = (User.objects.annotate(bands_count=Count('administrated_bands'))
+                    .order_by('-bands_count', 'id').first())
+        if user is None:
+            raise CommandError('No user to log in as, run seed_bench first')
+
+        runner = BenchmarkRunner(user, requests=options['requests'],
+                                 concurrency=options['concurrency'], names=options['names'])
+        report = json.dumps(runner.run(), indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(report)
+            self.stdout.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+        else:
+            self.stdout.write(report)
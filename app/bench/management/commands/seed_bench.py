@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from bench.seed import Seeder, PASSWORD
+
+
+class Command(BaseCommand):
+    help = 'Fill database with large synthetic dataset for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--bands', type=int, default=100000)
+        parser.add_argument('--announcements', type=int, default=1000000)
+        parser.add_argument('--cities', type=int, default=500)
+        parser.add_argument('--instruments', type=int, default=60)
+        parser.add_argument('--styles', type=int, default=40)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=42, help='Same seed gives same data')
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            users=options['users'], bands=options['bands'],
+            announcements=options['announcements'], cities=options['cities'],
+            instruments=options['instruments'], styles=options['styles'],
+            batch_size=options['batch_size'], seed=options['seed'],
+            log=self.stdout.write,
+        )
+        seeder.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded, every bench_<id> user has password "{PASSWORD}"'))
@@ -0,0 +1,196 @@
+import io
+import math
+import sys
+import time
+import platform
+import statistics
+from importlib import import_module
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, NamedTuple
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+import bands.urls
+import board.urls
+import users.urls
+from bands.models import Musician, Band
+from board.models import Announcement
+from helpers.metrics import QueryCounter
+
+'''Pages with side effects or which need tokens from email'''
+SKIPPED_URLS = {'logout', 'password_reset_confirm', 'announcement_restore'}
+
+
+class Target(NamedTuple):
+    name: str
+    path: str
+
+
+class Sample(NamedTuple):
+    name: str
+    status: int
+    seconds: float
+    queries: int
+
+
+def bench_host() -> str:
+    '''Requests bypass test client, so host must pass ALLOWED_HOSTS'''
+    return next((host for host in settings.ALLOWED_HOSTS if '*' not in host), 'localhost')
+
+
+def percentile(values: List[float], share: float) -> float:
+    '''Nearest rank percentile'''
+    ordered = sorted(values)
+    rank = math.ceil(round(share * len(ordered), 6))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class BenchmarkRunner:
+    """
+    Requests every GET page of bands, board and users urls through WSGI app
+    Logged in as `user`, ids in urls are taken from rows this user owns
+    Reports latency percentiles and queries per request for each url name
+    """
+
+    URLCONFS = (bands.urls, board.urls, users.urls)
+
+    def __init__(self, user: User, requests: int = 50, concurrency: int = 8,
+                 names: Optional[List[str]] = None):
+        self.user = user
+        self.requests = requests
+        self.concurrency = concurrency
+        self.names = set(names) if names else None
+        self.handler = WSGIHandler()
+        self.host = bench_host()
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={self.login()}'
+
+    def login(self) -> str:
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(self.user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()
+        session.save()
+        return session.session_key
+
+    def sample_ids(self) -> Dict[str, Optional[int]]:
+        '''Own rows for edit pages, any rows for public detail pages'''
+        def first_id(queryset):
+            return queryset.order_by('id').values_list('id', flat=True).first()
+
+        return {
+            'musicians': first_id(Musician.activated_objects.all()),
+            'bands': first_id(Band.objects.all()),
+            'band_edit': first_id(Band.objects.filter(admin=self.user)),
+            'announcements': first_id(Announcement.objects.all()),
+            'announcement_edit': first_id(Announcement.objects.filter(author=self.user)),
+        }
+
+    def targets(self) -> List[Target]:
+        ids = self.sample_ids()
+        targets = []
+        for urlconf in self.URLCONFS:
+            for pattern in urlconf.urlpatterns:
+                if not isinstance(pattern, URLPattern) or pattern.name in SKIPPED_URLS:
+                    continue
+                converters = pattern.pattern.converters
+                if not converters:
+                    targets.append(Target(pattern.name, reverse(pattern.name)))
+                elif list(converters) == ['id'] and ids.get(pattern.name):
+                    targets.append(Target(f'{pattern.name}_detail',
+                                          reverse(pattern.name, kwargs={'id': ids[pattern.name]})))
+        if self.names is not None:
+            targets = [target for target in targets if target.name in self.names]
+        return targets
+
+    def request(self, target: Target) -> Sample:
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': target.path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': self.host,
+            'HTTP_COOKIE': self.cookie,
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.handler(environ, start_response)
+            for _ in response:
+                pass
+            response.close()
+        return Sample(target.name, statuses[0], time.perf_counter() - started, counter.count)
+
+    def worker(self, targets: List[Target]) -> List[Sample]:
+        try:
+            return [self.request(target) for target in targets]
+        finally:
+            '''Every thread opens own connection'''
+            if self.concurrency > 1:
+                connections.close_all()
+
+    def run(self) -> dict:
+        targets = self.targets()
+        queue = [target for _ in range(self.requests) for target in targets]
+        started = time.perf_counter()
+        if self.concurrency > 1:
+            chunks = [queue[n::self.concurrency] for n in range(self.concurrency)]
+            with ThreadPoolExecutor(self.concurrency) as pool:
+                samples = [sample for chunk in pool.map(self.worker, chunks) for sample in chunk]
+        else:
+            samples = self.worker(queue)
+        elapsed = time.perf_counter() - started
+        return self.report(targets, samples, elapsed)
+
+    def report(self, targets: List[Target], samples: List[Sample], elapsed: float) -> dict:
+        def summary(rows: List[Sample]) -> dict:
+            milliseconds = [row.seconds * 1000 for row in rows]
+            queries = [row.queries for row in rows]
+            return {
+                'requests': len(rows),
+                'errors': sum(row.status >= 500 for row in rows),
+                'statuses': sorted({row.status for row in rows}),
+                'p50_ms': round(percentile(milliseconds, 0.50), 2),
+                'p95_ms': round(percentile(milliseconds, 0.95), 2),
+                'p99_ms': round(percentile(milliseconds, 0.99), 2),
+                'queries_mean': round(statistics.mean(queries), 2),
+                'queries_max': max(queries),
+            }
+
+        return {
+            'meta': {
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'concurrency': self.concurrency,
+                'requests_per_url': self.requests,
+                'elapsed_s': round(elapsed, 3),
+                'requests_per_s': round(len(samples) / elapsed, 1) if elapsed else None,
+            },
+            'urls': {
+                target.name: {'path': target.path,
+                              **summary([row for row in samples if row.name == target.name])}
+                for target in targets
+            },
+            'total': summary(samples) if samples else {},
+        }
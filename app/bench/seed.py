@@ -0,0 +1,263 @@
+import io
+import csv
+import random
+import datetime
+from itertools import accumulate
+from typing import Callable, Iterable, List, Sequence
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from bands.models import (
+    City, Instrument, InstrumentCategory, Style, Musician, Band,
+    FacetCount, BandBucket, MusicianStyle, CityNeighbor,
+)
+from bands.reference import reference_data
+from board.models import Announcement, Category
+from search.signals import rebuild_index
+from helpers.text import normalize_name
+
+'''Every seeded user can log in with this password'''
+PASSWORD = 'bench'
+
+FIRST_NAMES = ('Anna', 'Björk', 'Carlos', 'Dmitri', 'Emma', 'François', 'Gwen', 'Hiro',
+               'Ingrid', 'José', 'Kasia', 'Liam', 'Marta', 'Noah', 'Olga', 'Pablo', 'Zoë')
+LAST_NAMES = ('Smith', 'Müller', 'García', 'Ivanov', 'Kowalski', 'Nguyen', 'Rossi',
+              'Søren', 'Tanaka', 'Dubois', 'O\'Brien', 'Novák', 'Silva', 'Jensen')
+WORDS = ('guitar', 'drums', 'bass', 'vocals', 'jazz', 'punk', 'metal', 'folk', 'rehearsal',
+         'studio', 'gig', 'tour', 'album', 'looking', 'band', 'experienced', 'weekend',
+         'cover', 'original', 'songs', 'blues', 'groove', 'acoustic', 'keyboard', 'synth')
+
+
+class ZipfChoice:
+    """
+    Picks items with probability falling as 1 / rank ** exponent
+    Few cities, instruments and authors get most of rows, like real data
+    """
+
+    def __init__(self, rng: random.Random, items: Sequence, exponent: float = 1.0):
+        self.rng = rng
+        self.items = list(items)
+        self.cum_weights = list(accumulate(1 / (rank + 1) ** exponent for rank in range(len(items))))
+
+    def one(self):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def some(self, low: int, high: int) -> set:
+        return set(self.rng.choices(self.items, cum_weights=self.cum_weights,
+                                    k=self.rng.randint(low, high)))
+
+
+class TableWriter:
+    """
+    Inserts rows with explicit ids, COPY on Postgres and multi-row INSERT elsewhere
+    Raw inserts keep given timestamps, bulk_create would overwrite auto_now fields
+    Sequences are reset by finish(), so app inserts continue after seeded ids
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.models = set()
+        self.copy = connection.vendor == 'postgresql'
+
+    def write(self, model, rows: Iterable[dict]):
+        self.models.add(model)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                self.flush(model, batch)
+                batch = []
+        if batch:
+            self.flush(model, batch)
+
+    def flush(self, model, batch: List[dict]):
+        fields = [model._meta.get_field(name) for name in batch[0]]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        if self.copy:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in batch:
+                writer.writerow(r'\N' if value is None else value for value in row.values())
+            buffer.seek(0)
+            with connection.cursor() as cursor:
+                cursor.cursor.copy_expert(
+                    f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+            return
+        placeholders = ', '.join(['%s'] * len(fields))
+        values = [[field.get_db_prep_save(value, connection) for field, value in zip(fields, row.values())]
+                  for row in batch]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', values)
+
+    def finish(self):
+        statements = connection.ops.sequence_reset_sql(no_style(), list(self.models))
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def next_id(model) -> int:
+    return (model.objects.aggregate(last=models.Max('id'))['last'] or 0) + 1
+
+
+class Seeder:
+    """
+    Synthetic dataset for benchmarks, sizes are configurable
+    Same `seed` gives same data, so benchmark runs can be compared
+    """
+
+    def __init__(self, users: int, bands: int, announcements: int, cities: int = 500,
+                 instruments: int = 60, styles: int = 40, batch_size: int = 10000,
+                 seed: int = 42, log: Callable[[str], None] = lambda message: None):
+        self.sizes = {'users': users, 'bands': bands, 'announcements': announcements,
+                      'cities': cities, 'instruments': instruments, 'styles': styles}
+        self.rng = random.Random(seed)
+        self.writer = TableWriter(batch_size)
+        self.log = log
+        self.now = timezone.now()
+
+    def run(self):
+        with transaction.atomic():
+            self.seed_reference_data()
+            self.seed_users()
+            self.seed_bands()
+            self.seed_announcements()
+            self.writer.finish()
+        '''Derived tables and caches are maintained by signals, which raw inserts skip'''
+        self.log('Rebuilding derived tables')
+        for model in (City, Instrument, InstrumentCategory, Style):
+            reference_data.invalidate(model)
+        FacetCount.rebuild()
+        BandBucket.rebuild()
+        MusicianStyle.rebuild()
+        CityNeighbor.rebuild()
+        with transaction.atomic():
+            rebuild_index()
+
+    def words(self, low: int, high: int) -> str:
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def seed_reference_data(self):
+        rng = self.rng
+        start = next_id(City)
+        self.writer.write(City, (
+            {'id': start + n, 'name': f'City {start + n}',
+             'latitude': round(rng.uniform(47, 55), 4), 'longitude': round(rng.uniform(6, 15), 4)}
+            for n in range(self.sizes['cities'])))
+        self.city_ids = list(range(start, start + self.sizes['cities']))
+
+        category_start = next_id(InstrumentCategory)
+        category_ids = list(range(category_start, category_start + 5))
+        self.writer.write(InstrumentCategory, (
+            {'id': category_id, 'name': f'Category {category_id}'} for category_id in category_ids))
+        start = next_id(Instrument)
+        self.writer.write(Instrument, (
+            {'id': start + n, 'name': f'Instrument {start + n}', 'category_id': rng.choice(category_ids)}
+            for n in range(self.sizes['instruments'])))
+        self.instrument_ids = list(range(start, start + self.sizes['instruments']))
+
+        start = next_id(Style)
+        self.writer.write(Style, (
+            {'id': start + n, 'name': f'Style {start + n}'} for n in range(self.sizes['styles'])))
+        self.style_ids = list(range(start, start + self.sizes['styles']))
+
+    def seed_users(self):
+        rng = self.rng
+        cities = ZipfChoice(rng, self.city_ids, exponent=1.1)
+        instruments = ZipfChoice(rng, self.instrument_ids, exponent=0.9)
+        password = make_password(PASSWORD)
+        user_start, musician_start = next_id(User), next_id(Musician)
+        count = self.sizes['users']
+        self.log(f'Seeding {count} users and musicians')
+
+        self.writer.write(User, (
+            {'id': user_start + n, 'username': f'bench_{user_start + n}', 'password': password,
+             'email': f'bench_{user_start + n}@example.com', 'first_name': '', 'last_name': '',
+             'is_staff': False, 'is_superuser': False, 'is_active': True, 'date_joined': self.now}
+            for n in range(count)))
+        self.user_ids = list(range(user_start, user_start + count))
+
+        def musician(n):
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            return {
+                'id': musician_start + n, 'user_id': user_start + n,
+                'first_name': first_name, 'last_name': last_name,
+                'search_name': normalize_name(first_name, last_name, f'bench_{user_start + n}'),
+                'bio': self.words(0, 30),
+                'birth_date': datetime.date(rng.randint(1960, 2005), rng.randint(1, 12), rng.randint(1, 28)),
+                'is_busy': rng.random() < 0.3, 'activated': rng.random() < 0.8,
+                'city_id': cities.one() if rng.random() < 0.95 else None,
+                'updated_at': self.now,
+            }
+
+        self.writer.write(Musician, (musician(n) for n in range(count)))
+        self.musician_ids = list(range(musician_start, musician_start + count))
+
+        through = Musician.instruments.through
+        start = next_id(through)
+        links = ((musician_id, instrument_id) for musician_id in self.musician_ids
+                 for instrument_id in instruments.some(1, 3))
+        self.writer.write(through, (
+            {'id': start + n, 'musician_id': musician_id, 'instrument_id': instrument_id}
+            for n, (musician_id, instrument_id) in enumerate(links)))
+
+    def seed_bands(self):
+        rng = self.rng
+        cities = ZipfChoice(rng, self.city_ids, exponent=1.1)
+        styles = ZipfChoice(rng, self.style_ids, exponent=0.8)
+        admins = ZipfChoice(rng, self.user_ids, exponent=0.5)
+        start = next_id(Band)
+        count = self.sizes['bands']
+        self.log(f'Seeding {count} bands')
+
+        def band(n):
+            name = f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {start + n}'
+            return {
+                'id': start + n, 'admin_id': admins.one(), 'name': name,
+                'search_name': normalize_name(name), 'description': self.words(3, 40),
+                'city_id': cities.one() if rng.random() < 0.9 else None,
+                'updated_at': self.now,
+            }
+
+        self.writer.write(Band, (band(n) for n in range(count)))
+        band_ids = range(start, start + count)
+
+        through = Band.styles.through
+        link_start = next_id(through)
+        links = ((band_id, style_id) for band_id in band_ids for style_id in styles.some(1, 3))
+        self.writer.write(through, (
+            {'id': link_start + n, 'band_id': band_id, 'style_id': style_id}
+            for n, (band_id, style_id) in enumerate(links)))
+
+        through = Band.musicians.through
+        link_start = next_id(through)
+        links = ((band_id, musician_id) for band_id in band_ids
+                 for musician_id in set(rng.sample(self.musician_ids, min(len(self.musician_ids),
+                                                                          rng.randint(2, 5)))))
+        self.writer.write(through, (
+            {'id': link_start + n, 'band_id': band_id, 'musician_id': musician_id}
+            for n, (band_id, musician_id) in enumerate(links)))
+
+    def seed_announcements(self):
+        rng = self.rng
+        authors = ZipfChoice(rng, self.user_ids, exponent=1.0)
+        categories = ZipfChoice(rng, Category.values, exponent=0.7)
+        start = next_id(Announcement)
+        count = self.sizes['announcements']
+        self.log(f'Seeding {count} announcements')
+
+        def announcement(n):
+            '''Most announcements are recent, age falls off exponentially'''
+            updated_at = self.now - datetime.timedelta(days=min(rng.expovariate(1 / 20), 365))
+            return {
+                'id': start + n, 'author_id': authors.one(), 'title': self.words(2, 8).capitalize(),
+                'text': self.words(10, 80), 'category': categories.one(),
+                'updated_at': updated_at, 'edited_at': updated_at, 'created_at': updated_at,
+            }
+
+        self.writer.write(Announcement, (announcement(n) for n in range(count)))
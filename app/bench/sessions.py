@@ -0,0 +1,78 @@
+from typing import List, NamedTuple
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from bench.runner import bench_host
+from helpers.metrics import QueryCounter
+
+'''Session backends compared by bench_sessions'''
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class StatementCounter(QueryCounter):
+
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+        self.session_queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            self.writes += 1
+        if '"django_session"' in sql:
+            self.session_queries += 1
+        return super().__call__(execute, sql, params, many, context)
+
+
+class Step(NamedTuple):
+    name: str
+    method: str
+    url: str
+    data: dict
+
+
+def flow_steps(username: str, password: str) -> List[Step]:
+    '''Log in, look at dashboard, edit profile and follow redirect with flash message'''
+    return [
+        Step('login', 'post', reverse('login'), {'username': username, 'password': password}),
+        Step('dashboard', 'get', reverse('user_dashboard'), {}),
+        Step('profile_edit_form', 'get', reverse('profile_edit'), {}),
+        Step('profile_edit', 'post', reverse('profile_edit'), {'first_name': 'Bench', 'bio': 'edited'}),
+        Step('redirected_dashboard', 'get', reverse('user_dashboard'), {}),
+    ]
+
+
+def run_flow(engine: str) -> dict:
+    """
+    Goes through the flow with one session backend, counts queries of every step
+    Runs in a transaction which is rolled back, so database is left as it was
+    """
+    password = 'bench-sessions'
+    rows = []
+    with override_settings(SESSION_ENGINE=engine), transaction.atomic():
+        user = User.objects.create_user(username='bench_sessions_user', password=password)
+        client = Client(HTTP_HOST=bench_host())
+        for step in flow_steps(user.username, password):
+            counter = StatementCounter()
+            with connection.execute_wrapper(counter):
+                response = getattr(client, step.method)(step.url, step.data)
+            rows.append({'step': step.name, 'status': response.status_code, 'queries': counter.count,
+                         'writes': counter.writes, 'session_queries': counter.session_queries})
+        transaction.set_rollback(True)
+    return {
+        'engine': engine,
+        'steps': rows,
+        'queries': sum(row['queries'] for row in rows),
+        'writes': sum(row['writes'] for row in rows),
+        'session_queries': sum(row['session_queries'] for row in rows),
+    }
@@ -0,0 +1,159 @@
+from io import StringIO
+import json
+import random
+
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection
+
+from bands.models import Musician, Band, City, FacetCount, BandBucket, MusicianStyle, CityNeighbor
+from bands.matching import match_context, suggest_from_database, suggest_from_index
+from bands.facets import musician_index
+from board.models import Announcement
+from search.models import SearchDocument
+from bench.seed import Seeder, ZipfChoice, PASSWORD
+from bench.runner import BenchmarkRunner, percentile
+from bench.sessions import SESSION_ENGINES, run_flow
+
+
+class TestSeed(TestCase):
+
+    def test_seed_counts(self):
+        Seeder(users=30, bands=5, announcements=40, cities=10, instruments=6, styles=4,
+               batch_size=7).run()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Musician.objects.count(), 30)
+        self.assertEqual(Band.objects.count(), 5)
+        self.assertEqual(Announcement.objects.count(), 40)
+        self.assertEqual(City.objects.count(), 10)
+        self.assertTrue(all(Band.objects.get(id=band_id).styles.exists()
+                            for band_id in Band.objects.values_list('id', flat=True)))
+
+        '''Derived tables are rebuilt'''
+        self.assertTrue(FacetCount.objects.exists())
+        self.assertTrue(BandBucket.objects.exists())
+        self.assertEqual(SearchDocument.objects.count(), 30 + 5 + 40)
+
+        '''Sequences continue after seeded ids and passwords work'''
+        user = User.objects.create(username='after_seed')
+        self.assertGreater(user.id, 30)
+        self.assertTrue(self.client.login(username=User.objects.first().username, password=PASSWORD))
+
+    def test_default_batch_size_over_sqlite_limit(self):
+        '''Every rebuilt table gets more than 500 rows, SQLite inserts at most 500 per statement'''
+        Seeder(users=1500, bands=1000, announcements=0, cities=500).run()
+        for model in (FacetCount, BandBucket, MusicianStyle, CityNeighbor, SearchDocument):
+            self.assertGreater(model.objects.count(), 500, model.__name__)
+
+    def test_seed_is_repeatable(self):
+        def names():
+            return list(Band.objects.order_by('id').values_list('name', flat=True))
+
+        Seeder(users=10, bands=3, announcements=0, cities=3, instruments=3, styles=2, seed=7).run()
+        first = names()
+        Band.objects.all().delete()
+        Seeder(users=10, bands=3, announcements=0, cities=3, instruments=3, styles=2, seed=7).run()
+        '''Ids continue after first run, rest of data is the same'''
+        self.assertEqual([name.rsplit(' ', 1)[0] for name in names()],
+                         [name.rsplit(' ', 1)[0] for name in first])
+
+    def test_zipf_skew(self):
+        choice = ZipfChoice(random.Random(1), list(range(100)), exponent=1.2)
+        picks = [choice.one() for _ in range(2000)]
+        self.assertGreater(picks.count(0), picks.count(50) * 10)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([3.0], 0.99), 3.0)
+
+
+class TestMatching(TestCase):
+    """Suggestions from database on seeded data, with skewed cities and styles"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Seeder(users=2000, bands=300, announcements=0, cities=30, instruments=12, styles=8).run()
+
+    def setUp(self):
+        musician_index.invalidate()
+        self.addCleanup(musician_index.invalidate)
+
+    def test_same_as_index(self):
+        with override_settings(MUSICIAN_FACET_INDEX=1):
+            for band in Band.objects.order_by('id')[:40]:
+                context = match_context(band)
+                self.assertEqual(suggest_from_database(band, context, 6),
+                                 suggest_from_index(band, context, 6), band.id)
+
+    def test_musicians_are_not_sorted(self):
+        '''Every query walks musicians in id order and stops at limit, none sorts all of them'''
+        if connection.vendor != 'sqlite':
+            return
+        for band in Band.objects.order_by('id')[:10]:
+            with CaptureQueriesContext(connection) as context:
+                suggest_from_database(band, match_context(band), 6)
+            for query in context.captured_queries:
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plan = [row[-1] for row in cursor.fetchall()]
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan, query['sql'])
+
+
+class TestBenchmarkRunner(TestCase):
+
+    def setUp(self):
+        Seeder(users=20, bands=4, announcements=10, cities=5, instruments=4, styles=3).run()
+        '''Like test client, keep test transaction's connection open after each request'''
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+
+    def test_report(self):
+        user = Band.objects.first().admin
+        report = BenchmarkRunner(user, requests=2, concurrency=1).run()
+        self.assertIn('bands', report['urls'])
+        self.assertIn('band_edit_detail', report['urls'])
+        self.assertNotIn('logout', report['urls'])
+        for name, row in report['urls'].items():
+            self.assertEqual(row['requests'], 2, name)
+            self.assertEqual(row['errors'], 0, name)
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+        self.assertEqual(report['total']['requests'], 2 * len(report['urls']))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('run_bench', '--requests', '1', '--concurrency', '1',
+                     '--url', 'bands', '--url', 'musicians_detail', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['urls']), {'bands', 'musicians_detail'})
+        self.assertEqual(report['urls']['bands']['statuses'], [200])
+
+
+class TestSessionFlow(TestCase):
+
+    def test_flow_succeeds_with_every_backend(self):
+        for engine in SESSION_ENGINES.values():
+            report = run_flow(engine)
+            self.assertEqual([row['status'] for row in report['steps']], [302, 200, 200, 302, 200], engine)
+        self.assertFalse(User.objects.filter(username='bench_sessions_user').exists())
+
+    def test_session_queries(self):
+        db = run_flow(SESSION_ENGINES['db'])
+        cached_db = run_flow(SESSION_ENGINES['cached_db'])
+        signed_cookies = run_flow(SESSION_ENGINES['signed_cookies'])
+        self.assertLess(cached_db['session_queries'], db['session_queries'])
+        self.assertEqual(signed_cookies['session_queries'], 0)
+        self.assertLess(signed_cookies['writes'], db['writes'])
+
+    def test_message_shown_after_redirect(self):
+        user = User.objects.create_user(username='flash', password='password')
+        self.client.force_login(user)
+        response = self.client.post(reverse('profile_edit'), {'first_name': 'Flash'}, follow=True)
+        self.assertContains(response, 'Profile saved')
+        self.assertNotIn('_messages', self.client.session)
@@ -0,0 +1 @@
+default_app_config = 'board.apps.BoardConfig'
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class BoardConfig(AppConfig):
     name = 'board'
+
+    def ready(self):
+        from board.models import Announcement
+        from board.views import AnnouncementsView
+        from helpers.response_cache import track_models
+        from helpers.purge import purge_on_change
+        track_models(Announcement)
+        purge_on_change(Announcement, AnnouncementsView.name)
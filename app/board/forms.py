@@ -16,3 +16,4 @@ class AnnouncementEditForm(forms.ModelForm):
 
 class AnnouncementFilterForm(forms.Form):
     category = forms.ChoiceField(widget=forms.Select(), choices=Category.choices)
+    q = forms.CharField(widget=forms.TextInput(attrs={'placeholder': 'Search'}), required=False, label='Search')
@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from board.models import Announcement, ArchivedAnnouncement
+
+
+class Command(BaseCommand):
+    help = 'Move expired announcements to archive table in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Announcements not renewed for this many days are archived')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        due_date = timezone.now() - timedelta(days=options['days'])
+        total = 0
+        while True:
+            try:
+                moved = self.archive_batch(due_date, options['batch_size'])
+            except IntegrityError as error:
+                raise CommandError(
+                    f'Archive already has an announcement of this batch, nothing moved: {error}')
+            if not moved:
+                break
+            total += moved
+            self.stdout.write(f'{total} announcements archived')
+            if options['pause']:
+                time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'Done, {total} announcements archived'))
+
+    def archive_batch(self, due_date, batch_size: int) -> int:
+        '''
+        Every batch is short transaction, rows locked by others are skipped
+        Id already in archive fails whole batch, so no announcement is deleted unarchived
+        '''
+        with transaction.atomic():
+            batch = list(
+                Announcement.objects
+                .filter(updated_at__lt=due_date)
+                .order_by('id')
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+            if not batch:
+                return 0
+            ArchivedAnnouncement.objects.bulk_create(
+                [ArchivedAnnouncement.from_announcement(announcement) for announcement in batch])
+            Announcement.objects.filter(id__in=[announcement.id for announcement in batch]).delete()
+        return len(batch)
@@ -0,0 +1,38 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('board', '0004_announcement_edited_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAnnouncement',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.TextField()),
+                ('text', models.TextField()),
+                ('category', models.CharField(choices=[('BAND_IS_LOOKING', 'Band is looking for mate'), ('MUSICIAN_IS_LOOKING', 'Musician is looking for mates'), ('LOOKING_FOR_WORK', 'Looking for work'), ('WORK_IS_LOOKING', 'Work is looking')], default='BAND_IS_LOOKING', max_length=50)),
+                ('updated_at', models.DateTimeField()),
+                ('edited_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['category', 'updated_at'], name='announcement_category_updated'),
+        ),
+        migrations.AddField(
+            model_name='archivedannouncement',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_announcements', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
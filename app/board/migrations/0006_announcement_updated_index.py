@@ -0,0 +1,17 @@
+# Generated by Django 3.0.5 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0005_archived_announcement'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(fields=['-updated_at', '-id'], name='announcement_updated_id'),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from datetime import timedelta
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 
@@ -35,8 +35,58 @@ class Announcement(models.Model):
     objects = models.Manager()
     active = ActiveAnnouncementManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'updated_at'], name='announcement_category_updated'),
+            models.Index(fields=['-updated_at', '-id'], name='announcement_updated_id'),
+        ]
+
     def __str__(self):
         return self.title
 
     def __repr__(self):
         return f'<Announcement author: {self.author} title: {self.title}>'
+
+
+class ArchivedAnnouncement(models.Model):
+    """
+    Expired announcements moved out of hot table by archive_announcements command
+    Keeps original id, so archived announcement may be restored with same url
+    """
+    id = models.IntegerField(primary_key=True)
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='archived_announcements')
+    title = models.TextField()
+    text = models.TextField()
+    category = models.CharField(max_length=50, choices=Category.choices,
+                                default=Category.BAND_IS_LOOKING)
+    updated_at = models.DateTimeField()
+    edited_at = models.DateTimeField()
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    ARCHIVED_FIELDS = ('id', 'author_id', 'title', 'text', 'category',
+                       'updated_at', 'edited_at', 'created_at')
+
+    def __str__(self):
+        return self.title
+
+    def __repr__(self):
+        return f'<ArchivedAnnouncement author: {self.author} title: {self.title}>'
+
+    @classmethod
+    def from_announcement(cls, announcement: Announcement) -> 'ArchivedAnnouncement':
+        return cls(**{field: getattr(announcement, field) for field in cls.ARCHIVED_FIELDS})
+
+    def restore(self) -> Announcement:
+        '''Move back to hot table as renewed announcement'''
+        with transaction.atomic():
+            announcement = Announcement(
+                **{field: getattr(self, field) for field in self.ARCHIVED_FIELDS})
+            '''Auto dates are set on insert, updated_at is renewed, others are kept'''
+            announcement.save(force_insert=True)
+            Announcement.objects.filter(id=announcement.id).update(
+                created_at=self.created_at, edited_at=self.edited_at)
+            self.delete()
+        announcement.refresh_from_db()
+        return announcement
@@ -1,17 +1,27 @@
+from io import StringIO
 from datetime import timedelta
 
 from django.shortcuts import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.cache import caches
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth.models import User
 from django.http import HttpResponse
 from django.contrib import auth
 from django.utils import timezone
+from django.core.management import call_command, CommandError
 
-from board.models import Category, Announcement
+from board.models import Category, Announcement, ArchivedAnnouncement
 from users.views import LogInView
-from board.views import AnnouncementDashboardView, AnnouncementEditView, AnnouncementsView
+from board.views import (
+    AnnouncementDashboardView, AnnouncementEditView, AnnouncementsView,
+    AnnouncementRestoreView,
+)
+from helpers.query_budget import QueryBudgetMixin
 
 
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
 class BoardTest(TestCase):
 
     ANNOUNCEMENT_DASHBOARD_URL = reverse(AnnouncementDashboardView.name)
@@ -125,6 +135,18 @@ class BoardTest(TestCase):
         self.assertEqual(announcement.author, auth.get_user(self.client))
         self.assertEqual(announcement.title, 'announcement_0')
 
+    def test_delete_announcement_single_fetch(self):
+        announcement = Announcement.objects.filter(author=auth.get_user(self.client)).first()
+        with CaptureQueriesContext(connection) as context:
+            response: HttpResponse = self.client.delete(
+                f'{self.ANNOUNCEMENT_EDIT_URL}{announcement.id}/'
+            )
+        selects = [query['sql'] for query in context.captured_queries
+                   if query['sql'].startswith('SELECT') and 'FROM "board_announcement"' in query['sql']]
+        self.assertEqual(len(selects), 1)
+        self.assertRedirects(response, self.ANNOUNCEMENT_DASHBOARD_URL)
+        self.assertFalse(Announcement.objects.filter(id=announcement.id).exists())
+
     def test_get_edit_announcement_another_user(self):
         user_0 = auth.get_user(self.client)
         self.client.logout()
@@ -254,7 +276,9 @@ class BoardTest(TestCase):
         self.assertTemplateUsed(response, 'board/announcements.html')
 
         announcements = response.context[0].get('announcements')
-        self.assertEqual(announcements.count(), 2)
+        self.assertEqual(len(announcements), 2)
+        '''Newest first'''
+        self.assertEqual(announcements[0].title, 'announcement_1')
 
         announcement_0 = Announcement.objects.first()
         announcement_0.updated_at = timezone.now() - timedelta(days=31)
@@ -262,7 +286,7 @@ class BoardTest(TestCase):
 
         response: HttpResponse = self.client.get(self.ANNOUNCEMENTS_URL)
         announcements = response.context[0].get('announcements')
-        self.assertEqual(announcements.count(), 1)
+        self.assertEqual(len(announcements), 1)
 
     def test_announcement_detail(self):
         announcement_1 = Announcement.objects.last()
@@ -286,5 +310,179 @@ class BoardTest(TestCase):
         self.assertTemplateUsed(response, 'board/announcements.html')
 
         announcements = response.context[0].get('announcements')
-        self.assertEqual(announcements.count(), 1)
-        self.assertEqual(announcements.first().category, Category.WORK_IS_LOOKING)
+        self.assertEqual(len(announcements), 1)
+        self.assertEqual(announcements[0].category, Category.WORK_IS_LOOKING)
+
+    def test_announcement_pagination(self):
+        user = User.objects.first()
+        Announcement.objects.bulk_create([
+            Announcement(author=user, title=f'bulk_{n}', text='text') for n in range(20)
+        ])
+        '''Groups with equal updated_at, ordered by id inside'''
+        now = timezone.now()
+        ids = list(Announcement.objects.values_list('id', flat=True))
+        for n in range(3):
+            Announcement.objects.filter(id__in=ids[n::3]).update(
+                updated_at=now - timedelta(days=n))
+        expected = list(Announcement.active.order_by('-updated_at', '-id')
+                        .values_list('id', flat=True))
+
+        seen = []
+        url = self.ANNOUNCEMENTS_URL
+        while url:
+            page = self.client.get(url).context[0].get('announcements')
+            seen += [announcement.id for announcement in page]
+            url = page.has_next() and f'{self.ANNOUNCEMENTS_URL}?cursor={page.next_cursor}'
+        self.assertEqual(seen, expected)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class ArchiveTest(TestCase):
+
+    ANNOUNCEMENT_DASHBOARD_URL = reverse(AnnouncementDashboardView.name)
+    ANNOUNCEMENTS_URL = reverse(AnnouncementsView.name)
+
+    def setUp(self):
+        self.user = User(username='test_user_0', email='test@test.test')
+        self.user.set_password('password')
+        self.user.save()
+        self.client.login(username='test_user_0', password='password')
+
+        for n in range(5):
+            announcement = Announcement.objects.create(
+                author=self.user,
+                title=f'announcement_{n}',
+                text=f'text_{n}',
+                category=Category.MUSICIAN_IS_LOOKING,
+            )
+            if n < 3:
+                announcement.updated_at = timezone.now() - timedelta(days=31 + n)
+                announcement.save()
+
+    def tearDown(self):
+        ArchivedAnnouncement.objects.all().delete()
+        Announcement.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_archive_command(self):
+        expired = list(Announcement.objects.filter(title__in=[
+            'announcement_0', 'announcement_1', 'announcement_2']).order_by('id'))
+        call_command('archive_announcements', batch_size=2, stdout=StringIO())
+
+        self.assertEqual(Announcement.objects.count(), 2)
+        self.assertEqual(Announcement.active.count(), 2)
+        archived = list(ArchivedAnnouncement.objects.order_by('id'))
+        self.assertEqual([announcement.id for announcement in archived],
+                         [announcement.id for announcement in expired])
+        self.assertEqual(archived[0].created_at, expired[0].created_at)
+        self.assertEqual(archived[0].author, self.user)
+
+        response: HttpResponse = self.client.get(f'{self.ANNOUNCEMENTS_URL}{expired[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'text_0')
+
+        response: HttpResponse = self.client.get(self.ANNOUNCEMENT_DASHBOARD_URL + '?archived=1')
+        self.assertEqual(response.context[0].get('announcements').count(), 0)
+        self.assertEqual(response.context[0].get('archived_announcements').count(), 3)
+
+    def test_archive_conflict_keeps_announcements(self):
+        announcement = Announcement.objects.get(title='announcement_1')
+        ArchivedAnnouncement.objects.create(**{
+            field: getattr(announcement, field) for field in ArchivedAnnouncement.ARCHIVED_FIELDS})
+        with self.assertRaises(CommandError):
+            call_command('archive_announcements', stdout=StringIO())
+        self.assertEqual(Announcement.objects.count(), 5)
+        self.assertEqual(ArchivedAnnouncement.objects.count(), 1)
+
+    def test_restore(self):
+        call_command('archive_announcements', stdout=StringIO())
+        archived = ArchivedAnnouncement.objects.order_by('id').first()
+        restore_url = reverse(AnnouncementRestoreView.name, args=(archived.id, ))
+
+        response: HttpResponse = self.client.post(restore_url)
+        self.assertRedirects(response, self.ANNOUNCEMENT_DASHBOARD_URL)
+        announcement = Announcement.active.get(id=archived.id)
+        self.assertEqual(announcement.title, archived.title)
+        self.assertEqual(announcement.created_at, archived.created_at)
+        self.assertFalse(ArchivedAnnouncement.objects.filter(id=archived.id).exists())
+
+        other_user = User.objects.create_user(username='other', password='password')
+        self.client.login(username='other', password='password')
+        archived = ArchivedAnnouncement.objects.first()
+        response: HttpResponse = self.client.post(
+            reverse(AnnouncementRestoreView.name, args=(archived.id, )))
+        self.assertEqual(response.status_code, 403)
+        self.assertNotEqual(other_user, archived.author)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class ListingsQueriesTest(QueryBudgetMixin, TestCase):
+
+    ANNOUNCEMENTS_URL = reverse(AnnouncementsView.name)
+    ANNOUNCEMENT_DASHBOARD_URL = reverse(AnnouncementDashboardView.name)
+
+    @classmethod
+    def setUpTestData(cls):
+        '''1000 announcements of different authors and 1000 of one author'''
+        User.objects.bulk_create([User(username=f'bulk_user_{n}') for n in range(1000)])
+        cls.author = User.objects.create_user(username='author', password='password')
+        Announcement.objects.bulk_create(
+            [Announcement(author=user, title=f'bulk_{user.id}', text='text')
+             for user in User.objects.exclude(id=cls.author.id)]
+            + [Announcement(author=cls.author, title=f'own_{n}', text='text')
+               for n in range(1000)]
+        )
+
+    def test_announcements_list_queries(self):
+        response: HttpResponse = self.assertQueryBudget(AnnouncementsView,
+                                                        self.ANNOUNCEMENTS_URL)
+        page = response.context[0].get('announcements')
+        self.assertEqual(len(page), 10)
+        response: HttpResponse = self.assertQueryBudget(
+            AnnouncementsView,
+            f'{self.ANNOUNCEMENTS_URL}?category={Category.BAND_IS_LOOKING}&cursor={page.next_cursor}')
+        self.assertEqual(len(response.context[0].get('announcements')), 10)
+
+    def test_announcements_dashboard_queries(self):
+        self.client.force_login(self.author)
+        response: HttpResponse = self.assertQueryBudget(AnnouncementDashboardView,
+                                                        self.ANNOUNCEMENT_DASHBOARD_URL)
+        self.assertEqual(len(response.context[0].get('announcements')), 1000)
+
+
+class ResponseCacheTest(TestCase):
+    '''Anonymous listing cache and conditional detail pages'''
+
+    ANNOUNCEMENTS_URL = reverse(AnnouncementsView.name)
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.author = User.objects.create_user(username='author', password='password')
+        self.announcement = Announcement.objects.create(author=self.author, title='First', text='text')
+
+    def test_announcement_changes_invalidate(self):
+        self.client.get(self.ANNOUNCEMENTS_URL)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.ANNOUNCEMENTS_URL)
+        self.assertEqual(len(queries), 0)
+
+        self.announcement.title = 'Edited'
+        self.announcement.save()
+        self.assertContains(self.client.get(self.ANNOUNCEMENTS_URL), 'Edited')
+        self.announcement.delete()
+        self.assertNotContains(self.client.get(self.ANNOUNCEMENTS_URL), 'Edited')
+
+    def test_conditional_detail(self):
+        url = reverse(AnnouncementsView.name, args=(self.announcement.id, ))
+        '''Http dates have whole seconds, so stamp is moved to the past first'''
+        Announcement.objects.update(edited_at=timezone.now() - timedelta(hours=1))
+        response = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            repeated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+        self.announcement.text = 'Edited text'
+        self.announcement.save()
+        repeated = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertContains(repeated, 'Edited text')
@@ -13,6 +13,9 @@ urlpatterns = [
     path('announcement_edit/<int:id>/',
          views.AnnouncementEditView.as_view(),
          name=views.AnnouncementEditView.name),
+    path('announcement_restore/<int:id>/',
+         views.AnnouncementRestoreView.as_view(),
+         name=views.AnnouncementRestoreView.name),
     path('announcements/',
          views.AnnouncementsView.as_view(),
          name=views.AnnouncementsView.name),
@@ -1,6 +1,7 @@
-from typing import Union, Optional
-from datetime import timedelta
+from typing import Union, Optional, Tuple
+from datetime import timedelta, datetime
 
+from django.conf import settings
 from django.shortcuts import render, redirect, reverse, get_object_or_404
 from django.http import HttpRequest, HttpResponseRedirect, QueryDict
 from django.template.response import TemplateResponse
@@ -10,22 +11,36 @@ from django.contrib import messages
 from django.db.models import QuerySet
 from django.utils import timezone
 
-from board.models import Announcement
+from board.models import Announcement, ArchivedAnnouncement
 from board.forms import AnnouncementEditForm, AnnouncementFilterForm
 from helpers.authority import check_user
+from helpers.pagination import CursorPaginationMixin
+from helpers.conditional import ConditionalDetailMixin
+from helpers.response_cache import ResponseCacheMixin
+from search.backends import search_page
 
 
 class AnnouncementDashboardView(LoginRequiredMixin, View):
 
     name = 'announcements_dashboard'
     login_url = '/users/login/'
+    query_budget = 4
 
     def get(self, request: HttpRequest) -> Union[TemplateResponse, HttpResponseRedirect]:
-        announcements = Announcement.objects.filter(author=request.user).all()
+        announcements = Announcement.objects.filter(author=request.user).order_by('-updated_at', '-id')
         if request.GET:
             announcements = self.apply_filters(announcements, request.GET)
-        return render(request, 'board/announcements_dashboard.html',
-                      {'announcements': announcements})
+        '''Announcements moved to archive table are shown unless only active wanted'''
+        archived_announcements = ArchivedAnnouncement.objects.none()
+        if not request.GET.get('active'):
+            archived_announcements = (
+                ArchivedAnnouncement.objects.filter(author=request.user).order_by('-updated_at')
+            )
+        context = {
+            'announcements': announcements,
+            'archived_announcements': archived_announcements,
+        }
+        return render(request, 'board/announcements_dashboard.html', context)
 
     def apply_filters(self, announcements: QuerySet, filters: QueryDict) -> QuerySet:
         active = filters.get('active')
@@ -51,8 +66,7 @@ class AnnouncementEditView(LoginRequiredMixin, View):
     def get(self, request: HttpRequest,
             id: Optional[str] = None) -> Union[TemplateResponse, HttpResponseRedirect]:
         if id is not None:
-            announcement = get_object_or_404(Announcement, id=id)
-            form = self.form(instance=announcement)
+            form = self.form(instance=self.object)
             return render(request, 'board/announcement_edit.html', {'form': form})
         return render(request, 'board/announcement_edit.html', {'form': self.form()})
 
@@ -69,7 +83,7 @@ class AnnouncementEditView(LoginRequiredMixin, View):
     @check_user(model=Announcement, attribute='author')
     def put(self, request: HttpRequest,
             id: str) -> Union[HttpResponseRedirect, TemplateResponse]:
-        announcement = get_object_or_404(Announcement, id=id)
+        announcement = self.object
         '''Check if announcement update request wanted'''
         if request.GET.get('update'):
             update_interval = timezone.now() - timedelta(hours=4)
@@ -89,31 +103,66 @@ class AnnouncementEditView(LoginRequiredMixin, View):
 
     @check_user(model=Announcement, attribute='author')
     def delete(self, request: HttpRequest, id: str) -> HttpResponseRedirect:
-        announcement = get_object_or_404(Announcement, id=id)
-        announcement.delete()
+        self.object.delete()
         messages.info(request, 'Announcement deleted')
         return redirect(AnnouncementDashboardView.name)
 
 
-class AnnouncementsView(View):
+class AnnouncementRestoreView(LoginRequiredMixin, View):
+
+    name = 'announcement_restore'
+    login_url = '/users/login/'
+
+    @check_user(model=ArchivedAnnouncement, attribute='author')
+    def post(self, request: HttpRequest, id: str) -> HttpResponseRedirect:
+        self.object.restore()
+        messages.info(request, 'Announcement renewed')
+        return redirect(AnnouncementDashboardView.name)
+
+
+class AnnouncementsView(ConditionalDetailMixin, ResponseCacheMixin, CursorPaginationMixin, View):
 
     name = 'announcements'
+    cache_models = (Announcement, )
+    cache_params = ('category', 'cursor')
     form = AnnouncementFilterForm
+    query_budget = 1
+    per_page = 10
+    ordering = ('-updated_at', '-id')
 
     def get(self, request: HttpRequest, id: str = None) -> TemplateResponse:
         if id is not None:
-            announcement = get_object_or_404(Announcement, id=id)
+            announcement = Announcement.objects.filter(id=id).first()
+            if announcement is None:
+                announcement = get_object_or_404(ArchivedAnnouncement, id=id)
             return render(request, 'board/announcement.html', {'announcement': announcement})
         form = self.form(request.GET)
-        announcements = Announcement.active.all()
+        announcements = Announcement.active.select_related('author')
         if request.GET:
             announcements = self.apply_filters(announcements, request.GET)
+        '''Search results are ranked, so they are paged by number'''
+        if request.GET.get('q'):
+            announcements = search_page(
+                announcements, request.GET['q'], request.GET.get('page'), self.per_page)
+        else:
+            announcements = self.paginate_by_cursor(announcements, request.GET.get('cursor'))
         context = {
             'form': form,
             'announcements': announcements,
+            'query': self.filters_query(request.GET),
+            'card_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
         }
         return render(request, 'board/announcements.html', context)
 
+    def detail_stamp(self, id: int) -> Optional[Tuple[datetime, str]]:
+        '''Archived announcement is looked up only when hot one is missing, like in get'''
+        for model in (Announcement, ArchivedAnnouncement):
+            row = model.objects.filter(id=id).values_list('edited_at', 'author__username').first()
+            if row is not None:
+                edited_at, username = row
+                return edited_at, f'{edited_at.isoformat()}:{username}'
+        return None
+
     def apply_filters(self, announcements: QuerySet, filters: QueryDict) -> QuerySet:
         category = filters.get('category')
 
@@ -11,4 +11,11 @@ then
     echo "PostgreSQL started"
 fi
 
+if [ -n "$prometheus_multiproc_dir" ]
+then
+    # metrics files of previous run would be merged with new ones
+    rm -rf "$prometheus_multiproc_dir"
+    mkdir -p "$prometheus_multiproc_dir"
+fi
+
 exec "$@"
@@ -0,0 +1,24 @@
+import os
+
+from prometheus_client import multiprocess
+
+'''Backends not seen by other workers'''
+LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def on_starting(server):
+    '''Version keys in per process default cache would keep workers out of sync'''
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    from django.conf import settings
+    backend = settings.CACHES['default']['BACKEND']
+    if server.cfg.workers > 1 and backend in LOCAL_CACHE_BACKENDS:
+        raise RuntimeError(f'{server.cfg.workers} workers need shared default cache, '
+                           f'set CACHE_BACKEND instead of {backend}')
+
+
+def child_exit(server, worker):
+    '''Gauges of dead worker are dropped from merged /metrics'''
+    multiprocess.mark_process_dead(worker.pid)
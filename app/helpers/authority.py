@@ -1,15 +1,35 @@
+from functools import wraps
+
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import PermissionDenied
+from django.http import Http404
+
 
+def check_user(model, attribute, fetch=True):
+    """
+    Checks request user owns `model` row with `id` from url
+    Loaded row is set to view `object`, so view doesn't fetch it again
+    With fetch=False only owner id is selected and view gets no object
+    """
+    owner_field = model._meta.get_field(attribute).attname
 
-def check_user(model, attribute):
     def _check_user(func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
+            view, request = args[0], args[1]
+            view.object = None
             _id = kwargs.get('id')
             if _id is not None:
-                instance = get_object_or_404(model, id=_id)
-                user = getattr(instance, attribute)
-                if not user == args[1].user:
+                if fetch:
+                    instance = get_object_or_404(model, id=_id)
+                    owner_id = getattr(instance, owner_field)
+                    view.object = instance
+                else:
+                    owner_ids = model.objects.filter(id=_id).values_list(owner_field, flat=True)
+                    if not owner_ids:
+                        raise Http404
+                    owner_id = owner_ids[0]
+                if not owner_id == request.user.id:
                     raise PermissionDenied
             return func(*args, **kwargs)
         return wrapper
@@ -0,0 +1,11 @@
+from django.db import connections, router
+
+
+def bulk_batch_size(model, batch_size: int) -> int:
+    '''
+    Django 3.0 doesn't cap explicit batch_size of bulk_create by backend limits,
+    SQLite fails on more than 500 rows or 999 params per statement
+    '''
+    connection = connections[router.db_for_write(model)]
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    return max(min(batch_size, connection.ops.bulk_batch_size(fields, range(batch_size))), 1)
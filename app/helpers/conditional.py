@@ -0,0 +1,47 @@
+import hashlib
+from calendar import timegm
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from helpers.response_cache import is_shareable, share_response
+
+
+class ConditionalDetailMixin:
+    """
+    View mixin answering conditional GET of detail pages with 304
+    View defines `detail_stamp(id)`, which makes one cheap query and returns
+    (last_modified, version): last_modified is None when the page shows rows
+    without stamps, version covers everything else the page depends on
+    ETag also varies by user, pages have user specific navbar
+    Anonymous pages are marked public, nginx revalidates them with ETag
+    """
+
+    def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if (request.method not in ('GET', 'HEAD') or kwargs.get('id') is None
+                or CookieStorage.cookie_name in request.COOKIES):
+            return super().dispatch(request, *args, **kwargs)
+        stamp = self.detail_stamp(kwargs['id'])
+        if stamp is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        last_modified, version = stamp
+        etag = quote_etag(hashlib.md5(
+            f'{self.name}:{kwargs["id"]}:{version}:{request.user.pk}'.encode()).hexdigest())
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        '''304 repeats validators, caches update stored copy with them'''
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return share_response(response) if is_shareable(request) else response
+
+    def detail_stamp(self, id: int) -> Optional[Tuple[Optional[datetime], str]]:
+        raise NotImplementedError
@@ -0,0 +1,29 @@
+import math
+from typing import Dict, Iterator, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LATITUDE = 111.2
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def pairs_within(points: Dict[int, Tuple[float, float]],
+                 radius_km: float) -> Iterator[Tuple[int, int, float]]:
+    """
+    (id, other id, distance) of every pair of points closer than radius, each pair once
+    Points are swept by latitude, so only a narrow band of them is measured
+    """
+    ordered = sorted(points.items(), key=lambda item: item[1][0])
+    window = radius_km / KM_PER_DEGREE_LATITUDE
+    for n, (point_id, (lat, lon)) in enumerate(ordered):
+        for other_id, (other_lat, other_lon) in ordered[n + 1:]:
+            if other_lat - lat > window:
+                break
+            distance = haversine_km(lat, lon, other_lat, other_lon)
+            if distance <= radius_km:
+                yield point_id, other_id, distance
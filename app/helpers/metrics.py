@@ -0,0 +1,95 @@
+"""
+Prometheus metrics of the app
+Under gunicorn every worker writes its values to mmap'd files in
+`prometheus_multiproc_dir`, /metrics merges them, see gunicorn.conf.py
+"""
+
+import os
+import time
+
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+from django.views import View
+from prometheus_client import (
+    Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST,
+)
+from prometheus_client import multiprocess
+
+REQUESTS = Counter(
+    'bandmate_http_requests_total', 'Requests by view name',
+    ['view', 'method', 'status'])
+LATENCY = Histogram(
+    'bandmate_http_request_duration_seconds', 'Request latency by view name',
+    ['view'])
+QUERIES = Histogram(
+    'bandmate_db_queries_per_request', 'SQL queries per request by view name',
+    ['view'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')))
+CACHE = Counter(
+    'bandmate_cache_requests_total', 'Lookups of app caches',
+    ['cache', 'result'])
+
+
+'''Any other method is counted as 'other', clients can send arbitrary ones'''
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+
+def method_label(method: str) -> str:
+    return method if method in METHODS else 'other'
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def view_name(view_func) -> str:
+    '''`name` attribute of class based view, url names are same'''
+    view_class = getattr(view_func, 'view_class', None)
+    return getattr(view_class, 'name', None) or getattr(view_func, '__name__', 'unknown')
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Counts every request, its latency and number of queries per view name
+    Requests not resolved to a view are labeled 'unresolved'
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        counter = QueryCounter()
+        request.metrics_view = 'unresolved'
+        with connections['default'].execute_wrapper(counter):
+            response = self.get_response(request)
+        view = request.metrics_view
+        REQUESTS.labels(view, method_label(request.method), response.status_code).inc()
+        LATENCY.labels(view).observe(time.perf_counter() - started)
+        QUERIES.labels(view).observe(counter.count)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func)
+
+
+class MetricsView(View):
+    '''Restricted to internal scrapers in nginx.conf'''
+
+    name = 'metrics'
+
+    def get(self, request: HttpRequest) -> HttpResponse:
+        registry = REGISTRY
+        if 'prometheus_multiproc_dir' in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,35 @@
+import hashlib
+import struct
+from typing import Iterable, List, Optional
+
+'''Signature is BANDS * ROWS min hashes, sets sharing any band of rows collide'''
+BANDS = 16
+ROWS = 2
+
+
+def _hash64(*parts) -> int:
+    '''Stable across processes, unlike builtin hash()'''
+    digest = hashlib.blake2b(':'.join(map(str, parts)).encode(), digest_size=8).digest()
+    return struct.unpack('>q', digest)[0]
+
+
+def band_features(style_ids: Iterable[int], city_id: Optional[int]) -> List[str]:
+    features = [f'style:{style_id}' for style_id in style_ids]
+    if city_id is not None:
+        features.append(f'city:{city_id}')
+    return features
+
+
+def signature(features: Iterable[str]) -> List[int]:
+    '''Min hash per seed, estimated Jaccard of two sets is share of equal positions'''
+    features = list(features)
+    if not features:
+        return []
+    return [min(_hash64(seed, feature) for feature in features) for seed in range(BANDS * ROWS)]
+
+
+def buckets(features: Iterable[str]) -> List[int]:
+    '''One bucket per band of signature rows, band number is hashed in'''
+    values = signature(features)
+    return [_hash64(band, *values[band * ROWS:(band + 1) * ROWS])
+            for band in range(BANDS if values else 0)]
@@ -0,0 +1,237 @@
+import json
+import base64
+import datetime
+import hashlib
+import binascii
+from typing import Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.core.paginator import Paginator, InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.http import QueryDict
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+from helpers.metrics import record_cache
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    '''DjangoJSONEncoder cuts datetime to milliseconds, cursor needs exact value'''
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorPage:
+    """
+    Page of keyset paginator
+    Mimics django Page api used in templates: object_list, has_next, has_previous
+    """
+
+    def __init__(self, object_list: list, paginator: 'CursorPaginator',
+                 has_next: bool, has_previous: bool):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage: {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self) -> Optional[str]:
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'prev')
+
+
+class CursorPaginator:
+    """
+    Keyset paginator, no COUNT and no OFFSET
+    Ordering must be unique, so last field should be primary key
+    Descending fields are prefixed with '-' like in order_by
+    Cursor is an opaque token with ordering values of the row page starts after
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int,
+                 ordering: Sequence[str] = ('id', )):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    def page(self, cursor: Optional[str] = None) -> CursorPage:
+        if not cursor:
+            rows = list(self.object_list.order_by(*self.ordering)[:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], self,
+                              has_next=len(rows) > self.per_page, has_previous=False)
+
+        values, direction = self.decode_cursor(cursor)
+        if direction == 'next':
+            rows = list(
+                self.object_list
+                .filter(self._seek(values, reverse=False))
+                .order_by(*self.ordering)[:self.per_page + 1]
+            )
+            return CursorPage(rows[:self.per_page], self,
+                              has_next=len(rows) > self.per_page, has_previous=True)
+
+        rows = list(
+            self.object_list
+            .filter(self._seek(values, reverse=True))
+            .order_by(*self._reversed_ordering())[:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, self, has_next=True, has_previous=has_previous)
+
+    def encode_cursor(self, obj, direction: str) -> str:
+        values = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        raw = json.dumps([direction, values], cls=CursorEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> Tuple[list, str]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(raw)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            raise InvalidCursor('Invalid cursor')
+        if direction not in ('next', 'prev') or not isinstance(values, list) \
+                or len(values) != len(self.ordering):
+            raise InvalidCursor('Invalid cursor')
+
+        '''Restore python values from json'''
+        model_meta = self.object_list.model._meta
+        try:
+            values = [model_meta.get_field(field.lstrip('-')).to_python(value)
+                      for field, value in zip(self.ordering, values)]
+        except Exception:
+            raise InvalidCursor('Invalid cursor')
+        return values, direction
+
+    def _reversed_ordering(self) -> Tuple[str, ...]:
+        return tuple(field[1:] if field.startswith('-') else f'-{field}'
+                     for field in self.ordering)
+
+    def _seek(self, values: list, reverse: bool) -> Q:
+        '''(a, b) > (x, y) expands to a > x OR (a = x AND b > y)'''
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+class CursorPaginationMixin:
+    """
+    View mixin for keyset paginated listings
+    View defines `per_page` and unique `ordering`
+    """
+
+    per_page = 10
+    ordering = ('id', )
+
+    def paginate_by_cursor(self, object_list: QuerySet, cursor: Optional[str]) -> CursorPage:
+        paginator = CursorPaginator(object_list, self.per_page, ordering=self.ordering)
+        try:
+            return paginator.page(cursor)
+        except InvalidCursor:
+            return paginator.page()
+
+    def filters_query(self, filters: QueryDict) -> str:
+        '''Filters to keep in pagination links'''
+        query = filters.copy()
+        query.pop('page', None)
+        query.pop('cursor', None)
+        return query.urlencode()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator which avoids exact COUNT(*) over large result sets
+    On postgres uses planner estimate if it is over threshold
+    Otherwise exact count is used, large counts are cached for cache_timeout seconds
+    `is_estimated` tells templates to render "about N results"
+    """
+
+    threshold = 10000
+    cache_timeout = 60
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_estimated = False
+
+    @cached_property
+    def count(self) -> int:
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+
+        estimate = self.planner_estimate()
+        if estimate is not None and estimate >= self.threshold:
+            self.is_estimated = True
+            return estimate
+
+        cache_key = self.cache_key()
+        count = cache.get(cache_key)
+        record_cache('estimated_count', count is not None)
+        if count is not None:
+            self.is_estimated = True
+            return count
+
+        count = super().count
+        if count >= self.threshold:
+            cache.set(cache_key, count, self.cache_timeout)
+        return count
+
+    def planner_estimate(self) -> Optional[int]:
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = self.object_list.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def cache_key(self) -> str:
+        sql, params = self.object_list.order_by().values('pk').query.sql_with_params()
+        digest = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+        return f'estimated_count:{self.object_list.db}:{digest}'
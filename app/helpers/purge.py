@@ -0,0 +1,64 @@
+"""
+Refreshing pages of changed rows in nginx micro-cache
+Open source nginx can't delete cache entries, so page is requested again
+with X-Cache-Purge header, which bypasses the cache and stores fresh copy
+Listing pages with filters are not refreshed, they expire within SHARED_CACHE_MAX_AGE
+"""
+
+import logging
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+'''Requests leave request thread, one worker keeps nginx load low'''
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-purge')
+
+_url_names = {}
+
+
+def purge(paths: Iterable[str]):
+    for path in paths:
+        request = urllib.request.Request(
+            settings.CACHE_PURGE_URL.rstrip('/') + path,
+            headers={'X-Cache-Purge': '1', 'Host': settings.CACHE_PURGE_HOST})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+        except OSError as error:
+            logger.warning('Cache purge of %s failed: %s', path, error)
+
+
+def schedule_purge(paths: List[str]):
+    '''After commit, so refreshed page shows committed rows'''
+    if settings.CACHE_PURGE_URL and paths:
+        transaction.on_commit(lambda: _executor.submit(purge, paths))
+
+
+def changed_paths(instance) -> List[str]:
+    '''Listing and detail page of the row, both share url name'''
+    url_name = _url_names.get(type(instance))
+    if url_name is None:
+        return []
+    return [reverse(url_name), reverse(url_name, args=(instance.id, ))]
+
+
+def purge_changed(sender, instance, **kwargs):
+    if kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    schedule_purge(changed_paths(instance))
+
+
+def purge_on_change(model, url_name: str):
+    '''Rows of model are listed at url_name and shown at url_name with id'''
+    _url_names[model] = url_name
+    post_save.connect(purge_changed, sender=model, weak=False)
+    post_delete.connect(purge_changed, sender=model, weak=False)
+    for field in model._meta.many_to_many:
+        m2m_changed.connect(purge_changed, sender=field.remote_field.through, weak=False)
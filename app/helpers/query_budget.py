@@ -0,0 +1,21 @@
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for listing views
+    Each checked view declares `query_budget` — max number of queries per request
+    Test fails if view goes over its budget, executed queries are listed
+    """
+
+    def assertQueryBudget(self, view, url: str, **extra) -> HttpResponse:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **extra)
+        executed = len(context.captured_queries)
+        if executed > view.query_budget:
+            queries = '\n'.join(query['sql'] for query in context.captured_queries)
+            self.fail(f'{view.name} executed {executed} queries, '
+                      f'budget is {view.query_budget}:\n{queries}')
+        return response
@@ -0,0 +1,124 @@
+import time
+import hashlib
+from typing import List, Optional, Sequence
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import urlencode
+
+from helpers.metrics import record_cache
+
+GENERATION_KEY = 'response_cache:{}:generation'
+
+
+def generation_key(model) -> str:
+    return GENERATION_KEY.format(model._meta.label_lower)
+
+
+def new_generation() -> int:
+    '''Counter lost from cache restarts from current time, so it never matches old entries'''
+    return time.time_ns() // 1000
+
+
+def generations(models: Sequence) -> List[int]:
+    keys = [generation_key(model) for model in models]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, new_generation(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump_generation(model):
+    key = generation_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, new_generation(), None)
+
+
+def invalidate_responses(sender, **kwargs):
+    '''Bump now for this transaction and again after commit, page may be cached in between'''
+    if kwargs.get('action', 'post_').startswith('pre_'):
+        return
+    models = {kwargs['instance'].__class__, kwargs.get('model') or sender}
+    for model in models:
+        bump_generation(model)
+        transaction.on_commit(lambda model=model: bump_generation(model))
+
+
+def track_models(*models):
+    '''Any saved, deleted or relinked row of these models invalidates cached pages showing them'''
+    for model in models:
+        post_save.connect(invalidate_responses, sender=model, weak=False)
+        post_delete.connect(invalidate_responses, sender=model, weak=False)
+        for field in model._meta.many_to_many:
+            m2m_changed.connect(invalidate_responses, sender=field.remote_field.through, weak=False)
+
+
+def is_shareable(request: HttpRequest) -> bool:
+    '''Same page for every visitor: anonymous, without pending flash messages'''
+    return (request.method in ('GET', 'HEAD') and CookieStorage.cookie_name not in request.COOKIES
+            and not request.user.is_authenticated)
+
+
+def share_response(response: HttpResponse) -> HttpResponse:
+    '''Lets nginx micro-cache and browsers keep page of shareable request, see nginx.conf'''
+    if settings.SHARED_CACHE_MAX_AGE and response.status_code in (200, 304) and not response.cookies:
+        patch_cache_control(response, public=True, max_age=settings.SHARED_CACHE_MAX_AGE,
+                            stale_while_revalidate=settings.SHARED_CACHE_STALE)
+        patch_vary_headers(response, ('Cookie', ))
+    return response
+
+
+class ResponseCacheMixin:
+    """
+    View mixin caching whole listing pages for anonymous visitors
+    Key is view name, generations of `cache_models` and normalized GET params,
+    so any change of these models makes old pages unreachable
+    Requests with other params, detail pages, logged in users and
+    visitors with pending flash messages always go to the view
+    Pages of anonymous visitors are also marked public for nginx micro-cache
+    """
+
+    cache_models: Sequence = ()
+    cache_params: Sequence[str] = ()
+
+    def dispatch(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        if kwargs or not is_shareable(request):
+            return super().dispatch(request, *args, **kwargs)
+        key = self.response_cache_key(request)
+        if key is None:
+            return share_response(super().dispatch(request, *args, **kwargs))
+        responses = caches[settings.RESPONSE_CACHE_ALIAS]
+        cached = responses.get(key)
+        record_cache('response', cached is not None)
+        if cached is not None:
+            content, content_type = cached
+            return share_response(HttpResponse(content, content_type=content_type))
+
+        response = super().dispatch(request, *args, **kwargs)
+        '''Responses setting cookies belong to one visitor'''
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            responses.set(key, (response.content, response['Content-Type']),
+                          settings.RESPONSE_CACHE_TIMEOUT)
+        return share_response(response)
+
+    def response_cache_key(self, request: HttpRequest) -> Optional[str]:
+        if not settings.RESPONSE_CACHE_TIMEOUT or request.method != 'GET':
+            return None
+        if any(param not in self.cache_params for param in request.GET):
+            return None
+        params = urlencode(sorted(
+            (param, value) for param in request.GET
+            for value in request.GET.getlist(param) if value
+        ))
+        versions = '.'.join(str(generation) for generation in generations(self.cache_models))
+        digest = hashlib.md5(params.encode()).hexdigest()
+        return f'response_cache:{self.name}:{versions}:{digest}'
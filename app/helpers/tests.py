@@ -0,0 +1,197 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.test import TestCase, RequestFactory, override_settings
+from django.shortcuts import reverse
+from django.http import HttpResponse
+from django.core.cache import caches
+from django.template.backends.django import Template
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST
+
+from bands.models import City, Musician
+from bands.reference import reference_data
+from bands.views import UserDashboardView, MusiciansView, BandsView
+from bands.tests import CityFactory, UserFactory, BandFactory
+from helpers import purge, timing
+from helpers.timing import ServerTimingMiddleware, sql_shape
+from helpers.metrics import MetricsView
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TestServerTiming(TestCase):
+
+    def setUp(self):
+        for user in UserFactory.create_batch(size=3):
+            user.musician.activated = True
+            user.musician.save()
+
+    def tearDown(self):
+        UserFactory.reset_sequence()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_header_and_log(self):
+        with self.assertLogs('helpers.timing', 'INFO') as logs:
+            response = self.client.get(reverse(MusiciansView.name))
+        self.assertRegex(response['Server-Timing'],
+                         r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, view;dur=[\d.]+, total;dur=[\d.]+$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], MusiciansView.name)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertNotIn('repeated_queries', record)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1, SERVER_TIMING_REPEATED_QUERIES=2)
+    def test_repeated_queries_are_flagged(self):
+        def n_plus_one_view(request):
+            for musician in Musician.objects.all():
+                musician.user.username
+            return HttpResponse()
+
+        middleware = ServerTimingMiddleware(n_plus_one_view)
+        with self.assertLogs('helpers.timing', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], 4)
+        self.assertEqual(len(record['repeated_queries']), 1)
+        self.assertEqual(record['repeated_queries'][0]['count'], 3)
+        self.assertIn('FROM "auth_user"', record['repeated_queries'][0]['sql'])
+
+    def test_not_sampled(self):
+        response = self.client.get(reverse(MusiciansView.name))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_render_is_wrapped_once_by_middleware(self):
+        ServerTimingMiddleware(lambda request: HttpResponse())
+        ServerTimingMiddleware(lambda request: HttpResponse())
+        self.assertIs(Template.render, timing.render_timed)
+        self.assertIsNot(timing._render, timing.render_timed)
+
+    def test_sql_shape(self):
+        self.assertEqual(sql_shape('SELECT 1 WHERE id IN (%s, %s, %s) AND a = %s'),
+                         'SELECT 1 WHERE id IN (...) AND a = %s')
+
+
+class TestSharedCache(TestCase):
+
+    MUSICIANS_URL = reverse(MusiciansView.name)
+
+    def setUp(self):
+        caches['responses'].clear()
+        self.user = UserFactory()
+        self.band = BandFactory(admin=self.user)
+        self.band_url = reverse(BandsView.name, args=(self.band.id, ))
+
+    def assertPublic(self, response: HttpResponse):
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=10', response['Cache-Control'])
+        self.assertIn('stale-while-revalidate=30', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+    @override_settings(SHARED_CACHE_MAX_AGE=10, SHARED_CACHE_STALE=30)
+    def test_anonymous_pages_are_public(self):
+        self.assertPublic(self.client.get(self.MUSICIANS_URL))
+        self.assertPublic(self.client.get(self.MUSICIANS_URL))
+        self.assertPublic(self.client.get(f'{self.MUSICIANS_URL}?q=name'))
+        response = self.client.get(self.band_url)
+        self.assertPublic(response)
+        not_modified = self.client.get(self.band_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertPublic(not_modified)
+
+    @override_settings(SHARED_CACHE_MAX_AGE=10, SHARED_CACHE_STALE=30)
+    def test_user_specific_pages_are_not_public(self):
+        self.client.cookies['messages'] = 'pending'
+        self.assertNotIn('public', self.client.get(self.MUSICIANS_URL).get('Cache-Control', ''))
+        del self.client.cookies['messages']
+
+        self.client.force_login(self.user)
+        for url in (self.MUSICIANS_URL, self.band_url, reverse(UserDashboardView.name)):
+            self.assertNotIn('public', self.client.get(url).get('Cache-Control', ''))
+
+    @override_settings(SHARED_CACHE_MAX_AGE=0)
+    def test_disabled(self):
+        self.assertNotIn('Cache-Control', self.client.get(self.MUSICIANS_URL))
+
+
+class TestCachePurge(TestCase):
+
+    def test_changed_paths(self):
+        user = UserFactory()
+        band = BandFactory(admin=user)
+        self.assertEqual(purge.changed_paths(user.musician),
+                         [reverse(MusiciansView.name), reverse(MusiciansView.name, args=(user.musician.id, ))])
+        self.assertEqual(purge.changed_paths(band), [reverse(BandsView.name), reverse(BandsView.name, args=(band.id, ))])
+        self.assertEqual(purge.changed_paths(CityFactory()), [])
+
+    def test_purge_requests_pages(self):
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                received.append((self.path, self.headers['X-Cache-Purge'], self.headers['Host']))
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        with override_settings(CACHE_PURGE_URL=f'http://127.0.0.1:{server.server_port}/',
+                               CACHE_PURGE_HOST='bandmate.test'):
+            purge.purge(['/bands/', '/bands/1/'])
+        self.assertEqual(received, [('/bands/', '1', 'bandmate.test'), ('/bands/1/', '1', 'bandmate.test')])
+
+    def test_unreachable_nginx_is_logged(self):
+        with override_settings(CACHE_PURGE_URL='http://127.0.0.1:9'), \
+                self.assertLogs('helpers.purge', 'WARNING'):
+            purge.purge(['/bands/'])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TestMetrics(TestCase):
+
+    def sample(self, name: str, **labels) -> float:
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_counted_by_view_name(self):
+        requests = self.sample('bandmate_http_requests_total',
+                               view=MusiciansView.name, method='GET', status='200')
+        queries = self.sample('bandmate_db_queries_per_request_count', view=MusiciansView.name)
+        self.client.get(reverse(MusiciansView.name))
+        self.assertEqual(self.sample('bandmate_http_requests_total',
+                                     view=MusiciansView.name, method='GET', status='200'),
+                         requests + 1)
+        self.assertEqual(self.sample('bandmate_db_queries_per_request_count',
+                                     view=MusiciansView.name), queries + 1)
+        self.client.get('/no/such/page/')
+        self.assertGreater(self.sample('bandmate_http_requests_total',
+                                       view='unresolved', method='GET', status='404'), 0)
+
+    def test_unknown_methods_share_label(self):
+        before = self.sample('bandmate_http_requests_total', view='unresolved', method='other', status='404')
+        self.client.generic('BREW', '/no/such/page/')
+        self.client.generic('X-RANDOM-1', '/no/such/page/')
+        self.assertEqual(self.sample('bandmate_http_requests_total',
+                                     view='unresolved', method='other', status='404'), before + 2)
+        self.assertEqual(self.sample('bandmate_http_requests_total',
+                                     view='unresolved', method='BREW', status='404'), 0)
+
+    def test_cache_lookups_are_counted(self):
+        reference_data.all(City)
+        hits = self.sample('bandmate_cache_requests_total', cache='reference_data', result='hit')
+        reference_data.all(City)
+        self.assertEqual(self.sample('bandmate_cache_requests_total',
+                                     cache='reference_data', result='hit'), hits + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse(BandsView.name))
+        response = self.client.get(reverse(MetricsView.name))
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE_LATEST)
+        self.assertContains(response, 'bandmate_http_request_duration_seconds_bucket{le="0.005",view="bands"}')
@@ -0,0 +1,27 @@
+import re
+from typing import FrozenSet
+
+from text_unidecode import unidecode
+
+
+def normalize_name(*parts: str) -> str:
+    '''Ascii lowercase words, so "Björk" and "bjork" are stored the same way'''
+    words = re.findall(r'[a-z0-9]+', unidecode(' '.join(filter(None, parts))).lower())
+    return ' '.join(words)
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    '''Trigrams of every word padded like pg_trgm does: two spaces before, one after'''
+    return frozenset(
+        f'  {word} '[i:i + 3]
+        for word in normalize_name(text).split()
+        for i in range(len(word) + 1)
+    )
+
+
+def word_similarity(query: str, text: str) -> float:
+    '''Share of query trigrams found in text, close to pg_trgm word_similarity()'''
+    query_trigrams = trigrams(query)
+    if not query_trigrams:
+        return 0.0
+    return len(query_trigrams & trigrams(text)) / len(query_trigrams)
@@ -0,0 +1,140 @@
+import re
+import json
+import time
+import random
+import logging
+from contextlib import ExitStack
+from contextvars import ContextVar
+from collections import Counter
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+_timing = ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.queries = Counter()
+
+    @property
+    def query_count(self) -> int:
+        return sum(self.queries.values())
+
+    def repeated_queries(self, threshold: int) -> dict:
+        return {shape: count for shape, count in self.queries.most_common() if count > threshold}
+
+
+def sql_shape(sql: str) -> str:
+    '''Parameter lists of any length look the same: IN (%s, %s) is IN (...)'''
+    return re.sub(r'\((?:%s, )*%s\)', '(...)', sql)
+
+
+def record_query(execute, sql, params, many, context):
+    timing = _timing.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timing is not None:
+            timing.sql_time += time.perf_counter() - started
+            timing.queries[sql_shape(sql)] += 1
+
+
+_render = None
+
+
+def render_timed(self, context=None, request=None):
+    '''Django template backend render, time is added to current request if sampled'''
+    timing = _timing.get()
+    if timing is None:
+        return _render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        timing.template_time += time.perf_counter() - started
+
+
+def time_template_render():
+    '''Django template backend has no hooks for timing, so its render is wrapped once'''
+    global _render
+    if _render is None:
+        _render = Template.render
+        Template.render = render_timed
+
+
+class ServerTimingMiddleware:
+    """
+    Measures sampled requests: SQL count and time, template time and rest of view time
+    Adds Server-Timing header and logs one JSON line per request
+    Repeating one query shape over SERVER_TIMING_REPEATED_QUERIES times is logged as N+1
+    Requests out of SERVER_TIMING_SAMPLE_RATE are not touched at all
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        '''Only projects using the middleware get template render wrapped'''
+        time_template_render()
+
+    def sample(self) -> bool:
+        rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0.0)
+        return rate >= 1 or random.random() < rate
+
+    def __call__(self, request):
+        if not self.sample():
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = _timing.set(timing)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _timing.reset(token)
+
+        total = time.perf_counter() - timing.started
+        view_time = max(0.0, total - timing.sql_time - timing.template_time)
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timing.sql_time * 1000:.1f};desc="{timing.query_count} queries"',
+            f'tpl;dur={timing.template_time * 1000:.1f}',
+            f'view;dur={view_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+        self.log(request, response, timing, total, view_time)
+        return response
+
+    def log(self, request, response, timing: RequestTiming, total: float, view_time: float):
+        threshold = getattr(settings, 'SERVER_TIMING_REPEATED_QUERIES', 10)
+        repeated = timing.repeated_queries(threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': self.view_name(request),
+            'status': response.status_code,
+            'queries': timing.query_count,
+            'db_ms': round(timing.sql_time * 1000, 1),
+            'template_ms': round(timing.template_time * 1000, 1),
+            'view_ms': round(view_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+        }
+        if repeated:
+            record['repeated_queries'] = [{'sql': sql, 'count': count} for sql, count in repeated.items()]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+
+    @staticmethod
+    def view_name(request) -> Optional[str]:
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match else None
@@ -0,0 +1,173 @@
+import re
+from typing import List, Optional
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator, Page, EmptyPage, PageNotAnInteger
+from django.db import connections
+from django.db.models.query import QuerySet
+
+from helpers.text import normalize_name, word_similarity
+
+'''Same as pg_trgm.word_similarity_threshold default'''
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+
+class PostgresBackend:
+    '''tsvector column with GIN index, ranked with ts_rank'''
+
+    SQL = '''
+        SELECT object_id FROM search_searchdocument, plainto_tsquery('english', %s) query
+        WHERE kind = %s AND vector @@ query
+        ORDER BY ts_rank(vector, query) DESC, object_id
+        LIMIT %s
+    '''
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    NAME_SQL = '''
+        SELECT id FROM {table}
+        WHERE %s <%% search_name
+        ORDER BY word_similarity(%s, search_name) DESC, id
+        LIMIT %s
+    '''
+
+    def search(self, kind: str, query: str, limit: int) -> List[int]:
+        with self.connection.cursor() as cursor:
+            cursor.execute(self.SQL, [query, kind, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def similar_names(self, model, query: str, limit: int) -> List[int]:
+        '''Trigram GIN index on normalized `search_name` serves the <% operator'''
+        query = normalize_name(query)
+        if not query:
+            return []
+        with self.connection.cursor() as cursor:
+            cursor.execute(self.NAME_SQL.format(table=model._meta.db_table), [query, query, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class SQLiteBackend:
+    '''FTS5 table, ranked with bm25'''
+
+    SQL = '''
+        SELECT document.object_id
+        FROM search_searchdocument_fts
+        JOIN search_searchdocument document ON document.id = search_searchdocument_fts.rowid
+        WHERE search_searchdocument_fts MATCH %s AND document.kind = %s
+        ORDER BY search_searchdocument_fts.rank, document.object_id
+        LIMIT %s
+    '''
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    @staticmethod
+    def match_expression(query: str) -> Optional[str]:
+        '''Every word must match, FTS5 operators in user input are quoted away'''
+        words = re.findall(r'\w+', query)
+        if not words:
+            return None
+        return ' '.join(f'"{word}"' for word in words)
+
+    NAME_SQL = '''
+        SELECT rowid, search_name FROM {table}_name_fts
+        WHERE {table}_name_fts MATCH %s
+        ORDER BY rank
+        LIMIT %s
+    '''
+
+    PREFIX_SQL = '''
+        SELECT id, search_name FROM {table}
+        WHERE search_name LIKE %s OR search_name LIKE %s
+        LIMIT %s
+    '''
+
+    '''Trigram matches loaded per wanted result to be scored in python'''
+    CANDIDATES_FACTOR = 10
+
+    def search(self, kind: str, query: str, limit: int) -> List[int]:
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        with self.connection.cursor() as cursor:
+            cursor.execute(self.SQL, [expression, kind, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def similar_names(self, model, query: str, limit: int) -> List[int]:
+        """
+        FTS5 trigram table finds names sharing any trigram with query,
+        best of them are scored like pg_trgm word_similarity
+        Words shorter than trigram are matched by prefix
+        """
+        query = normalize_name(query)
+        trigrams = {word[i:i + 3] for word in query.split() for i in range(len(word) - 2)}
+        table = model._meta.db_table
+        with self.connection.cursor() as cursor:
+            if trigrams:
+                expression = ' OR '.join(f'"{trigram}"' for trigram in sorted(trigrams))
+                cursor.execute(self.NAME_SQL.format(table=table),
+                               [expression, limit * self.CANDIDATES_FACTOR])
+            elif query:
+                cursor.execute(self.PREFIX_SQL.format(table=table), [f'{query}%', f'% {query}%', limit])
+            else:
+                return []
+            rows = cursor.fetchall()
+        scored = sorted((-word_similarity(query, name), object_id) for object_id, name in rows)
+        return [object_id for score, object_id in scored
+                if -score >= WORD_SIMILARITY_THRESHOLD][:limit]
+
+
+BACKENDS = {
+    'postgresql': PostgresBackend,
+    'sqlite': SQLiteBackend,
+}
+
+'''Only this many best matches are ranked and paged'''
+MAX_RESULTS = 1000
+
+
+def get_backend(using: str = 'default'):
+    connection = connections[using]
+    return BACKENDS[connection.vendor](connection)
+
+
+def search_kind(model) -> str:
+    return model._meta.label_lower
+
+
+def has_search_name(model) -> bool:
+    try:
+        model._meta.get_field('search_name')
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def search_ids(queryset: QuerySet, query: str) -> List[int]:
+    '''Name matches go first, then full-text matches'''
+    backend = get_backend(queryset.db)
+    ids = []
+    if has_search_name(queryset.model):
+        ids += backend.similar_names(queryset.model, query, MAX_RESULTS)
+    ids += backend.search(search_kind(queryset.model), query, MAX_RESULTS)
+    return list(dict.fromkeys(ids))[:MAX_RESULTS]
+
+
+def search_page(queryset: QuerySet, query: str, page: Optional[str], per_page: int) -> Page:
+    """
+    Page of queryset objects matching query, best matches first
+    Queryset filters are applied in database, rank order is kept
+    """
+    ids = search_ids(queryset, query)
+    matched = set(queryset.filter(id__in=ids).values_list('id', flat=True))
+    paginator = Paginator([object_id for object_id in ids if object_id in matched], per_page)
+    try:
+        page = paginator.page(page)
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    rows = queryset.in_bulk(page.object_list)
+    page.object_list = [rows[object_id] for object_id in page.object_list if object_id in rows]
+    return page
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from search.models import SearchDocument
+from search.signals import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Reindex bios, band descriptions and announcements for full-text search'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'{SearchDocument.objects.count()} search documents indexed'))
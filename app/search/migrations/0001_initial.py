@@ -0,0 +1,99 @@
+# Generated by Django 3.0.5 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+from helpers.bulk import bulk_batch_size
+
+
+POSTGRES_INDEX = [
+    '''ALTER TABLE search_searchdocument ADD COLUMN vector tsvector
+       GENERATED ALWAYS AS (to_tsvector('english', body)) STORED''',
+    'CREATE INDEX search_document_vector ON search_searchdocument USING gin (vector)',
+]
+
+POSTGRES_DROP_INDEX = [
+    'DROP INDEX IF EXISTS search_document_vector',
+    'ALTER TABLE search_searchdocument DROP COLUMN IF EXISTS vector',
+]
+
+SQLITE_INDEX = [
+    '''CREATE VIRTUAL TABLE search_searchdocument_fts USING fts5(
+       body, content='search_searchdocument', content_rowid='id', tokenize='porter unicode61')''',
+    '''CREATE TRIGGER search_searchdocument_ai AFTER INSERT ON search_searchdocument BEGIN
+       INSERT INTO search_searchdocument_fts(rowid, body) VALUES (new.id, new.body);
+       END''',
+    '''CREATE TRIGGER search_searchdocument_ad AFTER DELETE ON search_searchdocument BEGIN
+       INSERT INTO search_searchdocument_fts(search_searchdocument_fts, rowid, body)
+       VALUES ('delete', old.id, old.body);
+       END''',
+    '''CREATE TRIGGER search_searchdocument_au AFTER UPDATE ON search_searchdocument BEGIN
+       INSERT INTO search_searchdocument_fts(search_searchdocument_fts, rowid, body)
+       VALUES ('delete', old.id, old.body);
+       INSERT INTO search_searchdocument_fts(rowid, body) VALUES (new.id, new.body);
+       END''',
+]
+
+SQLITE_DROP_INDEX = [
+    'DROP TRIGGER IF EXISTS search_searchdocument_ai',
+    'DROP TRIGGER IF EXISTS search_searchdocument_ad',
+    'DROP TRIGGER IF EXISTS search_searchdocument_au',
+    'DROP TABLE IF EXISTS search_searchdocument_fts',
+]
+
+INDEXES = {
+    'postgresql': (POSTGRES_INDEX, POSTGRES_DROP_INDEX),
+    'sqlite': (SQLITE_INDEX, SQLITE_DROP_INDEX),
+}
+
+SEARCH_FIELDS = {
+    'bands.musician': ('bio', ),
+    'bands.band': ('description', ),
+    'board.announcement': ('title', 'text'),
+}
+
+
+def create_full_text_index(apps, schema_editor):
+    for statement in INDEXES[schema_editor.connection.vendor][0]:
+        schema_editor.execute(statement)
+
+
+def drop_full_text_index(apps, schema_editor):
+    for statement in INDEXES[schema_editor.connection.vendor][1]:
+        schema_editor.execute(statement)
+
+
+def index_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('search', 'SearchDocument')
+    for kind, fields in SEARCH_FIELDS.items():
+        model = apps.get_model(kind)
+        SearchDocument.objects.bulk_create((
+            SearchDocument(kind=kind, object_id=row[0], body='\n'.join(row[1:]))
+            for row in model.objects.values_list('id', *fields).iterator()
+        ), batch_size=bulk_batch_size(SearchDocument, 1000))
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('bands', '0003_band_name_index'),
+        ('board', '0006_announcement_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('object_id', models.IntegerField()),
+                ('body', models.TextField()),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_full_text_index, drop_full_text_index),
+        migrations.RunPython(index_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 3.0.5 on 2026-10-18 21:02
+
+from django.db import migrations
+
+
+NAME_TABLES = ('bands_musician', 'bands_band')
+
+
+def postgres_index(table):
+    return [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        f'CREATE INDEX {table}_search_name_trgm ON {table} USING gin (search_name gin_trgm_ops)',
+    ]
+
+
+def postgres_drop_index(table):
+    return [f'DROP INDEX IF EXISTS {table}_search_name_trgm']
+
+
+def sqlite_index(table):
+    fts = f'{table}_name_fts'
+    return [
+        f'''CREATE VIRTUAL TABLE {fts} USING fts5(
+            search_name, content='{table}', content_rowid='id', tokenize='trigram')''',
+        f'''CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, search_name) VALUES (new.id, new.search_name);
+            END''',
+        f'''CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, search_name) VALUES ('delete', old.id, old.search_name);
+            END''',
+        f'''CREATE TRIGGER {fts}_au AFTER UPDATE OF search_name ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, search_name) VALUES ('delete', old.id, old.search_name);
+            INSERT INTO {fts}(rowid, search_name) VALUES (new.id, new.search_name);
+            END''',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def sqlite_drop_index(table):
+    fts = f'{table}_name_fts'
+    return [
+        f'DROP TRIGGER IF EXISTS {fts}_ai',
+        f'DROP TRIGGER IF EXISTS {fts}_ad',
+        f'DROP TRIGGER IF EXISTS {fts}_au',
+        f'DROP TABLE IF EXISTS {fts}',
+    ]
+
+
+INDEXES = {
+    'postgresql': (postgres_index, postgres_drop_index),
+    'sqlite': (sqlite_index, sqlite_drop_index),
+}
+
+
+def create_name_index(apps, schema_editor):
+    for table in NAME_TABLES:
+        for statement in INDEXES[schema_editor.connection.vendor][0](table):
+            schema_editor.execute(statement)
+
+
+def drop_name_index(apps, schema_editor):
+    for table in NAME_TABLES:
+        for statement in INDEXES[schema_editor.connection.vendor][1](table):
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_initial'),
+        ('bands', '0004_search_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
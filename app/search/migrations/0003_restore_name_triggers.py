@@ -0,0 +1,31 @@
+# Generated by Django 3.0.5 on 2026-10-18 22:40
+
+from importlib import import_module
+
+from django.db import migrations
+
+name_index = import_module('search.migrations.0002_name_trigram_index')
+
+
+def restore_name_index(apps, schema_editor):
+    '''
+    SQLite applies AddField of bands 0007 by copying the table,
+    which drops triggers keeping name index in sync
+    '''
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in name_index.NAME_TABLES:
+        for statement in name_index.sqlite_drop_index(table) + name_index.sqlite_index(table):
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_name_trigram_index'),
+        ('bands', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_name_index, migrations.RunPython.noop),
+    ]
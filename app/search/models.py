@@ -0,0 +1,22 @@
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of one object, `kind` is model label like 'bands.musician'
+    Full-text index is vendor specific and created in migrations:
+        postgres — generated tsvector column with GIN index
+        sqlite — FTS5 table synced by triggers
+    """
+    kind = models.CharField(max_length=50)
+    object_id = models.IntegerField()
+    body = models.TextField()
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+    def __repr__(self):
+        return f'<SearchDocument: {self.kind} {self.object_id}>'
@@ -0,0 +1,51 @@
+from django.db.models.signals import post_save, post_delete
+
+from bands.models import Musician, Band
+from board.models import Announcement
+from search.models import SearchDocument
+from search.backends import search_kind
+from helpers.bulk import bulk_batch_size
+
+
+'''Searchable text fields of every indexed model'''
+SEARCH_FIELDS = {
+    Musician: ('bio', ),
+    Band: ('description', ),
+    Announcement: ('title', 'text'),
+}
+
+
+def document_body(instance) -> str:
+    return '\n'.join(getattr(instance, field) for field in SEARCH_FIELDS[type(instance)])
+
+
+def index_object(sender, instance, **kwargs):
+    '''Most saves don't touch text, so existing document is compared before writing'''
+    kind = search_kind(sender)
+    body = document_body(instance)
+    document = SearchDocument.objects.filter(kind=kind, object_id=instance.id).first()
+    if document is None:
+        SearchDocument.objects.create(kind=kind, object_id=instance.id, body=body)
+    elif document.body != body:
+        document.body = body
+        document.save(update_fields=['body'])
+
+
+def unindex_object(sender, instance, **kwargs):
+    SearchDocument.objects.filter(kind=search_kind(sender), object_id=instance.id).delete()
+
+
+for indexed_model in SEARCH_FIELDS:
+    post_save.connect(index_object, sender=indexed_model)
+    post_delete.connect(unindex_object, sender=indexed_model)
+
+
+def rebuild_index():
+    '''Recreates all documents, full-text index follows through triggers or generated column'''
+    SearchDocument.objects.all().delete()
+    for model, fields in SEARCH_FIELDS.items():
+        kind = search_kind(model)
+        SearchDocument.objects.bulk_create((
+            SearchDocument(kind=kind, object_id=row[0], body='\n'.join(row[1:]))
+            for row in model.objects.values_list('id', *fields).iterator()
+        ), batch_size=bulk_batch_size(SearchDocument, 1000))
@@ -0,0 +1,179 @@
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.shortcuts import reverse
+from django.core.management import call_command
+
+from bands.models import Musician, Band
+from bands.views import MusiciansView, BandsView
+from board.models import Announcement
+from board.views import AnnouncementsView
+from search.models import SearchDocument
+from search.backends import get_backend, search_kind, search_page, SQLiteBackend
+from search.views import AutocompleteView
+from search.signals import rebuild_index
+from helpers.text import normalize_name, word_similarity
+from helpers.query_budget import QueryBudgetMixin
+
+
+class SearchIndexTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='guitarist')
+        self.other_user = User.objects.create(username='drummer')
+        self.band = Band.objects.create(
+            admin=self.user, name='Loud', description='Heavy riffs and loud drums')
+        self.quiet_band = Band.objects.create(
+            admin=self.other_user, name='Quiet', description='Acoustic folk songs')
+
+    def test_documents_follow_saves_and_deletes(self):
+        kind = search_kind(Band)
+        document = SearchDocument.objects.get(kind=kind, object_id=self.band.id)
+        self.assertEqual(document.body, 'Heavy riffs and loud drums')
+
+        self.band.description = 'Soft jazz'
+        self.band.save()
+        document.refresh_from_db()
+        self.assertEqual(document.body, 'Soft jazz')
+
+        self.band.delete()
+        self.assertFalse(SearchDocument.objects.filter(kind=kind, object_id=document.object_id).exists())
+
+    def test_unchanged_text_is_not_rewritten(self):
+        self.band.name = 'Louder'
+        with self.assertNumQueries(2):
+            self.band.save()
+
+    def test_search_stems_words_and_keeps_kinds_apart(self):
+        backend = get_backend()
+        self.assertEqual(backend.search(search_kind(Band), 'riff', 10), [self.band.id])
+        self.assertEqual(backend.search(search_kind(Band), 'drumming', 10), [self.band.id])
+        self.assertEqual(backend.search(search_kind(Musician), 'riff', 10), [])
+        self.assertEqual(backend.search(search_kind(Band), 'riffs folk', 10), [])
+
+    def test_operators_in_query_are_quoted(self):
+        self.assertEqual(SQLiteBackend.match_expression('loud OR "drums*'), '"loud" "OR" "drums"')
+        self.assertIsNone(SQLiteBackend.match_expression('*" -'))
+        self.assertEqual(get_backend().search(search_kind(Band), '(loud* -drums', 10), [self.band.id])
+
+    def test_search_page_applies_queryset_filters(self):
+        page = search_page(Band.objects.filter(admin=self.other_user), 'loud', None, 10)
+        self.assertEqual(list(page), [])
+        page = search_page(Band.objects.all(), 'loud', None, 10)
+        self.assertEqual(list(page), [self.band])
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=open('/dev/null', 'w'))
+        self.assertEqual(get_backend().search(search_kind(Band), 'acoustic', 10), [self.quiet_band.id])
+
+    def test_rebuild_over_sqlite_batch_limit(self):
+        '''SQLite inserts at most 500 rows per statement'''
+        Announcement.objects.bulk_create(
+            Announcement(author=self.user, title=f'Gig {number}', text='Need a bassist')
+            for number in range(600))
+        rebuild_index()
+        self.assertEqual(SearchDocument.objects.filter(kind=search_kind(Announcement)).count(), 600)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class SearchViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='singer')
+        musician = Musician.objects.get(user=cls.user)
+        musician.bio = 'Classically trained soprano'
+        musician.activated = True
+        musician.save()
+        Band.objects.create(admin=cls.user, name='Choir', description='Sacred choral music')
+        Band.objects.create(admin=cls.user, name='Punks', description='Fast and angry')
+        Announcement.objects.create(author=cls.user, title='Need a soprano', text='For choir')
+        Announcement.objects.create(author=cls.user, title='Selling amp', text='Cheap')
+
+    def test_musicians_search(self):
+        response = self.client.get(reverse(MusiciansView.name), {'q': 'soprano'})
+        self.assertEqual([musician.user for musician in response.context['musicians']], [self.user])
+        response = self.client.get(reverse(MusiciansView.name), {'q': 'drummer'})
+        self.assertEqual(len(response.context['musicians']), 0)
+
+    def test_bands_search(self):
+        response = self.client.get(reverse(BandsView.name), {'q': 'choral'})
+        self.assertEqual([band.name for band in response.context['bands']], ['Choir'])
+
+    def test_announcements_search(self):
+        response = self.client.get(reverse(AnnouncementsView.name), {'q': 'soprano'})
+        self.assertEqual([announcement.title for announcement in response.context['announcements']],
+                         ['Need a soprano'])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class NameSearchTest(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.bjork = User.objects.create(username='bjork')
+        musician = Musician.objects.get(user=cls.bjork)
+        musician.first_name = 'Björk'
+        musician.last_name = 'Guðmundsdóttir'
+        musician.activated = True
+        musician.save()
+        cls.hidden = User.objects.create(username='bjork_hidden')
+        cls.band = Band.objects.create(admin=cls.bjork, name='Sigur Rós')
+        Band.objects.create(admin=cls.bjork, name='Múm')
+
+    def test_names_are_normalized_on_save(self):
+        self.assertEqual(Musician.objects.get(user=self.bjork).search_name,
+                         'bjork gudmundsdottir bjork')
+        self.assertEqual(self.band.search_name, 'sigur ros')
+        self.assertEqual(normalize_name(' Øyvind-Jørgen ', None), 'oyvind jorgen')
+
+    def test_username_change_renames_musician(self):
+        self.hidden.username = 'renamed'
+        self.hidden.save()
+        self.assertEqual(Musician.objects.get(user=self.hidden).search_name, 'renamed')
+
+    def test_word_similarity_matches_pg_trgm(self):
+        self.assertAlmostEqual(word_similarity('word', 'two words'), 0.8)
+
+    def test_accents_and_typos_match(self):
+        backend = get_backend()
+        musician_id = Musician.objects.get(user=self.bjork).id
+        self.assertEqual(backend.similar_names(Band, 'sigur ros', 10), [self.band.id])
+        self.assertEqual(backend.similar_names(Band, 'sigr', 10), [self.band.id])
+        self.assertEqual(backend.similar_names(Band, 'mu', 10),
+                         list(Band.objects.filter(name='Múm').values_list('id', flat=True)))
+        self.assertIn(musician_id, backend.similar_names(Musician, 'Bjork', 10))
+        self.assertIn(musician_id, backend.similar_names(Musician, 'gudmundsdotir', 10))
+        self.assertEqual(backend.similar_names(Musician, 'zzz', 10), [])
+
+    def test_name_matches_in_listing_search(self):
+        response = self.client.get(reverse(MusiciansView.name), {'q': 'bjork'})
+        self.assertEqual([musician.user for musician in response.context['musicians']], [self.bjork])
+
+    def test_migration_restores_name_triggers(self):
+        '''SQLite drops triggers of tables it rebuilds in AddField'''
+        if connection.vendor != 'sqlite':
+            return
+        migration = import_module('search.migrations.0003_restore_name_triggers')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER bands_band_name_fts_au')
+            migration.restore_name_index(None, SimpleNamespace(connection=connection, execute=cursor.execute))
+        band = Band.objects.get(id=self.band.id)
+        band.name = 'Amiina'
+        band.save()
+        self.assertEqual(get_backend().similar_names(Band, 'amiina', 10), [band.id])
+        self.assertEqual(get_backend().similar_names(Band, 'sigur', 10), [])
+
+    def test_autocomplete(self):
+        url = reverse(AutocompleteView.name, args=('musicians', ))
+        response = self.client.get(url, {'q': 'bjö'})
+        self.assertEqual([result['text'] for result in response.json()['results']],
+                         [str(Musician.objects.get(user=self.bjork))])
+        response = self.client.get(reverse(AutocompleteView.name, args=('bands', )), {'q': 'sigur'})
+        self.assertEqual(response.json(), {'results': [{'id': self.band.id, 'text': 'Sigur Rós'}]})
+        self.assertEqual(self.client.get(reverse(AutocompleteView.name, args=('users', ))).status_code, 404)
+        self.assertQueryBudget(AutocompleteView, url + '?q=bjork')
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from search import views
+
+
+urlpatterns = [
+    path('autocomplete/<str:kind>/', views.AutocompleteView.as_view(),
+         name=views.AutocompleteView.name),
+]
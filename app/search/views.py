@@ -0,0 +1,28 @@
+from django.http import HttpRequest, JsonResponse, Http404
+from django.views import View
+
+from bands.models import Musician, Band
+from search.backends import get_backend
+
+
+class AutocompleteView(View):
+
+    name = 'autocomplete'
+    query_budget = 2
+    limit = 10
+    querysets = {
+        'musicians': lambda: Musician.activated_objects.select_related('user'),
+        'bands': lambda: Band.objects.all(),
+    }
+
+    def get(self, request: HttpRequest, kind: str) -> JsonResponse:
+        if kind not in self.querysets:
+            raise Http404
+        queryset = self.querysets[kind]()
+        query = request.GET.get('q', '')
+        '''Names are matched with trigram index, only visible rows are loaded'''
+        ids = get_backend(queryset.db).similar_names(queryset.model, query, self.limit * 2)
+        rows = queryset.in_bulk(ids) if ids else {}
+        results = [{'id': object_id, 'text': str(rows[object_id])}
+                   for object_id in ids if object_id in rows][:self.limit]
+        return JsonResponse({'results': results})
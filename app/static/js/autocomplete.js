@@ -0,0 +1,33 @@
+// Fills <select data-autocomplete-url> with options matching text typed above it
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(function (select) {
+        var input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-1';
+        input.placeholder = 'Search';
+        select.parentNode.insertBefore(input, select);
+
+        var timer = null;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                var url = select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(input.value);
+                fetch(url).then(function (response) {
+                    return response.json();
+                }).then(function (data) {
+                    // Selected options stay, unselected are replaced with new results
+                    Array.from(select.options).forEach(function (option) {
+                        if (!option.selected) {
+                            option.remove();
+                        }
+                    });
+                    data.results.forEach(function (result) {
+                        if (!select.querySelector('option[value="' + result.id + '"]')) {
+                            select.add(new Option(result.text, result.id));
+                        }
+                    });
+                });
+            }, 200);
+        });
+    });
+});